@@ -2,7 +2,7 @@
 
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
-from .models import CustomUser
+from .models import CustomUser, ProgressReport
 from .forms import  UserCreationForm
 
 
@@ -36,6 +36,14 @@ class CustomUserAdmin(UserAdmin):
     # Since we're using email as username
     readonly_fields = ('date_joined', 'last_login')
 
+@admin.register(ProgressReport)
+class ProgressReportAdmin(admin.ModelAdmin):
+    list_display = ['user', 'status', 'created_at', 'finished_at']
+    list_filter = ['status']
+    search_fields = ['user__email']
+    readonly_fields = ['user', 'content_hash', 'status', 'error', 'created_at', 'finished_at']
+    list_select_related = ['user']
+
 # Alternative: If you want to keep it simple, use this minimal version
 class SimpleCustomUserAdmin(UserAdmin):
     list_display = ('email', 'full_name', 'user_type', 'is_active')
@@ -0,0 +1,44 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from accounts.models import CustomUser
+from accounts.reports import process_pending, request_report
+
+
+class Command(BaseCommand):
+    help = 'Render queued progress PDFs; optionally queue reports for a whole class first'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true',
+                            help='Queue a report for every learner before rendering')
+        parser.add_argument('--grade-level',
+                            help='Queue a report for every learner in this grade level')
+        parser.add_argument('--watch', action='store_true',
+                            help='Keep running and render new reports as they are queued')
+        parser.add_argument('--interval', type=float, default=2.0,
+                            help='Seconds to sleep between polls with --watch')
+
+    def handle(self, *args, **options):
+        learners = None
+        if options['all']:
+            learners = CustomUser.objects.filter(studentprofile__isnull=False)
+        elif options['grade_level']:
+            learners = CustomUser.objects.filter(studentprofile__grade_level=options['grade_level'])
+        if learners is not None:
+            queued = 0
+            for user in learners.iterator():
+                request_report(user)
+                queued += 1
+            self.stdout.write(f'Checked {queued} learners')
+
+        try:
+            while True:
+                processed = process_pending()
+                if processed:
+                    self.stdout.write(f'Rendered {processed} reports')
+                if not options['watch']:
+                    break
+                time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            pass
@@ -102,3 +102,26 @@ class CustomUser(AbstractUser):
     
     
 
+class ProgressReport(models.Model):
+    """A learner's PDF progress report, rendered in the background"""
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='progress_reports')
+    content_hash = models.CharField(max_length=64)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'content_hash'], name='unique_user_report_hash')
+        ]
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return "Progress report for {} ({})".format(self.user.email, self.status)
@@ -0,0 +1,116 @@
+"""
+Background rendering of learner progress PDFs.
+
+Rendering a report with WeasyPrint takes from hundreds of milliseconds to
+seconds, so requests only queue a ProgressReport and ``manage.py
+render_progress_reports`` renders it to MEDIA_ROOT. Files are named after a
+hash of everything the report shows; while a learner's progress is
+unchanged the existing file is served straight from disk.
+"""
+import hashlib
+import logging
+import os
+
+from django.conf import settings
+from django.template.loader import get_template
+from django.utils import timezone
+
+from learning.models import StudentProgress
+from .models import ProgressReport
+
+logger = logging.getLogger('accounts')
+
+# Bump when progress_pdf.html changes so existing files are re-rendered.
+REPORT_TEMPLATE_VERSION = 1
+
+
+def _progress_rows(user):
+    return StudentProgress.objects.filter(student__user=user)
+
+
+def report_hash(user):
+    """Hash of the data shown in ``user``'s report"""
+    digest = hashlib.sha256()
+    digest.update(repr((REPORT_TEMPLATE_VERSION, user.pk, user.full_name, user.email)).encode())
+    rows = _progress_rows(user).order_by('pk').values_list(
+        'lesson__course__slug', 'lesson__name', 'status', 'score', 'attempts',
+        'started_at', 'completed_at'
+    )
+    for row in rows.iterator():
+        digest.update(repr(row).encode())
+    return digest.hexdigest()
+
+
+def report_path(user, content_hash):
+    return os.path.join(settings.MEDIA_ROOT, 'reports', str(user.pk), '{}.pdf'.format(content_hash))
+
+
+def render_report(user, content_hash):
+    """Render ``user``'s report to disk and return its path"""
+    from weasyprint import HTML
+
+    context = {
+        'user': user,
+        'progress_list': _progress_rows(user).select_related('lesson__course'),
+    }
+    html_string = get_template('accounts/progress_pdf.html').render(context)
+    path = report_path(user, content_hash)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = '{}.{}.tmp'.format(path, os.getpid())
+    HTML(string=html_string, base_url=str(settings.BASE_DIR)).write_pdf(tmp_path)
+    os.replace(tmp_path, path)
+    _remove_stale_reports(path)
+    return path
+
+
+def _remove_stale_reports(current_path):
+    """Delete the learner's older report files"""
+    directory = os.path.dirname(current_path)
+    for name in os.listdir(directory):
+        path = os.path.join(directory, name)
+        if path != current_path and name.endswith('.pdf'):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+def request_report(user):
+    """Return the ProgressReport for ``user``'s current progress, queueing it if needed"""
+    content_hash = report_hash(user)
+    report, created = ProgressReport.objects.get_or_create(user=user, content_hash=content_hash)
+    missing = report.status == 'done' and not os.path.exists(report_path(user, content_hash))
+    if missing or report.status == 'failed':
+        report.status = 'pending'
+        report.save(update_fields=['status'])
+    if report.status == 'pending' and getattr(settings, 'REPORTS_SYNC', False):
+        process_report(report)
+    return report
+
+
+def process_report(report):
+    """Render one queued report and record the outcome"""
+    try:
+        render_report(report.user, report.content_hash)
+    except Exception as e:
+        logger.exception('Rendering progress report %s failed', report.pk)
+        report.status = 'failed'
+        report.error = str(e)
+    else:
+        report.status = 'done'
+        report.error = ''
+    report.finished_at = timezone.now()
+    report.save(update_fields=['status', 'error', 'finished_at'])
+    return report
+
+
+def process_pending(limit=None):
+    """Render queued reports, oldest first; returns how many were processed"""
+    pending = ProgressReport.objects.filter(status='pending').select_related('user').order_by('created_at')
+    if limit:
+        pending = pending[:limit]
+    processed = 0
+    for report in pending:
+        process_report(report)
+        processed += 1
+    return processed
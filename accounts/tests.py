@@ -1,3 +1,82 @@
-from django.test import TestCase
+import os
+import tempfile
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from learning.models import Course, Lesson, StudentProgress
+from . import reports
+from .models import ProgressReport
+
+
+def fake_render(user, content_hash):
+    """Stand-in for WeasyPrint: write a placeholder file where the report goes"""
+    path = reports.report_path(user, content_hash)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as report:
+        report.write(b'%PDF-1.4 ' + content_hash.encode())
+    return path
+
+
+class ProgressReportTests(TestCase):
+    """Progress PDFs are rendered once per distinct report content"""
+
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        overrides = override_settings(MEDIA_ROOT=media.name, REPORTS_SYNC=False)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        patcher = mock.patch.object(reports, 'render_report', side_effect=fake_render)
+        self.render = patcher.start()
+        self.addCleanup(patcher.stop)
+
+        course = Course.objects.create(name='Maths', slug='maths')
+        self.lessons = [
+            Lesson.objects.create(course=course, name='Lesson {}'.format(i), slug='lesson-{}'.format(i))
+            for i in range(2)
+        ]
+        self.user = get_user_model().objects.create_user(
+            email='report@example.com', password='pass', full_name='Report', user_type='learner'
+        )
+        StudentProgress.objects.create(student=self.user.studentprofile, lesson=self.lessons[0],
+                                       status='completed', score=8)
+        self.client.force_login(self.user)
+        self.url = reverse('progress_pdf')
+
+    def download(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        content = b''.join(response.streaming_content)
+        response.close()
+        return content
+
+    def test_unchanged_progress_is_served_from_disk(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.json()['status'], 'pending')
+        self.assertEqual(reports.process_pending(), 1)
+
+        first = self.download()
+        self.assertTrue(first.startswith(b'%PDF'))
+        self.assertEqual(self.download(), first)
+        self.assertEqual(self.render.call_count, 1)
+
+        StudentProgress.objects.create(student=self.user.studentprofile, lesson=self.lessons[1],
+                                       status='in_progress')
+        self.assertEqual(self.client.get(self.url).status_code, 202)
+        self.assertEqual(ProgressReport.objects.filter(user=self.user).count(), 2)
+        reports.process_pending()
+        self.assertNotEqual(self.download(), first)
+        self.assertEqual(self.render.call_count, 2)
+
+    def test_missing_file_is_rendered_again(self):
+        report = reports.request_report(self.user)
+        reports.process_report(report)
+        os.remove(reports.report_path(self.user, report.content_hash))
+
+        report = reports.request_report(self.user)
+        self.assertEqual(report.status, 'pending')
+        self.assertEqual(ProgressReport.objects.filter(user=self.user).count(), 1)
@@ -13,6 +13,7 @@ urlpatterns = [
     path('progress/', views.progress_view, name='progress'),
     path('settings/', views.settings_view, name='settings'),
     path('progress/download/', views.download_progress_pdf, name='progress_pdf'),
+    path('progress/download/status/', views.progress_pdf_status, name='progress_pdf_status'),
      # Password reset URLs
     path('password-reset/', 
          auth_views.PasswordResetView.as_view(template_name='accounts/password_reset_form.html'),
@@ -1,15 +1,10 @@
+import logging
+
 from django.shortcuts import render, redirect
 from django.contrib.auth import logout
 from django.contrib import messages
-from django.template.loader import get_template
-from django.http import HttpResponse
-from weasyprint import HTML
-from io import BytesIO
-from django.http import HttpResponse
-from reportlab.lib.pagesizes import letter
-from reportlab.lib import colors
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-from reportlab.lib.styles import getSampleStyleSheet
+from django.http import FileResponse, JsonResponse
+from django.urls import reverse
 from django.utils.timezone import localtime
 from django.contrib.auth import login, authenticate
 from django.contrib.auth.decorators import login_required
@@ -17,6 +12,9 @@ from django.views.decorators.csrf import csrf_protect
 
 from learning.models import StudentProfile, StudentProgress
 from .models import CustomUser
+from .reports import report_path, request_report
+
+logger = logging.getLogger('accounts')
 
 
 
@@ -76,8 +74,7 @@ def login_view(request):
 
 
 def landing_view(request):
-    print("Landing view called!")  
-    print("Rendering giggles.html") 
+    logger.debug('Rendering landing page')
     return render(request, 'accounts/giggles.html')
 
 
@@ -108,22 +105,38 @@ def progress_view(request):
         'progress_list': progress_qs,
     })
 
+def _report_status(request, report):
+    data = {'status': report.status, 'ready': report.status == 'done'}
+    if report.status == 'done':
+        data['download_url'] = request.build_absolute_uri(reverse('progress_pdf'))
+    elif report.status == 'failed':
+        data['error'] = report.error
+    else:
+        data['status_url'] = request.build_absolute_uri(reverse('progress_pdf_status'))
+    return data
+
+
 @login_required
 def download_progress_pdf(request):
+    """Serve the learner's progress PDF, or queue it and answer 202 while it renders"""
     user = request.user
-    progress_qs = user.studentprofile.studentprogress_set.select_related('lesson')
+    report = request_report(user)
+    if report.status != 'done':
+        return JsonResponse(_report_status(request, report), status=202)
 
-    context = {
-        'user': user,
-        'progress_list': progress_qs,
-    }
+    return FileResponse(
+        open(report_path(user, report.content_hash), 'rb'),
+        as_attachment=True,
+        filename=f'{user.username}_progress_report.pdf',
+        content_type='application/pdf',
+    )
 
-    html_string = get_template('accounts/progress_pdf.html').render(context)
-    pdf_file = HTML(string=html_string, base_url=request.build_absolute_uri()).write_pdf()
 
-    response = HttpResponse(pdf_file, content_type='application/pdf')
-    response['Content-Disposition'] = f'attachment; filename="{user.username}_progress_report.pdf"'
-    return response
+@login_required
+def progress_pdf_status(request):
+    """Polling endpoint for the learner's current progress report"""
+    report = request_report(request.user)
+    return JsonResponse(_report_status(request, report))
 
 
 def settings_view(request):
@@ -23,8 +23,12 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 
 # SECURITY WARNING: keep the secret key used in production secret!
 from decouple import config
+from django.core.exceptions import ImproperlyConfigured
 
 MY_API_KEY = config("MY_API_KEY")
+# Django's signing key (sessions, CSRF, password reset tokens). Required, and
+# never shared with another credential.
+SECRET_KEY = config("SECRET_KEY")
 
 
 # SECURITY WARNING: don't run with debug turned on in production!
@@ -59,13 +63,17 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'learning.middleware.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'learning.middleware.StudentProfileMiddleware',
+    'learning.middleware.ProfilingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'learning.middleware.ProgressUnitOfWorkMiddleware',
 ]
 
 ROOT_URLCONF = 'giggles_project.urls'
@@ -94,12 +102,64 @@ WSGI_APPLICATION = 'giggles_project.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# Database profile, picked with DB_ENGINE:
+#   sqlite   - a local file in WAL mode, so readers never wait for the writer
+#              and writers queue on the busy timeout instead of failing.
+#   postgres - persistent connections with health checks, or a psycopg pool
+#              when DB_POOL=True (pooling requires CONN_MAX_AGE=0).
+# DB_TEST_NAME names the test database; for SQLite it puts the test database
+# in a file so it runs in WAL mode too instead of in memory.
+DB_ENGINE = config('DB_ENGINE', default='sqlite')
+
+if DB_ENGINE == 'postgres':
+    DB_POOL = config('DB_POOL', default=False, cast=bool)
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': config('DB_NAME', default='giggles'),
+            'USER': config('DB_USER', default='giggles'),
+            'PASSWORD': config('DB_PASSWORD', default=''),
+            'HOST': config('DB_HOST', default='localhost'),
+            'PORT': config('DB_PORT', default='5432'),
+            'CONN_MAX_AGE': 0 if DB_POOL else config('DB_CONN_MAX_AGE', default=60, cast=int),
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {
+                'connect_timeout': config('DB_CONNECT_TIMEOUT', default=5, cast=int),
+                **({'pool': {
+                    'min_size': config('DB_POOL_MIN_SIZE', default=2, cast=int),
+                    'max_size': config('DB_POOL_MAX_SIZE', default=10, cast=int),
+                    'timeout': config('DB_POOL_TIMEOUT', default=10, cast=float),
+                }} if DB_POOL else {}),
+            },
+            'TEST': {'NAME': config('DB_TEST_NAME', default=None)},
+        }
     }
-}
+elif DB_ENGINE == 'sqlite':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': config('DB_NAME', default=str(BASE_DIR / 'db.sqlite3')),
+            'CONN_MAX_AGE': config('DB_CONN_MAX_AGE', default=60, cast=int),
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {
+                # Seconds a writer waits for the lock before "database is locked"
+                'timeout': config('DB_BUSY_TIMEOUT', default=20, cast=float),
+                # Take the write lock at BEGIN, so a transaction that reads then
+                # writes cannot fail when upgrading its lock mid-way
+                'transaction_mode': 'IMMEDIATE',
+                'init_command': (
+                    'PRAGMA journal_mode=WAL;'
+                    'PRAGMA synchronous=NORMAL;'
+                    'PRAGMA temp_store=MEMORY;'
+                    'PRAGMA cache_size=-20000;'
+                    'PRAGMA mmap_size=134217728;'
+                ),
+            },
+            'TEST': {'NAME': config('DB_TEST_NAME', default=None)},
+        }
+    }
+else:
+    raise ImproperlyConfigured("DB_ENGINE must be 'sqlite' or 'postgres', not {!r}".format(DB_ENGINE))
 
 AUTH_USER_MODEL = 'accounts.CustomUser'
 
@@ -146,6 +206,109 @@ STATIC_URL = 'static/'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Caches
+# The course catalog is cached in the 'catalog' cache. CATALOG_CACHE_BACKEND
+# selects 'locmem' (per process), 'file' (shared by every process on the box)
+# or 'redis' (shared by every host, at CATALOG_CACHE_URL; needs the redis
+# package). Catalog edits reach other processes through this cache, so run
+# several workers on 'file' or 'redis': with 'locmem' the other workers keep
+# serving the old catalog for up to CATALOG_VERSION_TIMEOUT seconds.
+CATALOG_CACHE_BACKEND = config('CATALOG_CACHE_BACKEND', default='locmem')
+CATALOG_CACHE_TIMEOUT = config('CATALOG_CACHE_TIMEOUT', default=3600, cast=int)
+# Lifetime of the catalog version and ETag stamps; 0 keeps them until the next edit
+CATALOG_VERSION_TIMEOUT = config('CATALOG_VERSION_TIMEOUT',
+                                 default=30 if CATALOG_CACHE_BACKEND == 'locmem' else 0, cast=int)
+CATALOG_LRU_SIZE = config('CATALOG_LRU_SIZE', default=256, cast=int)
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'catalog': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'catalog',
+    },
+}
+if CATALOG_CACHE_BACKEND == 'file':
+    CACHES['catalog'] = {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': config('CATALOG_CACHE_DIR', default=os.path.join(BASE_DIR, '.cache', 'catalog')),
+    }
+elif CATALOG_CACHE_BACKEND == 'redis':
+    CACHES['catalog'] = {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': config('CATALOG_CACHE_URL', default='redis://127.0.0.1:6379/1'),
+    }
+
+# REST API
+# List endpoints return pages of API_PAGE_SIZE rows (?page=2, ...) with the
+# total count and next/previous links, so a large catalog is never
+# serialized in one response.
+REST_FRAMEWORK = {
+    'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
+    'PAGE_SIZE': config('API_PAGE_SIZE', default=100, cast=int),
+}
+
+# Learning progress
+# CourseProgress updates are queued and applied by `manage.py progress_worker`.
+# Set PROGRESS_QUEUE_SYNC=True (e.g. for tests) to apply them in-process.
+PROGRESS_QUEUE_SYNC = config('PROGRESS_QUEUE_SYNC', default=False, cast=bool)
+
+# Leaderboards are kept in memory in each process. They pick up rows changed
+# by other processes every LEADERBOARD_SYNC_SECONDS and are rebuilt from the
+# database every LEADERBOARD_REBUILD_SECONDS.
+LEADERBOARD_SYNC_SECONDS = config('LEADERBOARD_SYNC_SECONDS', default=2, cast=float)
+LEADERBOARD_REBUILD_SECONDS = config('LEADERBOARD_REBUILD_SECONDS', default=600, cast=float)
+
+# Lesson pages post a heartbeat every HEARTBEAT_INTERVAL_SECONDS (see
+# static/js/timer.js). Heartbeats are buffered in each process and added to
+# StudentProgress.time_spent / last_accessed every HEARTBEAT_FLUSH_SECONDS.
+HEARTBEAT_INTERVAL_SECONDS = config('HEARTBEAT_INTERVAL_SECONDS', default=30, cast=int)
+HEARTBEAT_FLUSH_SECONDS = config('HEARTBEAT_FLUSH_SECONDS', default=60, cast=float)
+
+# Progress PDFs are rendered by `manage.py render_progress_reports`.
+# Set REPORTS_SYNC=True to render them inside the request instead.
+REPORTS_SYNC = config('REPORTS_SYNC', default=False, cast=bool)
+
+# Request metrics
+# Per-view latency, SQL query and response size totals are served in the
+# Prometheus text format at /metrics/ to staff, and to scrapers that send
+# "Authorization: Bearer <METRICS_TOKEN>" (no token: staff only). Set
+# METRICS_JSONL_PATH to also append one JSON line per request to that file.
+METRICS_ENABLED = config('METRICS_ENABLED', default=True, cast=bool)
+METRICS_JSONL_PATH = config('METRICS_JSONL_PATH', default='')
+METRICS_TOKEN = config('METRICS_TOKEN', default='')
+
+# Staff can profile a single request with ?_profile=1 or an X-Profile: 1
+# header. The newest PROFILE_KEEP profiles are kept in PROFILE_DIR and listed
+# at /learning/profiles/.
+PROFILING_ENABLED = config('PROFILING_ENABLED', default=True, cast=bool)
+PROFILE_DIR = config('PROFILE_DIR', default=os.path.join(BASE_DIR, '.cache', 'profiles'))
+PROFILE_KEEP = config('PROFILE_KEEP', default=50, cast=int)
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'simple': {'format': '{levelname} {name}: {message}', 'style': '{'},
+        'raw': {'format': '{message}', 'style': '{'},
+    },
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler', 'formatter': 'simple'},
+        'metrics_file': (
+            {'class': 'logging.FileHandler', 'filename': METRICS_JSONL_PATH,
+             'formatter': 'raw', 'delay': True}
+            if METRICS_JSONL_PATH else {'class': 'logging.NullHandler'}
+        ),
+    },
+    'loggers': {
+        'accounts': {'handlers': ['console'], 'level': config('LOG_LEVEL', default='INFO')},
+        'learning': {'handlers': ['console'], 'level': config('LOG_LEVEL', default='INFO')},
+        'lessons': {'handlers': ['console'], 'level': config('LOG_LEVEL', default='INFO')},
+        'learning.metrics': {'handlers': ['metrics_file'], 'level': 'INFO', 'propagate': False},
+    },
+}
+
 # Email settings (for development)
 EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
 
@@ -7,6 +7,7 @@ from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
 from accounts import views
+from learning.views import request_metrics
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -14,6 +15,7 @@ urlpatterns = [
     path('accounts/', include('accounts.urls')),
     path('lessons/', include('lessons.urls')),
     path('learning/', include('learning.urls')),
+    path('metrics/', request_metrics, name='metrics'),
 
 ]
 
@@ -0,0 +1,168 @@
+"""
+Learning streaks and the activity calendar.
+
+Each learner has an ActivityCalendar holding one bit per day, counted from
+``epoch``, so a year of activity fits in 46 bytes. Starting or completing a
+lesson and submitting a quiz ``record()`` the day. The bitmap is read as a
+Python int and updated with shifts and masks. The streak ending on the last
+active day and the longest streak are stored next to it. Reading the current
+streak therefore needs no scan of StudentProgress or AssessmentAttempt; it
+only compares ``last_active`` with today.
+"""
+from datetime import date, timedelta
+from functools import partial
+
+from django.db import transaction
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from . import badges
+from .models import ActivityCalendar, AssessmentAttempt, StudentProgress
+
+
+def to_int(bits):
+    return int.from_bytes(bytes(bits or b''), 'little')
+
+
+def to_bytes(value):
+    return value.to_bytes((value.bit_length() + 7) // 8, 'little')
+
+
+def run_ending_at(value, index):
+    """Length of the run of set bits ending at bit ``index``"""
+    gaps = ~value & ((1 << (index + 1)) - 1)
+    if not gaps:
+        return index + 1
+    return index - gaps.bit_length() + 1
+
+
+def run_through(value, index):
+    """Length of the run of set bits containing bit ``index``"""
+    above = value >> index
+    return run_ending_at(value, index) + ((above ^ (above + 1)).bit_length() - 2)
+
+
+def longest_run(value):
+    """Length of the longest run of set bits"""
+    length = 0
+    while value:
+        value &= value >> 1
+        length += 1
+    return length
+
+
+def current_streak(last_active, streak, today=None):
+    """The stored streak, or 0 once a whole day has passed without activity"""
+    today = today or timezone.localdate()
+    if last_active is None or last_active < today - timedelta(days=1):
+        return 0
+    return streak
+
+
+def record(student_id, day=None):
+    """Mark ``day`` (default today) active once the transaction commits"""
+    transaction.on_commit(partial(mark, student_id, day or timezone.localdate()))
+
+
+def mark(student_id, day):
+    """Set the bit for ``day`` and update the stored streaks"""
+    with transaction.atomic():
+        calendar, _ = ActivityCalendar.objects.select_for_update().get_or_create(
+            student_id=student_id, defaults={'epoch': day}
+        )
+        value = to_int(calendar.bits)
+        if day < calendar.epoch:
+            value <<= (calendar.epoch - day).days
+            calendar.epoch = day
+        index = (day - calendar.epoch).days
+        if value >> index & 1:
+            return
+        value |= 1 << index
+
+        calendar.bits = to_bytes(value)
+        if calendar.last_active is None or day >= calendar.last_active:
+            calendar.last_active = day
+        calendar.streak = run_ending_at(value, (calendar.last_active - calendar.epoch).days)
+        calendar.longest_streak = max(calendar.longest_streak, run_through(value, index))
+        calendar.save()
+    badges.emit(student_id, 'active_day', streak=calendar.streak)
+
+
+def _days(calendar, start, end):
+    """Bits for start..end inclusive as a string of '0'/'1', oldest first"""
+    count = (end - start).days + 1
+    offset = (start - calendar.epoch).days
+    value = to_int(calendar.bits)
+    window = value >> offset if offset >= 0 else value << -offset
+    window &= (1 << count) - 1
+    return format(window, '0{}b'.format(count))[::-1] if count > 0 else ''
+
+
+def summary(student_profile, year=None, today=None):
+    """Streaks and a year heatmap for one learner.
+
+    The heatmap covers calendar ``year``, or the 365 days ending today.
+    """
+    today = today or timezone.localdate()
+    if year:
+        start, end = date(year, 1, 1), date(year, 12, 31)
+    else:
+        start, end = today - timedelta(days=364), today
+    calendar = ActivityCalendar.objects.filter(student=student_profile).first()
+    if calendar is None:
+        calendar = ActivityCalendar(student=student_profile, epoch=today)
+
+    days = _days(calendar, start, end)
+    return {
+        'current_streak': current_streak(calendar.last_active, calendar.streak, today),
+        'longest_streak': calendar.longest_streak,
+        'last_active': calendar.last_active,
+        'heatmap': {
+            'start': start,
+            'end': end,
+            'active_days': days.count('1'),
+            'days': days,
+        },
+    }
+
+
+def rebuild(student_ids=None):
+    """Recompute calendars from lesson and attempt history (backfill/repair path)"""
+    progress = StudentProgress.objects.all()
+    attempts = AssessmentAttempt.objects.all()
+    if student_ids is not None:
+        progress = progress.filter(student_id__in=student_ids)
+        attempts = attempts.filter(user__studentprofile__in=student_ids)
+
+    active = {}
+    for field in ('started_at', 'completed_at', 'last_accessed'):
+        rows = progress.filter(**{field + '__isnull': False}).annotate(
+            day=TruncDate(field)
+        ).values_list('student_id', 'day').distinct()
+        for student_id, day in rows.iterator():
+            active.setdefault(student_id, set()).add(day)
+    rows = attempts.annotate(day=TruncDate('completed_at')).values_list(
+        'user__studentprofile', 'day'
+    ).distinct()
+    for student_id, day in rows.iterator():
+        if student_id is not None:
+            active.setdefault(student_id, set()).add(day)
+
+    calendars = []
+    for student_id, days in active.items():
+        epoch, last = min(days), max(days)
+        value = 0
+        for day in days:
+            value |= 1 << (day - epoch).days
+        calendars.append(ActivityCalendar(
+            student_id=student_id, epoch=epoch, bits=to_bytes(value), last_active=last,
+            streak=run_ending_at(value, (last - epoch).days), longest_streak=longest_run(value),
+        ))
+
+    with transaction.atomic():
+        stale = ActivityCalendar.objects.all()
+        if student_ids is not None:
+            stale = stale.filter(student_id__in=student_ids)
+        stale.delete()
+        ActivityCalendar.objects.bulk_create(calendars, batch_size=500)
+    return len(calendars)
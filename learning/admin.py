@@ -2,9 +2,11 @@ from django.contrib import admin
 from django.utils.html import format_html
 from django.urls import reverse
 from django.utils.safestring import mark_safe
+from . import rescoring
 from .models import (
     Course, Lesson, StudentProfile, Assessment, 
-    AssessmentAttempt, StudentProgress, CourseProgress
+    AssessmentAttempt, StudentProgress, CourseProgress, ProgressJob, AttemptRollup,
+    StudentBadge
 )
 
 @admin.register(Course)
@@ -70,10 +72,32 @@ class AssessmentAdmin(admin.ModelAdmin):
         }),
     )
     
+    actions = ['rescore_attempts']
+
     def attempt_count(self, obj):
         return obj.assessmentattempt_set.count()
     attempt_count.short_description = 'Total Attempts'
 
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        if change and {'total_questions', 'passing_score'} & set(form.changed_data):
+            result = rescoring.rescore([obj.pk])
+            self.message_user(
+                request,
+                f"Rescored {result['attempts']} attempts and rebuilt "
+                f"{result['progress_rebuilt']} course progress records."
+            )
+
+    def rescore_attempts(self, request, queryset):
+        """Action to recompute percentage and pass status of every attempt"""
+        result = rescoring.rescore(list(queryset.values_list('pk', flat=True)))
+        self.message_user(
+            request,
+            f"Rescored {result['attempts']} attempts across {result['assessments']} assessments "
+            f"and rebuilt {result['progress_rebuilt']} course progress records."
+        )
+    rescore_attempts.short_description = 'Rescore attempts of selected assessments'
+
 @admin.register(AssessmentAttempt)
 class AssessmentAttemptAdmin(admin.ModelAdmin):
     list_display = ['user', 'assessment', 'score', 'percentage', 'passed', 'completed_at']
@@ -170,17 +194,41 @@ class CourseProgressAdmin(admin.ModelAdmin):
     actions = ['update_progress']
     
     def update_progress(self, request, queryset):
-        """Action to manually update progress for selected course progress records"""
+        """Action to rebuild selected course progress records from full history"""
         updated = 0
-        for progress in queryset:
-            progress.update_progress()
+        for progress in queryset.select_related('student', 'course'):
+            progress.rebuild()
             updated += 1
         
         self.message_user(
             request,
             f'Successfully updated progress for {updated} course progress records.'
         )
-    update_progress.short_description = 'Update selected progress records'
+    update_progress.short_description = 'Rebuild selected progress records'
+
+@admin.register(ProgressJob)
+class ProgressJobAdmin(admin.ModelAdmin):
+    list_display = ['id', 'student', 'course', 'created_at']
+    list_filter = ['course']
+    readonly_fields = ['student', 'course', 'delta', 'create_missing', 'created_at']
+    list_select_related = ['student__user', 'course']
+    date_hierarchy = 'created_at'
+
+@admin.register(AttemptRollup)
+class AttemptRollupAdmin(admin.ModelAdmin):
+    list_display = ['assessment', 'course', 'period', 'day', 'grade_level', 'attempts', 'passed']
+    list_filter = ['period', 'course', 'grade_level']
+    readonly_fields = ['course', 'lesson', 'assessment', 'period', 'day', 'grade_level'] + AttemptRollup.COUNTERS
+    list_select_related = ['assessment', 'course']
+    date_hierarchy = 'day'
+
+@admin.register(StudentBadge)
+class StudentBadgeAdmin(admin.ModelAdmin):
+    list_display = ['student', 'code', 'course', 'earned_at']
+    list_filter = ['code', 'course']
+    search_fields = ['student__user__email', 'code']
+    list_select_related = ['student__user', 'course']
+    date_hierarchy = 'earned_at'
 
 # Custom admin site configuration
 admin.site.site_header = 'Learning Management System'
@@ -0,0 +1,206 @@
+"""
+Course analytics cube for staff and teachers.
+
+Pass rates, average percentages, score distributions and time-on-task are
+answered from AttemptRollup, which holds attempts pre-aggregated per
+(assessment, period, grade level). New attempts are added to their daily
+row with one F() UPDATE once the transaction commits, so a dashboard query
+reads a handful of rollup rows instead of scanning AssessmentAttempt.
+``compact()`` folds old daily rows into monthly ones and ``rebuild()``
+recomputes the rollup from the raw attempts when it needs repairing.
+"""
+from functools import partial
+
+from django.db import transaction
+from django.db.models import Count, Q, Sum, Value
+from django.db.models.functions import Coalesce, TruncDate, TruncMonth
+from django.utils import timezone
+
+from .models import AssessmentAttempt, AttemptRollup
+
+BUCKET_LABELS = ['0-19', '20-39', '40-59', '60-79', '80-100']
+
+# group_by value -> rollup fields returned for each group
+GROUP_FIELDS = {
+    'course': ['course_id', 'course__name'],
+    'lesson': ['lesson_id', 'lesson__name'],
+    'assessment': ['assessment_id', 'assessment__title'],
+    'day': ['day'],
+    'grade_level': ['grade_level'],
+}
+
+
+def attempt_counters(attempt):
+    """The rollup counters one attempt adds"""
+    counters = {
+        'attempts': 1,
+        'passed': int(attempt.passed),
+        'percentage_sum': attempt.percentage,
+        AttemptRollup.bucket_for(attempt.percentage): 1,
+    }
+    if attempt.time_taken is not None:
+        counters['timed_attempts'] = 1
+        counters['time_taken_seconds'] = attempt.time_taken.total_seconds()
+    return counters
+
+
+def record_attempts(attempts, grade_level):
+    """Add newly stored attempts by one learner to the rollup when the transaction commits"""
+    deltas = {}
+    for attempt in attempts:
+        assessment = attempt.assessment
+        key = (assessment.pk, assessment.course_id, assessment.lesson_id,
+               grade_level or '', timezone.localdate(attempt.completed_at))
+        merged = deltas.setdefault(key, {})
+        for name, value in attempt_counters(attempt).items():
+            merged[name] = merged.get(name, 0) + value
+    if deltas:
+        transaction.on_commit(partial(_apply, deltas))
+
+
+def _apply(deltas):
+    for key, counters in deltas.items():
+        AttemptRollup.apply_delta(*key, **counters)
+
+
+def _bucket_filter(index):
+    if index == AttemptRollup.BUCKETS - 1:
+        return Q(percentage__gte=index * 20)
+    return Q(percentage__gte=index * 20, percentage__lt=(index + 1) * 20)
+
+
+def _seconds(value):
+    if value is None:
+        return 0.0
+    if hasattr(value, 'total_seconds'):
+        return value.total_seconds()
+    return value / 1e6  # Databases without an interval type sum microseconds
+
+
+def rebuild(assessment_ids=None):
+    """Recompute daily rollup rows from the raw attempts (repair path).
+
+    Replaces every row, daily or monthly, of the given assessments (or of
+    all assessments); run ``compact()`` again afterwards if needed.
+    Returns the number of rows written.
+    """
+    attempts = AssessmentAttempt.objects.all()
+    rollups = AttemptRollup.objects.all()
+    if assessment_ids is not None:
+        attempts = attempts.filter(assessment_id__in=assessment_ids)
+        rollups = rollups.filter(assessment_id__in=assessment_ids)
+
+    rows = attempts.annotate(
+        rollup_day=TruncDate('completed_at'),
+        rollup_grade=Coalesce('user__studentprofile__grade_level', Value('')),
+    ).values(
+        'assessment_id', 'assessment__course_id', 'assessment__lesson_id', 'rollup_day', 'rollup_grade'
+    ).annotate(
+        n_attempts=Count('id'),
+        n_passed=Count('id', filter=Q(passed=True)),
+        n_percentage=Sum('percentage'),
+        n_timed=Count('time_taken'),
+        n_time=Sum('time_taken'),
+        **{'n_bucket_{}'.format(i): Count('id', filter=_bucket_filter(i))
+           for i in range(AttemptRollup.BUCKETS)}
+    ).order_by()
+
+    new_rows = [
+        AttemptRollup(
+            assessment_id=row['assessment_id'],
+            course_id=row['assessment__course_id'],
+            lesson_id=row['assessment__lesson_id'],
+            period='day',
+            day=row['rollup_day'],
+            grade_level=row['rollup_grade'],
+            attempts=row['n_attempts'],
+            passed=row['n_passed'],
+            percentage_sum=row['n_percentage'] or 0.0,
+            timed_attempts=row['n_timed'],
+            time_taken_seconds=_seconds(row['n_time']),
+            **{'bucket_{}'.format(i): row['n_bucket_{}'.format(i)]
+               for i in range(AttemptRollup.BUCKETS)}
+        )
+        for row in rows
+    ]
+    with transaction.atomic():
+        rollups.delete()
+        AttemptRollup.objects.bulk_create(new_rows, batch_size=500)
+    return len(new_rows)
+
+
+def compact(before):
+    """Fold daily rows dated before ``before`` into one row per month.
+
+    New attempts always land on today's row, so days in the past are no
+    longer written to and can be merged safely. Returns the number of daily
+    rows folded.
+    """
+    daily = AttemptRollup.objects.filter(period='day', day__lt=before)
+    with transaction.atomic():
+        months = daily.annotate(month=TruncMonth('day')).values(
+            'assessment_id', 'course_id', 'lesson_id', 'grade_level', 'month'
+        ).annotate(
+            **{'total_' + name: Sum(name) for name in AttemptRollup.COUNTERS}
+        ).order_by()
+        for row in months:
+            AttemptRollup.apply_delta(
+                row['assessment_id'], row['course_id'], row['lesson_id'], row['grade_level'],
+                row['month'], period='month',
+                **{name: row['total_' + name] for name in AttemptRollup.COUNTERS}
+            )
+        folded, _ = daily.delete()
+    return folded
+
+
+def _summary(row):
+    attempts = row['sum_attempts'] or 0
+    timed = row['sum_timed_attempts'] or 0
+    return {
+        'attempts': attempts,
+        'passed': row['sum_passed'] or 0,
+        'pass_rate': (row['sum_passed'] or 0) / attempts * 100 if attempts else 0.0,
+        'average_percentage': (row['sum_percentage_sum'] or 0.0) / attempts if attempts else 0.0,
+        'average_time_seconds': (row['sum_time_taken_seconds'] or 0.0) / timed if timed else None,
+        'distribution': dict(zip(
+            BUCKET_LABELS,
+            (row['sum_bucket_{}'.format(i)] or 0 for i in range(AttemptRollup.BUCKETS))
+        )),
+    }
+
+
+def summarize(course=None, lesson=None, assessment=None, grade_level=None,
+              date_from=None, date_to=None, group_by=None):
+    """Answer a dashboard query from the rollup.
+
+    Returns one summary for the whole selection, or one per group when
+    ``group_by`` is a key of GROUP_FIELDS. Months that have been compacted
+    are counted whole when they overlap the date range.
+    """
+    rows = AttemptRollup.objects.all()
+    if course:
+        rows = rows.filter(course__slug=course)
+    if lesson:
+        rows = rows.filter(lesson_id=lesson)
+    if assessment:
+        rows = rows.filter(assessment_id=assessment)
+    if grade_level:
+        rows = rows.filter(grade_level=grade_level)
+    if date_from:
+        rows = rows.filter(
+            Q(period='day', day__gte=date_from) | Q(period='month', day__gte=date_from.replace(day=1))
+        )
+    if date_to:
+        rows = rows.filter(day__lte=date_to)
+
+    sums = {'sum_' + name: Sum(name) for name in AttemptRollup.COUNTERS}
+    if not group_by:
+        return _summary(rows.aggregate(**sums))
+
+    fields = GROUP_FIELDS[group_by]
+    groups = []
+    for row in rows.values(*fields).annotate(**sums).order_by(fields[0]):
+        summary = {field: row[field] for field in fields}
+        summary.update(_summary(row))
+        groups.append(summary)
+    return groups
@@ -0,0 +1,256 @@
+"""
+Read-only REST API for the catalog, the signed-in learner's progress,
+streaks and leaderboards, and course analytics for staff and teachers.
+
+Every viewset ships with a queryset that already carries what its serializer
+reads: the ``*_count`` fields come from ``annotate(Count(...))`` and related
+names from ``select_related``/``prefetch_related``, so a list costs the same
+number of queries whether it holds ten rows or a thousand. Lists are
+paginated (``REST_FRAMEWORK['PAGE_SIZE']`` rows per page).
+"""
+from django.db.models import Count, Prefetch
+from django.http import Http404
+from django.utils.dateparse import parse_date
+from rest_framework import permissions, status, viewsets
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from . import activity, analytics, catalog, leaderboard
+from .models import Course, Lesson, Assessment, StudentProfile, StudentProgress, CourseProgress
+from .serializers import (
+    CourseSerializer, CourseDetailSerializer, LessonSerializer, AssessmentSerializer,
+    StudentProgressSerializer, CourseProgressSerializer
+)
+
+
+def course_queryset():
+    return Course.objects.annotate(
+        lesson_count=Count('lessons', distinct=True),
+        assessment_count=Count('assessments', distinct=True),
+    ).order_by('-created_at')
+
+
+def lesson_queryset():
+    return (
+        Lesson.objects.select_related('course')
+        .annotate(assessment_count=Count('assessments'))
+        .order_by('course_id', 'created_at')
+    )
+
+
+def assessment_queryset():
+    return (
+        Assessment.objects.select_related('course', 'lesson')
+        .annotate(attempt_count=Count('assessmentattempt'))
+        .order_by('id')
+    )
+
+
+def course_detail_queryset():
+    return course_queryset().prefetch_related(
+        Prefetch('lessons', queryset=lesson_queryset()),
+        Prefetch('assessments', queryset=assessment_queryset()),
+    )
+
+
+class CourseViewSet(viewsets.ReadOnlyModelViewSet):
+    lookup_field = 'slug'
+
+    def get_queryset(self):
+        if self.action == 'retrieve':
+            return course_detail_queryset()
+        return course_queryset()
+
+    def get_serializer_class(self):
+        if self.action == 'retrieve':
+            return CourseDetailSerializer
+        return CourseSerializer
+
+
+class LessonViewSet(viewsets.ReadOnlyModelViewSet):
+    serializer_class = LessonSerializer
+
+    def get_queryset(self):
+        queryset = lesson_queryset()
+        course = self.request.query_params.get('course')
+        if course:
+            queryset = queryset.filter(course__slug=course)
+        return queryset
+
+
+class AssessmentViewSet(viewsets.ReadOnlyModelViewSet):
+    serializer_class = AssessmentSerializer
+
+    def get_queryset(self):
+        queryset = assessment_queryset()
+        course = self.request.query_params.get('course')
+        if course:
+            queryset = queryset.filter(course__slug=course)
+        return queryset
+
+
+class StudentProgressViewSet(viewsets.ReadOnlyModelViewSet):
+    """Lesson progress of the signed-in learner"""
+    serializer_class = StudentProgressSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_queryset(self):
+        return (
+            StudentProgress.objects.filter(student__user=self.request.user)
+            .select_related('student__user', 'lesson__course')
+            .order_by('lesson__course_id', 'lesson__created_at')
+        )
+
+
+class CourseProgressViewSet(viewsets.ReadOnlyModelViewSet):
+    """Course progress of the signed-in learner"""
+    serializer_class = CourseProgressSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_queryset(self):
+        return (
+            CourseProgress.objects.filter(student__user=self.request.user)
+            .select_related('student__user', 'course')
+            .order_by('course__name')
+        )
+
+
+def _date_param(value):
+    if not value:
+        return None
+    parsed = parse_date(value)
+    if parsed is None:
+        raise ValueError(value)
+    return parsed
+
+
+class CanViewAnalytics(permissions.BasePermission):
+    """Staff, and teachers granted ``learning.view_attemptrollup`` (e.g. via a group).
+
+    Every signup is a parent or a learner, so user_type grants nothing here.
+    """
+
+    def has_permission(self, request, view):
+        user = request.user
+        return bool(user and user.is_authenticated and (
+            user.is_staff or user.has_perm('learning.view_attemptrollup')
+        ))
+
+
+class CourseAnalyticsView(APIView):
+    """Pass rates, averages, score distribution and time-on-task from the rollup.
+
+    Query parameters: ``course`` (slug), ``lesson``, ``assessment`` (ids),
+    ``grade_level``, ``from``/``to`` (YYYY-MM-DD) and ``group_by`` (one of
+    course, lesson, assessment, day, grade_level).
+    """
+    permission_classes = [CanViewAnalytics]
+
+    def get(self, request):
+        params = request.query_params
+        group_by = params.get('group_by') or None
+        if group_by and group_by not in analytics.GROUP_FIELDS:
+            return Response(
+                {'error': 'group_by must be one of {}'.format(', '.join(analytics.GROUP_FIELDS))},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        try:
+            filters = {
+                'course': params.get('course'),
+                'lesson': int(params['lesson']) if params.get('lesson') else None,
+                'assessment': int(params['assessment']) if params.get('assessment') else None,
+                'grade_level': params.get('grade_level'),
+                'date_from': _date_param(params.get('from')),
+                'date_to': _date_param(params.get('to')),
+            }
+        except ValueError:
+            return Response({'error': 'Invalid filter value'}, status=status.HTTP_400_BAD_REQUEST)
+
+        result = analytics.summarize(group_by=group_by, **filters)
+        key = 'groups' if group_by else 'summary'
+        return Response({'filters': filters, key: result})
+
+
+COURSE_SCORE_FIELDS = ['average_score', 'best_assessment_score', 'level']
+GLOBAL_SCORE_FIELDS = ['total_level', 'average_score', 'best_assessment_score']
+
+
+def _int_param(value, default, maximum):
+    try:
+        return max(0, min(int(value), maximum))
+    except (TypeError, ValueError):
+        return default
+
+
+class LeaderboardMixin:
+    permission_classes = [permissions.IsAuthenticated]
+
+    def course_id(self, course_slug):
+        if course_slug is None:
+            return None
+        entry = catalog.get_course(course_slug)
+        if entry is None:
+            raise Http404('No course found matching the query')
+        return entry['course'].pk
+
+    def present(self, entries, course_slug):
+        """Add learner names and named score fields to board entries.
+
+        Names are first names only; learners without a name get an
+        anonymous label, never their email address.
+        """
+        names = {
+            pk: full_name.split()[0] if full_name.strip() else 'Learner {}'.format(pk)
+            for pk, full_name in StudentProfile.objects.filter(
+                pk__in=[entry['student_id'] for entry in entries]
+            ).values_list('pk', 'user__full_name')
+        }
+        fields = COURSE_SCORE_FIELDS if course_slug else GLOBAL_SCORE_FIELDS
+        return [
+            dict(rank=entry['rank'], student_id=entry['student_id'],
+                 name=names.get(entry['student_id'], ''), **dict(zip(fields, entry['score'])))
+            for entry in entries
+        ]
+
+
+class LeaderboardView(LeaderboardMixin, APIView):
+    """Top learners of one course, or across every course"""
+
+    def get(self, request, course_slug=None):
+        course_id = self.course_id(course_slug)
+        limit = _int_param(request.query_params.get('limit'), 10, 100)
+        entries = leaderboard.top(course_id, limit)
+        return Response({'course': course_slug, 'entries': self.present(entries, course_slug)})
+
+
+class LeaderboardStandingView(LeaderboardMixin, APIView):
+    """The signed-in learner's rank with the learners just above and below"""
+
+    def get(self, request, course_slug=None):
+        course_id = self.course_id(course_slug)
+        size = _int_param(request.query_params.get('around'), 2, 10)
+        student_id = (
+            StudentProfile.objects.filter(user=request.user).values_list('pk', flat=True).first()
+        )
+        rank, entries, total = leaderboard.standing(student_id, course_id, size)
+        return Response({
+            'course': course_slug,
+            'rank': rank,
+            'ranked_learners': total,
+            'entries': self.present(entries, course_slug),
+        })
+
+
+class ActivityView(APIView):
+    """The signed-in learner's streaks and activity heatmap (``?year=`` or the last 365 days)"""
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        year = request.query_params.get('year')
+        try:
+            year = int(year) if year else None
+            if year is not None and not 1 <= year <= 9999:
+                raise ValueError(year)
+        except ValueError:
+            return Response({'error': 'Invalid year'}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(activity.summary(request.student_profile, year=year))
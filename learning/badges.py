@@ -0,0 +1,229 @@
+"""
+Badge rules engine.
+
+Badges are declared in RULES: each rule names the events it depends on, the
+counter it reads and the threshold that earns it. Progress code ``emit()``s
+events carrying counter changes, such as one more completed lesson in a
+course or one more perfect quiz. Counters are kept in BadgeCounter and
+updated with F() expressions. Only the rules indexed under the event, and
+only those whose counter the event touched, are evaluated. Evaluation
+compares those counters with the thresholds and never re-reads lesson or
+attempt history. Newly earned badges are stored with one ``bulk_create``
+and course badges are mirrored into ``CourseProgress.badges_earned``.
+``backfill()`` rebuilds the counters from history for existing learners.
+"""
+from collections import namedtuple
+from functools import partial
+
+from django.db import transaction
+from django.db.models import Count, F, Q
+
+from .models import (
+    AssessmentAttempt, ActivityCalendar, BadgeCounter, CourseProgress,
+    ProgressStamp, StudentBadge, StudentProgress
+)
+
+BadgeRule = namedtuple('BadgeRule', 'code name description events counter threshold per_course')
+
+RULES = [
+    BadgeRule('five_lessons', 'High Five', 'Complete 5 lessons in a course',
+              ['lesson_completed'], 'lessons_completed', 5, True),
+    BadgeRule('perfect_three', 'Perfect Three', 'Score 100% on 3 quizzes',
+              ['quiz_submitted'], 'perfect_quizzes', 3, False),
+    BadgeRule('week_streak', 'Week Streak', 'Learn 7 days in a row',
+              ['active_day'], 'streak', 7, False),
+    BadgeRule('difficulty_master', 'Summit', 'Master a difficulty 5 lesson',
+              ['lesson_completed'], 'hard_lessons_mastered', 1, False),
+]
+
+RULES_BY_CODE = {rule.code: rule for rule in RULES}
+RULES_BY_EVENT = {}
+for _rule in RULES:
+    for _event in _rule.events:
+        RULES_BY_EVENT.setdefault(_event, []).append(_rule)
+
+# Counters kept per course; every other counter is per learner
+COURSE_COUNTERS = {'lessons_completed'}
+# Counters whose event value replaces the stored value instead of adding to it
+ABSOLUTE_COUNTERS = {'streak'}
+
+MASTERY_SCORE = 0.9  # Share of a lesson's max score that counts as mastered
+MASTERY_DIFFICULTY = 5
+AWARD_BATCH = 200  # Badges looked up per query when awarding
+
+
+def emit(student_id, event, course_id=None, **counters):
+    """Handle a progress event once the surrounding transaction commits"""
+    transaction.on_commit(partial(handle, student_id, event, course_id, counters))
+
+
+def handle(student_id, event, course_id, counters):
+    """Apply an event's counter changes and award any badge it unlocks"""
+    changed = _update_counters(student_id, course_id, counters)
+    rules = [rule for rule in RULES_BY_EVENT.get(event, ()) if rule.counter in changed]
+    if not rules:
+        return []
+
+    scopes = {(course_id if rule.per_course else None, rule.counter) for rule in rules}
+    condition = Q()
+    for scope_course, name in scopes:
+        condition |= Q(course_id=scope_course, name=name)
+    values = {
+        (row[0], row[1]): row[2]
+        for row in BadgeCounter.objects.filter(condition, student_id=student_id)
+        .values_list('course_id', 'name', 'value')
+    }
+    values.update({(None, name): counters[name] for name in changed & ABSOLUTE_COUNTERS})
+
+    earned = []
+    for rule in rules:
+        scope_course = course_id if rule.per_course else None
+        if values.get((scope_course, rule.counter), 0) >= rule.threshold:
+            earned.append((student_id, scope_course, rule.code))
+    return award(earned)
+
+
+def _update_counters(student_id, course_id, counters):
+    changed = set()
+    for name, value in counters.items():
+        scope_course = course_id if name in COURSE_COUNTERS else None
+        if name in ABSOLUTE_COUNTERS:
+            BadgeCounter.objects.update_or_create(
+                student_id=student_id, course_id=scope_course, name=name, defaults={'value': value}
+            )
+        elif value:
+            BadgeCounter.objects.get_or_create(student_id=student_id, course_id=scope_course, name=name)
+            BadgeCounter.objects.filter(
+                student_id=student_id, course_id=scope_course, name=name
+            ).update(value=F('value') + value)
+        else:
+            continue
+        changed.add(name)
+    return changed
+
+
+def award(earned):
+    """Store (student id, course id or None, code) badges not held yet; returns the new ones"""
+    earned = list(dict.fromkeys(earned))
+    held = set()
+    for start in range(0, len(earned), AWARD_BATCH):
+        condition = Q()
+        for student_id, course_id, code in earned[start:start + AWARD_BATCH]:
+            condition |= Q(student_id=student_id, course_id=course_id, code=code)
+        held.update(StudentBadge.objects.filter(condition).values_list('student_id', 'course_id', 'code'))
+    new = [badge for badge in earned if badge not in held]
+    StudentBadge.objects.bulk_create([
+        StudentBadge(student_id=student_id, course_id=course_id, code=code)
+        for student_id, course_id, code in new
+    ], ignore_conflicts=True)
+    ProgressStamp.touch(student_id for student_id, _, _ in new)
+
+    by_row = {}
+    for student_id, course_id, code in new:
+        if course_id is not None:
+            by_row.setdefault((student_id, course_id), set()).add(code)
+    _mirror_course_badges(by_row)
+    return new
+
+
+def _mirror_course_badges(by_row):
+    rows = list(by_row)
+    for start in range(0, len(rows), AWARD_BATCH):
+        condition = Q()
+        for student_id, course_id in rows[start:start + AWARD_BATCH]:
+            condition |= Q(student_id=student_id, course_id=course_id)
+        for pk, student_id, course_id, badges in CourseProgress.objects.filter(condition).values_list(
+            'pk', 'student_id', 'course_id', 'badges_earned'
+        ):
+            merged = sorted(set(badges or []) | by_row[(student_id, course_id)])
+            if merged != badges:
+                CourseProgress.objects.filter(pk=pk).update(badges_earned=merged)
+
+
+def _mastered(status, score, lesson):
+    return (status == 'completed' and lesson.difficulty_level >= MASTERY_DIFFICULTY
+            and score >= lesson.max_score * MASTERY_SCORE)
+
+
+def lesson_changed(lesson_progress):
+    """Emit the badge event for a StudentProgress row that is about to be remembered as saved"""
+    lessons, _ = lesson_progress.completion_delta()
+    old_status, old_score, _ = lesson_progress._saved_state
+    lesson = lesson_progress.lesson
+    mastered = (int(_mastered(lesson_progress.status, lesson_progress.score, lesson))
+                - int(_mastered(old_status, old_score, lesson)))
+    if lessons or mastered:
+        emit(lesson_progress.student_id, 'lesson_completed' if lessons >= 0 else 'lesson_reopened',
+             lesson.course_id, lessons_completed=lessons, hard_lessons_mastered=mastered)
+
+
+def badge_list(student_badges):
+    """Describe StudentBadge rows for JSON responses"""
+    badges = []
+    for badge in student_badges:
+        rule = RULES_BY_CODE.get(badge.code)
+        badges.append({
+            'code': badge.code,
+            'name': rule.name if rule else badge.code,
+            'description': rule.description if rule else '',
+            'course': badge.course.slug if badge.course_id else None,
+            'earned_at': badge.earned_at,
+        })
+    return badges
+
+
+def backfill(student_ids=None):
+    """Rebuild every counter from history and award what it earns.
+
+    Returns ``(counters written, badges awarded)``.
+    """
+    from .activity import current_streak
+
+    lessons = StudentProgress.objects.filter(status='completed')
+    attempts = AssessmentAttempt.objects.filter(percentage__gte=100)
+    calendars = ActivityCalendar.objects.all()
+    if student_ids is not None:
+        lessons = lessons.filter(student_id__in=student_ids)
+        attempts = attempts.filter(user__studentprofile__in=student_ids)
+        calendars = calendars.filter(student_id__in=student_ids)
+
+    counters = {}  # (student, course or None, name) -> value
+    for student_id, course_id, count in lessons.values_list('student_id', 'course_id').annotate(
+        count=Count('id')
+    ).order_by():
+        counters[(student_id, course_id, 'lessons_completed')] = count
+    for student_id, count in lessons.filter(
+        lesson__difficulty_level__gte=MASTERY_DIFFICULTY,
+        score__gte=F('lesson__max_score') * MASTERY_SCORE,
+    ).values_list('student_id').annotate(count=Count('id')).order_by():
+        counters[(student_id, None, 'hard_lessons_mastered')] = count
+    for student_id, count in attempts.values_list('user__studentprofile').annotate(
+        count=Count('id')
+    ).order_by():
+        if student_id is not None:
+            counters[(student_id, None, 'perfect_quizzes')] = count
+
+    earned = []
+    for student_id, last_active, streak, longest in calendars.values_list(
+        'student_id', 'last_active', 'streak', 'longest_streak'
+    ):
+        counters[(student_id, None, 'streak')] = current_streak(last_active, streak)
+        if longest >= RULES_BY_CODE['week_streak'].threshold:
+            earned.append((student_id, None, 'week_streak'))
+
+    for (student_id, course_id, name), value in counters.items():
+        for rule in RULES:
+            if rule.counter == name and name not in ABSOLUTE_COUNTERS and value >= rule.threshold:
+                earned.append((student_id, course_id if rule.per_course else None, rule.code))
+
+    with transaction.atomic():
+        stale = BadgeCounter.objects.all()
+        if student_ids is not None:
+            stale = stale.filter(student_id__in=student_ids)
+        stale.delete()
+        BadgeCounter.objects.bulk_create([
+            BadgeCounter(student_id=student_id, course_id=course_id, name=name, value=value)
+            for (student_id, course_id, name), value in counters.items()
+        ], batch_size=500)
+        awarded = award(earned)
+    return len(counters), len(awarded)
@@ -0,0 +1,399 @@
+"""
+Query-count and latency benchmarks for every learning and accounts view,
+and for catalog search.
+
+``seed()`` builds a synthetic dataset of a given size (courses x lessons x
+students x attempts) and ``run_views()`` drives every URL through the Django
+test client, recording the SQL query count, wall time and peak Python memory
+of each view. Running the same views against two dataset sizes with
+``find_scaling_views()`` catches N+1 regressions: a view whose query count
+grows with the data is reported, and ``find_failed_views()`` reports views
+that did not answer 2xx/3xx, whose numbers measure an error page instead.
+
+``seed_catalog()`` and ``run_search()`` time full-text search against a
+catalog of a given number of lessons.
+
+``run_conditional()`` compares a full response of each view served with
+conditional GET against its 304 revalidation.
+
+Used by ``manage.py benchmark_views``, ``manage.py benchmark_search``,
+``manage.py benchmark_conditional`` and by the test suite.
+"""
+import random
+import statistics
+import time
+import tracemalloc
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.db import connection
+from django.db.models import Q
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from . import heartbeats, leaderboard, search
+from .models import (
+    Course, Lesson, StudentProfile, Assessment,
+    AssessmentAttempt, StudentProgress, CourseProgress
+)
+
+User = get_user_model()
+
+SIZES = {
+    'small': {'courses': 2, 'lessons': 3, 'students': 3, 'attempts': 2},
+    'medium': {'courses': 4, 'lessons': 8, 'students': 10, 'attempts': 5},
+    'large': {'courses': 6, 'lessons': 20, 'students': 30, 'attempts': 10},
+}
+
+# Course detail pages render learning/<slug>.html, so use the slugs that have one.
+COURSE_SLUGS = ['literacy', 'mathematics', 'science', 'arts', 'music', 'social_studies']
+
+PASSWORD = 'benchmark-pass'
+
+
+def seed(courses, lessons, students, attempts):
+    """Create a synthetic dataset and return the objects the views need"""
+    now = timezone.now()
+    course_objs = Course.objects.bulk_create([
+        Course(
+            name='Course {}'.format(i),
+            slug=COURSE_SLUGS[i] if i < len(COURSE_SLUGS) else 'course-{}'.format(i),
+            description='Synthetic course {}'.format(i),
+        )
+        for i in range(courses)
+    ])
+    lesson_objs = Lesson.objects.bulk_create([
+        Lesson(course=course, name='Lesson {}'.format(j), slug='lesson-{}'.format(j),
+               difficulty_level=j % 5 + 1)
+        for course in course_objs for j in range(lessons)
+    ])
+    assessment_objs = Assessment.objects.bulk_create([
+        Assessment(course=lesson.course, lesson=lesson, title='Quiz {}'.format(lesson.name),
+                   total_questions=10)
+        for lesson in lesson_objs
+    ])
+    search.rebuild()  # bulk_create skips the indexing signals
+
+    password = make_password(PASSWORD)
+    users = User.objects.bulk_create([
+        User(email='learner{}@example.com'.format(i), full_name='Learner {}'.format(i),
+             user_type='learner', password=password)
+        for i in range(students)
+    ])
+    profiles = StudentProfile.objects.bulk_create([
+        StudentProfile(user=user, age=8, grade_level='P{}'.format(i % 6 + 1))
+        for i, user in enumerate(users)
+    ])
+
+    progress_rows = []
+    attempt_rows = []
+    for profile in profiles:
+        for k, lesson in enumerate(lesson_objs):
+            completed = k % 2 == 0
+            progress_rows.append(StudentProgress(
+                student=profile, lesson=lesson, course_id=lesson.course_id,
+                status='completed' if completed else 'in_progress',
+                score=80 if completed else 0, attempts=1,
+                started_at=now - timedelta(days=k), completed_at=now if completed else None,
+                last_accessed=now,
+            ))
+        for k in range(attempts):
+            assessment = assessment_objs[k % len(assessment_objs)]
+            score = (k * 3) % 11
+            percentage, passed = assessment.grade(score)
+            attempt_rows.append(AssessmentAttempt(
+                user_id=profile.user_id, assessment=assessment, course_id=assessment.course_id,
+                score=score,
+                percentage=percentage, passed=passed,
+            ))
+    StudentProgress.objects.bulk_create(progress_rows)
+    AssessmentAttempt.objects.bulk_create(attempt_rows)
+
+    course_progress = CourseProgress.objects.bulk_create([
+        CourseProgress(student=profile, course=course)
+        for profile in profiles for course in course_objs
+    ])
+    for cp in course_progress:
+        cp.rebuild()
+
+    first_attempt = AssessmentAttempt.objects.filter(user=users[0]).first()
+    return {
+        'user': users[0],
+        'course': course_objs[0],
+        'lesson': lesson_objs[0],
+        'assessment': assessment_objs[0],
+        'attempt': first_attempt,
+    }
+
+
+def clear():
+    """Delete everything ``seed()`` created (and any other learning data)"""
+    heartbeats.buffer.take()  # Buffered for rows deleted below
+    Course.objects.all().delete()
+    User.objects.filter(email__endswith='@example.com').delete()
+
+
+def view_requests(dataset):
+    """(name, method, path, body, extra headers) for every benchmarked URL"""
+    course = dataset['course']
+    lesson = dataset['lesson']
+    assessment = dataset['assessment']
+    lesson_kwargs = {'course_slug': course.slug, 'lesson_slug': lesson.slug}
+    assessment_kwargs = {'course_slug': course.slug, 'assessment_id': assessment.id}
+    ajax = {'HTTP_X_REQUESTED_WITH': 'XMLHttpRequest'}
+    quiz = {'score': 7}
+    bulk = [{'assessment_id': assessment.id, 'score': 5}]
+
+    return [
+        # learning/urls.py
+        ('learning:lessons', 'get', reverse('learning:lessons'), None, {}),
+        ('learning:edit_profile', 'get', reverse('learning:edit_profile'), None, {}),
+        ('learning:course_list', 'get', reverse('learning:course_list'), None, {}),
+        ('learning:course_list?search', 'get',
+         reverse('learning:course_list') + '?search=less&difficulty_level=2', None, {}),
+        ('learning:course_detail', 'get', reverse('learning:course_detail', args=[course.slug]), None, {}),
+        ('learning:lesson_detail', 'get', reverse('learning:lesson_detail', kwargs=lesson_kwargs), None, {}),
+        ('learning:start_lesson', 'post', reverse('learning:start_lesson', kwargs=lesson_kwargs), None, ajax),
+        ('learning:complete_lesson', 'post', reverse('learning:complete_lesson', kwargs=lesson_kwargs), None, {}),
+        ('learning:lesson_heartbeat', 'post', reverse('learning:lesson_heartbeat', kwargs=lesson_kwargs),
+         {'seconds': 30}, ajax),
+        ('learning:assessment_detail', 'get', reverse('learning:assessment_detail', kwargs=assessment_kwargs), None, {}),
+        ('learning:take_assessment', 'get', reverse('learning:take_assessment', kwargs=assessment_kwargs), None, {}),
+        ('learning:assessment_result', 'get', reverse('learning:assessment_result', kwargs={
+            'course_slug': course.slug, 'attempt_id': dataset['attempt'].id}), None, {}),
+        ('learning:progress', 'get', reverse('learning:progress'), None, {}),
+        ('learning:progress_json', 'get', reverse('learning:progress_json'), None, {}),
+        ('learning:course_progress_detail', 'get',
+         reverse('learning:course_progress_detail', args=[course.slug]), None, {}),
+        ('learning:submit_quiz_score', 'post', reverse('learning:submit_quiz_score', kwargs={
+            'course_slug': course.slug, 'lesson_slug': lesson.slug,
+            'assessment_id': assessment.id}), quiz, {}),
+        ('learning:submit_quiz_scores_bulk', 'post', reverse('learning:submit_quiz_scores_bulk'), bulk, {}),
+        ('learning:api-course-list', 'get', reverse('learning:api-course-list'), None, {}),
+        ('learning:api-course-detail', 'get', reverse('learning:api-course-detail', args=[course.slug]), None, {}),
+        ('learning:api-lesson-list', 'get', reverse('learning:api-lesson-list'), None, {}),
+        ('learning:api-assessment-list', 'get', reverse('learning:api-assessment-list'), None, {}),
+        ('learning:api-lesson-progress-list', 'get', reverse('learning:api-lesson-progress-list'), None, {}),
+        ('learning:api-course-progress-list', 'get', reverse('learning:api-course-progress-list'), None, {}),
+        ('learning:api-activity', 'get', reverse('learning:api-activity'), None, {}),
+        ('learning:api-leaderboard', 'get', reverse('learning:api-leaderboard'), None, {}),
+        ('learning:api-course-leaderboard-me', 'get',
+         reverse('learning:api-course-leaderboard-me', args=[course.slug]), None, {}),
+        # accounts/urls.py
+        ('landing', 'get', reverse('landing'), None, {}),
+        ('signup', 'get', reverse('signup'), None, {}),
+        ('login', 'get', reverse('login'), None, {}),
+        ('index', 'get', reverse('index'), None, {}),
+        ('socials', 'get', reverse('socials'), None, {}),
+        ('progress', 'get', reverse('progress'), None, {}),
+        ('settings', 'get', reverse('settings'), None, {}),
+        ('progress_pdf_status', 'get', reverse('progress_pdf_status'), None, {}),
+        ('password_reset', 'get', reverse('password_reset'), None, {}),
+        ('password_reset_done', 'get', reverse('password_reset_done'), None, {}),
+        ('password_reset_complete', 'get', reverse('password_reset_complete'), None, {}),
+    ]
+
+
+def measure(client, method, path, body=None, headers=None):
+    """Issue one request and return its status, query count, time and peak memory"""
+    kwargs = dict(headers or {})
+    if body is not None:
+        kwargs['data'] = body
+        kwargs['content_type'] = 'application/json'
+
+    tracemalloc.start()
+    started = time.perf_counter()
+    with CaptureQueriesContext(connection) as ctx:
+        response = getattr(client, method)(path, **kwargs)
+        if getattr(response, 'streaming', False):
+            for _ in response.streaming_content:
+                pass
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        'status': response.status_code,
+        'queries': len(ctx.captured_queries),
+        'time_ms': round(elapsed * 1000, 2),
+        'peak_kb': round(peak / 1024, 1),
+        'bytes': len(response.content) if not getattr(response, 'streaming', False) else None,
+    }
+
+
+def run_views(dataset, warmup=True):
+    """Drive every view as the dataset's learner; returns {view name: measurement}"""
+    client = Client(raise_request_exception=False)
+    client.login(email=dataset['user'].email, password=PASSWORD)
+
+    # Boards built from an earlier dataset would be stale; syncing them on
+    # every read keeps their query count independent of timing.
+    leaderboard.boards.reset()
+    results = {}
+    with override_settings(LEADERBOARD_SYNC_SECONDS=0):
+        for name, method, path, body, headers in view_requests(dataset):
+            if warmup:
+                measure(client, method, path, body, headers)
+            results[name] = measure(client, method, path, body, headers)
+    return results
+
+
+# Views served with conditional GET (see conditional.py)
+CONDITIONAL_VIEWS = ['learning:course_list', 'learning:course_detail', 'learning:progress', 'learning:progress_json']
+
+
+def _timed_get(client, path, repeat, headers):
+    wall, cpu = [], []
+    for _ in range(repeat):
+        started, cpu_started = time.perf_counter(), time.process_time()
+        with CaptureQueriesContext(connection) as ctx:
+            response = client.get(path, **headers)
+        wall.append((time.perf_counter() - started) * 1000)
+        cpu.append((time.process_time() - cpu_started) * 1000)
+    return response, {
+        'status': response.status_code,
+        'queries': len(ctx.captured_queries),
+        'median_ms': round(statistics.median(wall), 2),
+        'cpu_ms': round(statistics.median(cpu), 2),
+        'bytes': len(response.content),
+    }
+
+
+def run_conditional(dataset, repeat=20):
+    """Measure each of ``CONDITIONAL_VIEWS`` fully and revalidated with If-None-Match.
+
+    Returns ``{view name: {'full': measurement, 'revalidated': measurement}}``;
+    measurements hold status, queries, median wall and CPU ms, and body bytes.
+    """
+    client = Client(raise_request_exception=False)
+    client.login(email=dataset['user'].email, password=PASSWORD)
+    paths = {name: path for name, method, path, _, _ in view_requests(dataset) if method == 'get'}
+    results = {}
+    for name in CONDITIONAL_VIEWS:
+        response, full = _timed_get(client, paths[name], repeat, {})
+        _, revalidated = _timed_get(client, paths[name], repeat,
+                                    {'HTTP_IF_NONE_MATCH': response.get('ETag', '')})
+        results[name] = {'full': full, 'revalidated': revalidated}
+    return results
+
+
+def count_queries(func, *args, **kwargs):
+    """Call ``func`` and return how many SQL queries it issued"""
+    with CaptureQueriesContext(connection) as ctx:
+        func(*args, **kwargs)
+    return len(ctx.captured_queries)
+
+
+def assert_constant_queries(func, grow, sizes=(10, 1000)):
+    """Check ``func()`` issues the same number of queries at every data size.
+
+    ``grow(n)`` is called to bring the data up to each size in turn before
+    ``func`` is measured; raises AssertionError naming the counts otherwise.
+    """
+    counts = []
+    for size in sizes:
+        grow(size)
+        counts.append(count_queries(func))
+    if len(set(counts)) > 1:
+        raise AssertionError('Query count grows with the data: {}'.format(
+            ', '.join('{} rows -> {} queries'.format(n, c) for n, c in zip(sizes, counts))
+        ))
+    return counts[0]
+
+
+def find_failed_views(results):
+    """Return {view: status} for views that did not answer with a 2xx or 3xx status"""
+    return {name: m['status'] for name, m in results.items() if not 200 <= m['status'] < 400}
+
+
+def find_scaling_views(small, large, tolerance=0):
+    """Return {view: (small queries, large queries)} for views whose query count grew"""
+    grown = {}
+    for name, measurement in small.items():
+        other = large.get(name)
+        if other and other['queries'] > measurement['queries'] + tolerance:
+            grown[name] = (measurement['queries'], other['queries'])
+    return grown
+
+
+def find_regressions(baseline, current, tolerance=0):
+    """Return {view: (baseline queries, current queries)} for views now issuing more queries"""
+    return find_scaling_views(baseline, current, tolerance)
+
+
+# Lesson names for search benchmarks are built from these words
+SEARCH_WORDS = (
+    'adding animals alphabet art bees birds blending bodies capitals caring cells circles '
+    'clocks clouds colours counting dancing days dinosaurs division drawing drums earth '
+    'energy farms feelings fish floating forces fractions friends fruit grammar graphs '
+    'habitats health history insects islands kindness letters light machines magnets '
+    'maps markets measuring melody money months moon music numbers oceans painting '
+    'patterns phonics planets plants poems puzzles rain reading rhythm rivers rocks '
+    'rwanda seasons seeds senses shapes singing sinking soil songs sounds space spelling '
+    'stories subtracting sun symmetry telling time trees volcanoes water weather words writing'
+).split()
+SEARCH_QUERIES = ['dino', 'plant', 'frac', 'counting', 'sha col', 'mus rhy', 'read stories', 'wa']
+
+
+def seed_catalog(lessons, lessons_per_course=100, topics_per_course=10):
+    """Create a catalog of ``lessons`` lessons, one assessment per lesson, and index it.
+
+    Each course covers a few topics from SEARCH_WORDS and names its lessons after them.
+    """
+    rng = random.Random(0)
+    topics = [rng.sample(SEARCH_WORDS, topics_per_course)
+              for _ in range(max(1, lessons // lessons_per_course))]
+    courses = Course.objects.bulk_create([
+        Course(name='{} and {}'.format(*words[:2]).capitalize(), slug='catalog-{}'.format(i),
+               description=' '.join(words))
+        for i, words in enumerate(topics)
+    ])
+    for start in range(0, lessons, 5000):
+        lesson_objs = []
+        for i in range(start, min(lessons, start + 5000)):
+            words = topics[i % len(courses)]
+            lesson_objs.append(Lesson(
+                course=courses[i % len(courses)], name=' '.join(rng.sample(words, 3)).capitalize(),
+                slug='lesson-{}'.format(i), difficulty_level=rng.randint(1, 5),
+            ))
+        lesson_objs = Lesson.objects.bulk_create(lesson_objs)
+        Assessment.objects.bulk_create([
+            Assessment(course_id=lesson.course_id, lesson=lesson, title='Quiz: ' + lesson.name,
+                       total_questions=10)
+            for lesson in lesson_objs
+        ])
+    search.rebuild()
+
+
+def run_search(queries=SEARCH_QUERIES, repeat=20, difficulty=None):
+    """Time ``search.course_ids()`` and the old icontains scan for each query.
+
+    Returns ``{query: {'courses', 'median_ms', 'p95_ms', 'icontains_ms'}}``.
+    """
+    results = {}
+    for query in queries:
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            ids = search.course_ids(query, difficulty=difficulty)
+            timings.append((time.perf_counter() - started) * 1000)
+
+        # What CourseListView did, extended to lesson names
+        scan = Q()
+        for word in search.terms(query):
+            scan &= Q(name__icontains=word) | Q(description__icontains=word) | Q(lessons__name__icontains=word)
+        started = time.perf_counter()
+        list(Course.objects.filter(scan).distinct().values_list('pk', flat=True))
+        scanned = (time.perf_counter() - started) * 1000
+
+        timings.sort()
+        results[query] = {
+            'courses': len(ids),
+            'median_ms': round(statistics.median(timings), 2),
+            'p95_ms': round(timings[min(len(timings) - 1, int(len(timings) * 0.95))], 2),
+            'icontains_ms': round(scanned, 2),
+        }
+    return results
@@ -0,0 +1,139 @@
+"""
+Versioned cache for the course catalog (courses, ordered lessons, assessments).
+
+Catalog data changes rarely but is read on every catalog page. Entries are
+stored in the ``catalog`` cache (see ``CATALOG_CACHE_BACKEND`` in settings)
+under the current catalog version, with a small per-process LRU in front of
+it. Saving or deleting a Course, Lesson or Assessment bumps the version,
+which makes every older entry unreachable.
+
+The version is only shared by the processes that share the cache. With the
+``file`` or ``redis`` backend a bump reaches every worker at once. With
+``locmem`` each process has its own version, so the version and stamp keys
+expire after ``CATALOG_VERSION_TIMEOUT`` seconds: other workers serve a
+stale catalog for at most that long. Run multi-process deployments (e.g.
+gunicorn with several workers) on a shared backend.
+"""
+import threading
+import uuid
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils import timezone
+
+from .models import Course
+
+VERSION_KEY = 'catalog:version'
+STAMP_KEY = 'catalog:stamp:{}'
+_MISSING = object()
+
+
+class LRUCache:
+    """Small thread-safe least-recently-used mapping"""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                self._data.move_to_end(key)
+            except KeyError:
+                return default
+            return self._data[key]
+
+    def set(self, key, value):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+_local = LRUCache(getattr(settings, 'CATALOG_LRU_SIZE', 256))
+
+
+def _cache():
+    return caches['catalog']
+
+
+def _version_timeout():
+    """Lifetime of the version and stamp keys; None (forever) on shared caches"""
+    return getattr(settings, 'CATALOG_VERSION_TIMEOUT', 0) or None
+
+
+def current_version():
+    version = _cache().get(VERSION_KEY)
+    if version is None:
+        version = uuid.uuid4().hex
+        if not _cache().add(VERSION_KEY, version, timeout=_version_timeout()):
+            version = _cache().get(VERSION_KEY, version)
+    return version
+
+
+def invalidate(course_ids=()):
+    """Make every cached catalog entry stale, in every process sharing the cache.
+
+    The catalog stamp and those of ``course_ids`` change too.
+    """
+    now = timezone.now()
+    _cache().set_many({
+        VERSION_KEY: uuid.uuid4().hex,
+        **{STAMP_KEY.format(key): (uuid.uuid4().hex, now) for key in ['all', *course_ids]},
+    }, timeout=_version_timeout())
+    _local.clear()
+
+
+def stamp(course_id=None):
+    """``(token, changed_at)`` of the whole catalog, or of one course.
+
+    Used for conditional GETs: the token changes whenever the catalog (or
+    that course, its lessons or its assessments) does.
+    """
+    key = STAMP_KEY.format('all' if course_id is None else course_id)
+    value = _cache().get(key)
+    if value is None:
+        value = (uuid.uuid4().hex, timezone.now())
+        if not _cache().add(key, value, timeout=_version_timeout()):
+            value = _cache().get(key, value)
+    return value
+
+
+def _get_or_build(name, build):
+    key = 'catalog:{}:{}'.format(current_version(), name)
+    value = _local.get(key, _MISSING)
+    if value is _MISSING:
+        value = _cache().get(key, _MISSING)
+        if value is _MISSING:
+            value = build()
+            _cache().set(key, value, timeout=getattr(settings, 'CATALOG_CACHE_TIMEOUT', 3600))
+        _local.set(key, value)
+    return value
+
+
+def get_course_list():
+    """All courses, newest first"""
+    return _get_or_build('courses', lambda: list(Course.objects.order_by('-created_at')))
+
+
+def get_course(slug):
+    """Return ``{'course', 'lessons', 'assessments'}`` for a course slug, or None"""
+    def build():
+        course = Course.objects.filter(slug=slug).first()
+        if course is None:
+            return None
+        return {
+            'course': course,
+            'lessons': list(course.lessons.order_by('created_at')),
+            'assessments': list(course.assessments.all()),
+        }
+    return _get_or_build('course:{}'.format(slug), build)
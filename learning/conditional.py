@@ -0,0 +1,112 @@
+"""
+Conditional GET from version stamps.
+
+``conditional(stamp_func)`` wraps a view whose content is fully described
+by version stamps: the learner's ProgressStamp and the catalog stamps (see
+``catalog.stamp()``). ``stamp_func(request, *args, **kwargs)`` returns a
+``Stamp``, or None to serve the request without validators. The ETag is a
+hash of the stamp's parts and Last-Modified is its newest change. When the
+request's If-None-Match or If-Modified-Since still match, a 304 is returned
+before the view runs, so no queryset is built and nothing is serialized.
+
+Responses are marked ``private, no-cache``: browsers keep them but
+revalidate every time, and shared caches never store them.
+"""
+import hashlib
+from datetime import datetime, time
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.contrib import messages
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+
+from . import catalog
+from .models import ProgressStamp
+
+
+class Stamp:
+    """Validators of one response.
+
+    ``parts`` must identify the content exactly. ``weak`` is for HTML pages,
+    whose bytes differ between renders (CSRF tokens) while their content
+    does not.
+    """
+
+    def __init__(self, parts, changed_at, weak=False):
+        self.parts = parts
+        self.changed_at = changed_at
+        self.weak = weak
+
+    @property
+    def etag(self):
+        digest = hashlib.sha1('|'.join(str(part) for part in self.parts).encode()).hexdigest()[:32]
+        return '{}"{}"'.format('W/' if self.weak else '', digest)
+
+    @property
+    def last_modified(self):
+        changed = [moment for moment in self.changed_at if moment is not None]
+        return int(max(changed).timestamp()) if changed else None
+
+
+def progress_stamp(request, *parts, course_id=None, html=False, today=False):
+    """A Stamp of the user's progress and the catalog (or one course), plus ``parts``.
+
+    ``html`` gives a weak ETag, and no stamp while flash messages are
+    waiting to be shown. ``today`` is for content that depends on the date
+    (streaks): the ETag includes it and Last-Modified is at least midnight.
+    """
+    if html and len(messages.get_messages(request)):
+        return None
+    user = request.user
+    token, changed_at = ProgressStamp.for_user(user.pk) if user.is_authenticated else (None, None)
+    catalog_token, catalog_changed_at = catalog.stamp(course_id)
+    parts = (request.path, user.pk, token, catalog_token) + parts
+    changed = [changed_at, catalog_changed_at]
+    if today:
+        date = timezone.localdate()
+        parts += (date,)
+        changed.append(timezone.make_aware(datetime.combine(date, time.min)))
+    return Stamp(parts, changed, weak=html)
+
+
+def _check(stamp_func, request, args, kwargs):
+    if request.method not in ('GET', 'HEAD'):
+        return None, None
+    stamp = stamp_func(request, *args, **kwargs)
+    if stamp is None:
+        return None, None
+    return stamp, get_conditional_response(
+        request, etag=stamp.etag, last_modified=stamp.last_modified
+    )
+
+
+def _finish(response, stamp):
+    if stamp is not None and response.status_code in (200, 304):
+        response.headers.setdefault('ETag', stamp.etag)
+        if stamp.last_modified is not None:
+            response.headers.setdefault('Last-Modified', http_date(stamp.last_modified))
+        patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+def conditional(stamp_func):
+    """Serve 304 Not Modified from ``stamp_func`` before the view runs"""
+    def decorator(view):
+        if iscoroutinefunction(view):
+            @wraps(view)
+            async def inner(request, *args, **kwargs):
+                stamp, response = await sync_to_async(_check)(stamp_func, request, args, kwargs)
+                if response is None:
+                    response = await view(request, *args, **kwargs)
+                return _finish(response, stamp)
+        else:
+            @wraps(view)
+            def inner(request, *args, **kwargs):
+                stamp, response = _check(stamp_func, request, args, kwargs)
+                if response is None:
+                    response = view(request, *args, **kwargs)
+                return _finish(response, stamp)
+        return inner
+    return decorator
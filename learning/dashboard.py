@@ -0,0 +1,111 @@
+"""
+Per-learner dashboard read model.
+
+The dashboard and progress JSON views used to run a handful of queries on
+every page load. Instead, the progress pipeline calls ``refresh_dashboards()``
+whenever a learner's progress changes, and the views read the stored
+StudentDashboardSnapshot with one primary-key lookup. The stored data is
+shaped like StudentDashboardSerializer, with a ``stats`` entry shaped like
+ProgressStatsSerializer.
+"""
+from django.db.models import Avg, Count, Q, Sum
+
+from .activity import current_streak
+from .models import (
+    Course, StudentProfile, AssessmentAttempt, StudentProgress,
+    CourseProgress, StudentDashboardSnapshot, ActivityCalendar
+)
+from .serializers import (
+    StudentProfileSerializer, AssessmentAttemptSerializer, CourseProgressSerializer
+)
+
+RECENT_ATTEMPTS = 5
+
+
+def build_dashboard_data(student_profile):
+    """Compute the dashboard data for one learner from the progress tables"""
+    course_progress = list(
+        CourseProgress.objects.filter(student=student_profile)
+        .select_related('student__user', 'course')
+        .order_by('course__name')
+    )
+    recent_attempts = (
+        AssessmentAttempt.objects.filter(user_id=student_profile.user_id)
+        .select_related('user', 'assessment')[:RECENT_ATTEMPTS]
+    )
+    lessons = StudentProgress.objects.filter(student=student_profile).aggregate(
+        total=Count('id'),
+        completed=Count('id', filter=Q(status='completed')),
+        in_progress=Count('id', filter=Q(status='in_progress')),
+    )
+    attempts = AssessmentAttempt.objects.filter(user_id=student_profile.user_id).aggregate(
+        taken=Count('id'),
+        passed=Count('id', filter=Q(passed=True)),
+        average=Avg('percentage'),
+    )
+
+    last_active, streak = (
+        ActivityCalendar.objects.filter(student=student_profile)
+        .values_list('last_active', 'streak').first() or (None, 0)
+    )
+    completed_courses = sum(
+        1 for cp in course_progress if cp.status in ('completed', 'mastered')
+    )
+    stats = {
+        'total_courses': Course.objects.count(),
+        'completed_courses': completed_courses,
+        'total_lessons': lessons['total'],
+        'completed_lessons': lessons['completed'],
+        'in_progress_lessons': lessons['in_progress'],
+        'completion_rate': (
+            lessons['completed'] / lessons['total'] * 100 if lessons['total'] else 0
+        ),
+        'total_assessments_taken': attempts['taken'],
+        'passed_assessments': attempts['passed'],
+        'average_score': attempts['average'] or 0.0,
+        'current_streak': current_streak(last_active, streak),
+    }
+
+    return {
+        'student_profile': StudentProfileSerializer(student_profile).data,
+        'enrolled_courses': len(course_progress),
+        'completed_courses': completed_courses,
+        'total_lessons_completed': sum(cp.total_lessons_completed for cp in course_progress),
+        'recent_attempts': AssessmentAttemptSerializer(recent_attempts, many=True).data,
+        'course_progress': CourseProgressSerializer(course_progress, many=True).data,
+        'stats': stats,
+    }
+
+
+def refresh_dashboard(student_profile):
+    """Rebuild and store the snapshot for one learner"""
+    data = build_dashboard_data(student_profile)
+    StudentDashboardSnapshot.objects.update_or_create(
+        user_id=student_profile.user_id, defaults={'data': data}
+    )
+    return data
+
+
+def refresh_dashboards(student_ids):
+    """Rebuild the snapshots of the given StudentProfile ids"""
+    for student_profile in StudentProfile.objects.filter(pk__in=student_ids).select_related('user'):
+        refresh_dashboard(student_profile)
+
+
+def get_dashboard_data(user):
+    """Return the stored dashboard data for ``user``, building it if missing.
+
+    The current streak depends on today's date, so it is read from the
+    activity calendar in the same query rather than from the snapshot.
+    """
+    calendar = 'user__studentprofile__activity_calendar__'
+    row = (
+        StudentDashboardSnapshot.objects.filter(pk=user.pk)
+        .values_list('data', calendar + 'last_active', calendar + 'streak').first()
+    )
+    if row is None:
+        student_profile = StudentProfile.for_user(user)
+        return refresh_dashboard(student_profile)
+    data, last_active, streak = row
+    data['stats']['current_streak'] = current_streak(last_active, streak or 0)
+    return data
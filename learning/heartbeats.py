@@ -0,0 +1,155 @@
+"""
+Write-behind buffer for lesson heartbeats.
+
+While a lesson is open, ``static/js/timer.js`` posts a heartbeat every
+``HEARTBEAT_INTERVAL_SECONDS`` with the seconds spent on it since the last
+one. Heartbeats only add to a buffer in this process, keyed by (user,
+lesson), so they cost no database write. A heartbeat is credited with at
+most the time since the previous one, so posting faster gains nothing. Every ``HEARTBEAT_FLUSH_SECONDS``
+the request that finds the buffer due writes it out: one UPDATE per
+(student, lesson) adds the buffered time to ``StudentProgress.time_spent``
+and moves ``last_accessed`` forward. The buffer is also flushed when the
+process exits, so a crash loses at most one flush interval of time.
+"""
+import atexit
+import logging
+import math
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import DurationField, ExpressionWrapper, Value
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+
+from .models import Lesson, ProgressStamp, StudentProfile, StudentProgress
+
+logger = logging.getLogger('learning')
+
+
+def max_seconds():
+    """Longest time one heartbeat may claim; longer gaps are idle time"""
+    return 2 * settings.HEARTBEAT_INTERVAL_SECONDS
+
+
+class Buffer:
+    """Thread-safe ``{(user id, lesson id): [seconds, last seen]}``"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._last_seen = {}
+        self._flushed_at = time.monotonic()
+
+    def add(self, user_id, lesson_id, seconds, at):
+        """Buffer one heartbeat; True when the caller should flush now.
+
+        ``seconds`` is cut to the time elapsed since the previous heartbeat
+        for the same (user, lesson).
+        """
+        key = (user_id, lesson_id)
+        with self._lock:
+            last = self._last_seen.get(key)
+            if last is not None:
+                seconds = min(seconds, max((at - last).total_seconds(), 0.0))
+            self._last_seen[key] = max(last or at, at)
+            entry = self._pending.setdefault(key, [0.0, at])
+            entry[0] += seconds
+            entry[1] = max(entry[1], at)
+            now = time.monotonic()
+            if now - self._flushed_at < settings.HEARTBEAT_FLUSH_SECONDS:
+                return False
+            self._flushed_at = now  # Only one caller gets to flush
+            return True
+
+    def take(self):
+        """Everything buffered so far, leaving the buffer empty"""
+        # Heartbeats older than max_seconds() no longer limit the next one
+        horizon = timezone.now() - timedelta(seconds=max_seconds())
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._last_seen = {key: at for key, at in self._last_seen.items() if at > horizon}
+            return pending
+
+    def restore(self, pending):
+        """Put back entries that could not be written"""
+        with self._lock:
+            for key, (seconds, at) in pending.items():
+                entry = self._pending.setdefault(key, [0.0, at])
+                entry[0] += seconds
+                entry[1] = max(entry[1], at)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._pending)
+
+
+buffer = Buffer()
+
+
+def beat(user_id, lesson_id, seconds=0, at=None):
+    """Buffer a heartbeat; True when a flush is due.
+
+    ``seconds`` is clamped to ``max_seconds()``, so a tab left open in the
+    background does not count as time on task, and to the time since the
+    previous heartbeat (see ``Buffer.add``). NaN and infinities raise
+    ValueError: they would make the whole buffer unwritable.
+    """
+    seconds = float(seconds or 0)
+    if not math.isfinite(seconds):
+        raise ValueError('Heartbeat seconds must be finite, not {!r}'.format(seconds))
+    seconds = min(max(seconds, 0.0), max_seconds())
+    return buffer.add(user_id, lesson_id, seconds, at or timezone.now())
+
+
+def flush():
+    """Write every buffered heartbeat; returns the number of rows updated"""
+    pending = buffer.take()
+    if not pending:
+        return 0
+    try:
+        return _write(pending)
+    except Exception:
+        # Whatever went wrong, the heartbeats of every learner are kept
+        buffer.restore(pending)
+        raise
+
+
+def _write(pending):
+    students = dict(StudentProfile.objects.filter(
+        user_id__in={user_id for user_id, _ in pending}
+    ).values_list('user_id', 'pk'))
+    updated = set()
+    with transaction.atomic():
+        for (user_id, lesson_id), (seconds, at) in pending.items():
+            student_id = students.get(user_id)
+            if student_id is None:
+                continue
+            rows = StudentProgress.objects.filter(student_id=student_id, lesson_id=lesson_id)
+            changes = {
+                'time_spent': ExpressionWrapper(
+                    Coalesce('time_spent', Value(timedelta(0))) + Value(timedelta(seconds=seconds)),
+                    output_field=DurationField(),
+                ),
+                'last_accessed': Greatest(Coalesce('last_accessed', Value(at)), Value(at)),
+            }
+            if not rows.update(**changes):
+                # A heartbeat for a lesson that was never started starts it
+                lesson = Lesson.objects.filter(pk=lesson_id).first()
+                if lesson is None:
+                    continue
+                StudentProgress.start(student_id, lesson, now=at)
+                rows.update(**changes)
+            updated.add((student_id, lesson_id))
+        ProgressStamp.touch({student_id for student_id, _ in updated})
+    return len(updated)
+
+
+@atexit.register
+def _flush_at_exit():
+    try:
+        flush()
+    except Exception:
+        logger.exception('Could not flush %d buffered heartbeats at exit', len(buffer))
@@ -0,0 +1,213 @@
+"""
+Bulk ingestion of assessment attempts uploaded by offline tablets.
+
+Attempts are validated against one prefetched assessment map, inserted with
+a single ``bulk_create`` and followed by one lesson/course progress update
+per affected row instead of one signal cascade per attempt. Lesson progress
+is written with the same insert-if-missing and guarded UPDATEs as
+``StudentProgress.complete()``, so concurrent uploads never overwrite each
+other's scores. Each attempt may
+carry a ``client_attempt_id``; attempts whose key is already stored for the
+user are reported as duplicates, so a client can safely retry an upload.
+"""
+from datetime import timedelta
+from itertools import islice
+
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Value, When
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+
+from . import activity, analytics, badges, progress
+from .models import Assessment, AssessmentAttempt, ProgressStamp, StudentProfile, StudentProgress
+
+MAX_BULK_ATTEMPTS = 1000
+
+
+class BulkIngestError(ValueError):
+    """The upload as a whole cannot be processed"""
+
+
+def _build_attempt(user, item, assessments):
+    """Return (unsaved attempt, None) or (None, error message)"""
+    if not isinstance(item, dict):
+        return None, 'Attempt must be an object'
+    try:
+        assessment = assessments[int(item.get('assessment_id'))]
+    except (TypeError, ValueError, KeyError):
+        return None, 'Unknown assessment'
+    try:
+        score = int(item.get('score'))
+    except (TypeError, ValueError):
+        return None, 'Score must be an integer'
+    if not 0 <= score <= assessment.total_questions:
+        return None, 'Score out of range'
+
+    key = item.get('client_attempt_id')
+    if key is not None and (not isinstance(key, str) or not 0 < len(key) <= 64):
+        return None, 'client_attempt_id must be a string of 1-64 characters'
+
+    time_taken = item.get('time_taken')
+    if time_taken is not None:
+        try:
+            time_taken = timedelta(seconds=float(time_taken))
+        except (TypeError, ValueError):
+            return None, 'time_taken must be a number of seconds'
+
+    answers = item.get('answers') or {}
+    percentage, passed = assessment.grade(score)
+    return AssessmentAttempt(
+        user=user,
+        assessment=assessment,
+        score=score,
+        percentage=percentage,
+        passed=passed,
+        time_taken=time_taken,
+        answers=answers,
+        client_attempt_id=key,
+        course_id=assessment.course_id,
+    ), None
+
+
+def ingest_attempts(user, items):
+    """Validate and store a batch of attempts for ``user``.
+
+    Returns one result dict per item, in order, with a ``status`` of
+    ``created``, ``duplicate`` or ``error``.
+    """
+    items = list(islice(items, MAX_BULK_ATTEMPTS + 1))
+    if len(items) > MAX_BULK_ATTEMPTS:
+        raise BulkIngestError('At most {} attempts per upload'.format(MAX_BULK_ATTEMPTS))
+
+    assessment_ids = set()
+    for item in items:
+        try:
+            assessment_ids.add(int(item.get('assessment_id')))
+        except (AttributeError, TypeError, ValueError):
+            pass
+    assessments = Assessment.objects.select_related('lesson').in_bulk(assessment_ids)
+
+    # Keys of any other type are reported per item by _build_attempt()
+    keys = {
+        item['client_attempt_id'] for item in items
+        if isinstance(item, dict) and isinstance(item.get('client_attempt_id'), str)
+    }
+    existing = dict(
+        AssessmentAttempt.objects.filter(user=user, client_attempt_id__in=keys)
+        .values_list('client_attempt_id', 'id')
+    )
+
+    results = []
+    new_attempts = []
+    for index, item in enumerate(items):
+        attempt, error = _build_attempt(user, item, assessments)
+        if error:
+            results.append({'index': index, 'status': 'error', 'error': error})
+            continue
+        key = attempt.client_attempt_id
+        if key is not None and key in existing:
+            results.append({'index': index, 'status': 'duplicate',
+                            'client_attempt_id': key, 'attempt_id': existing[key]})
+            continue
+        if key is not None:
+            existing[key] = None  # duplicate within the same upload
+        new_attempts.append(attempt)
+        results.append({'index': index, 'status': 'created', 'client_attempt_id': key,
+                        '_attempt': attempt})
+
+    with progress.unit_of_work(), transaction.atomic():
+        AssessmentAttempt.objects.bulk_create(new_attempts)
+        if new_attempts:
+            _update_progress(user, new_attempts)
+
+    for result in results:
+        attempt = result.pop('_attempt', None)
+        if attempt is not None:
+            result['attempt_id'] = attempt.pk
+    return results
+
+
+def _update_progress(user, attempts):
+    """Apply what the AssessmentAttempt post_save receiver does, once per row"""
+    student_profile = StudentProfile.for_user(user)
+    now = timezone.now()
+    analytics.record_attempts(attempts, student_profile.grade_level)
+    for day in {timezone.localdate(attempt.completed_at) for attempt in attempts}:
+        activity.record(student_profile.pk, day)
+    badges.emit(student_profile.pk, 'quiz_submitted',
+                perfect_quizzes=sum(attempt.percentage >= 100 for attempt in attempts))
+    ProgressStamp.touch([student_profile.pk])
+
+    lesson_scores = {}
+    lesson_attempts = {}
+    for attempt in attempts:
+        assessment = attempt.assessment
+        if assessment.lesson_id:
+            # Like StudentProgress.complete(): keep the best score, count every attempt
+            _, best = lesson_scores.get(assessment.lesson_id, (None, attempt.score))
+            lesson_scores[assessment.lesson_id] = (assessment.lesson, max(best, attempt.score))
+            lesson_attempts[assessment.lesson_id] = lesson_attempts.get(assessment.lesson_id, 0) + 1
+        progress.record(
+            student_profile.pk,
+            assessment.course_id,
+            attempts=1,
+            best_percentage=attempt.percentage,
+            passed=attempt.passed,
+            started_at=attempt.completed_at,
+        )
+
+    if not lesson_scores:
+        return
+    rows = StudentProgress.objects.filter(student=student_profile, lesson_id__in=lesson_scores)
+    # Like StudentProgress.complete(): rows are added as not started, ignoring
+    # rows a concurrent writer added first, then completed by guarded UPDATEs
+    StudentProgress.objects.bulk_create([
+        StudentProgress(student=student_profile, lesson=lesson, course_id=lesson.course_id, started_at=now)
+        for lesson, _ in lesson_scores.values()
+    ], ignore_conflicts=True)
+    # Locked, so the deltas below are worked out from the state being updated
+    saved = {row.lesson_id: row for row in rows.select_for_update()}
+
+    completed = {}
+    improved = {}
+    for lesson_id, (lesson, score) in lesson_scores.items():
+        row = saved.get(lesson_id)
+        if row is None:
+            continue  # Deleted along with its lesson meanwhile
+        row.lesson = lesson
+        if row.status == 'completed':
+            if score <= row.score:
+                continue
+            improved[lesson_id] = row.score = score
+        else:
+            completed[lesson_id] = row.score = score
+            row.status = 'completed'
+            row.completed_at = now
+
+        lessons, score_delta = row.completion_delta()
+        progress.record(
+            student_profile.pk,
+            lesson.course_id,
+            lessons=lessons,
+            score=score_delta,
+            last_lesson_date=now,
+        )
+        badges.lesson_changed(row)
+        row._remember_completion()
+
+    if completed:
+        rows.filter(lesson_id__in=completed).exclude(status='completed').update(
+            status='completed', score=_per_lesson(completed), completed_at=now,
+            started_at=Coalesce('started_at', Value(now)),
+        )
+    if improved:
+        rows.filter(lesson_id__in=improved, status='completed').update(
+            score=Greatest('score', _per_lesson(improved)),
+        )
+    rows.update(attempts=F('attempts') + _per_lesson(lesson_attempts), last_accessed=now)
+
+
+def _per_lesson(values):
+    """``{lesson id: value}`` as an expression over StudentProgress rows"""
+    return Case(*[When(lesson_id=lesson_id, then=Value(value)) for lesson_id, value in values.items()],
+                default=Value(0), output_field=IntegerField())
@@ -0,0 +1,198 @@
+"""
+Per-course and global leaderboards kept in memory.
+
+Each board is a sorted array of ranking keys, so "top N" is a slice and "my
+rank" is a binary search, instead of ORDER BY ... OFFSET over every
+CourseProgress row per request. Course boards rank learners by average
+score, then best assessment score, then level. The global board ranks them
+by their summed levels, then mean average score, then best assessment score.
+
+The boards are built from the database the first time they are used in a
+process. The progress pipeline calls ``refresh()`` for the rows it changes.
+Rows changed by other processes, such as the progress worker, are picked up
+from ``CourseProgress.updated_at`` every ``LEADERBOARD_SYNC_SECONDS``. A full
+rebuild runs every ``LEADERBOARD_REBUILD_SECONDS`` to drop deleted rows.
+"""
+import threading
+import time
+from bisect import bisect_left, insort
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Max, Q
+
+from .models import CourseProgress
+
+# Rows written with a timestamp slightly older than the sync watermark (for
+# example by a transaction that committed late) are still picked up.
+SYNC_MARGIN = timedelta(seconds=5)
+
+RANKED = Q(total_lessons_completed__gt=0) | Q(attempts_count__gt=0)
+ROW_FIELDS = ['student_id', 'course_id', 'average_score', 'best_assessment_score',
+              'level', 'total_lessons_completed', 'attempts_count']
+
+
+class SortedBoard:
+    """Ranking kept as a sorted list of ``(*score, student_id)`` keys.
+
+    Scores are stored negated so the best entry sorts first. Learners with
+    equal scores share a rank.
+    """
+
+    def __init__(self):
+        self._keys = []
+        self._by_student = {}
+
+    def __len__(self):
+        return len(self._keys)
+
+    def set(self, student_id, score):
+        key = tuple(-value for value in score) + (student_id,)
+        old = self._by_student.get(student_id)
+        if old == key:
+            return
+        if old is not None:
+            del self._keys[bisect_left(self._keys, old)]
+        self._by_student[student_id] = key
+        insort(self._keys, key)
+
+    def remove(self, student_id):
+        old = self._by_student.pop(student_id, None)
+        if old is not None:
+            del self._keys[bisect_left(self._keys, old)]
+
+    def _entry(self, key):
+        return {
+            'rank': bisect_left(self._keys, key[:-1]) + 1,
+            'student_id': key[-1],
+            'score': tuple(-value for value in key[:-1]),
+        }
+
+    def top(self, n):
+        return [self._entry(key) for key in self._keys[:n]]
+
+    def rank(self, student_id):
+        key = self._by_student.get(student_id)
+        return None if key is None else bisect_left(self._keys, key[:-1]) + 1
+
+    def around(self, student_id, size):
+        """The learner's entry with up to ``size`` neighbours on each side"""
+        key = self._by_student.get(student_id)
+        if key is None:
+            return []
+        index = bisect_left(self._keys, key)
+        return [self._entry(k) for k in self._keys[max(0, index - size):index + size + 1]]
+
+
+class Leaderboards:
+    """Every course board plus the global board, synchronised with CourseProgress"""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._boards = {}  # course id (None for global) -> SortedBoard
+            self._courses = {}  # student id -> {course id: (average, best, level)}
+            self._built_at = None
+            self._checked_at = 0.0
+            self._watermark = None
+
+    def board(self, course_id=None):
+        with self._lock:
+            self._ensure_fresh()
+            return self._boards.setdefault(course_id, SortedBoard())
+
+    def _ensure_fresh(self):
+        now = time.monotonic()
+        if self._built_at is None or now - self._built_at > settings.LEADERBOARD_REBUILD_SECONDS:
+            self.rebuild()
+        elif now - self._checked_at > settings.LEADERBOARD_SYNC_SECONDS:
+            self._catch_up()
+
+    def rebuild(self):
+        """Reload every board from the database"""
+        with self._lock:
+            self.reset()
+            now = time.monotonic()
+            self._watermark = CourseProgress.objects.aggregate(last=Max('updated_at'))['last']
+            rows = CourseProgress.objects.filter(RANKED).values_list(*ROW_FIELDS)
+            for row in rows.iterator(chunk_size=2000):
+                self._apply(row)
+            self._built_at = self._checked_at = now
+
+    def _catch_up(self):
+        self._checked_at = time.monotonic()
+        rows = CourseProgress.objects.all()
+        if self._watermark is not None:
+            rows = rows.filter(updated_at__gte=self._watermark - SYNC_MARGIN)
+        last = self._watermark
+        for row in rows.values_list('updated_at', *ROW_FIELDS):
+            last = row[0] if last is None else max(last, row[0])
+            self._apply(row[1:])
+        self._watermark = last
+
+    def refresh(self, pairs):
+        """Re-read the given (student id, course id) rows after they changed"""
+        if not pairs:
+            return
+        with self._lock:
+            if self._built_at is None:
+                return  # Built lazily, from current data, on first use
+            condition = Q()
+            for student_id, course_id in pairs:
+                condition |= Q(student_id=student_id, course_id=course_id)
+            found = set()
+            for row in CourseProgress.objects.filter(condition).values_list(*ROW_FIELDS):
+                self._apply(row)
+                found.add(row[:2])
+            for student_id, course_id in set(pairs) - found:
+                self._set(student_id, course_id, None)
+
+    def _apply(self, row):
+        student_id, course_id, average, best, level, lessons, attempts = row
+        stats = (average, best, level) if lessons > 0 or attempts > 0 else None
+        self._set(student_id, course_id, stats)
+
+    def _set(self, student_id, course_id, stats):
+        board = self._boards.setdefault(course_id, SortedBoard())
+        courses = self._courses.setdefault(student_id, {})
+        if stats is None:
+            board.remove(student_id)
+            courses.pop(course_id, None)
+        else:
+            board.set(student_id, stats)
+            courses[course_id] = stats
+
+        overall = self._boards.setdefault(None, SortedBoard())
+        if not courses:
+            overall.remove(student_id)
+            self._courses.pop(student_id, None)
+            return
+        values = courses.values()
+        overall.set(student_id, (
+            sum(level for _, _, level in values),
+            sum(average for average, _, _ in values) / len(courses),
+            max(best for _, best, _ in values),
+        ))
+
+
+boards = Leaderboards()
+
+
+def top(course_id=None, n=10):
+    """The best ``n`` entries of a course board, or of the global board"""
+    with boards._lock:
+        return boards.board(course_id).top(n)
+
+
+def standing(student_id, course_id=None, size=2):
+    """``(rank, entries around the learner, board size)``; rank is None when unranked"""
+    with boards._lock:
+        board = boards.board(course_id)
+        return board.rank(student_id), board.around(student_id, size), len(board)
+
+
+def refresh(pairs):
+    boards.refresh(pairs)
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from learning import badges
+
+
+class Command(BaseCommand):
+    help = 'Rebuild badge counters from lesson, attempt and activity history and award earned badges'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--student-id', type=int, action='append', dest='student_ids',
+                            help='Only backfill this StudentProfile (repeatable)')
+
+    def handle(self, *args, **options):
+        counters, awarded = badges.backfill(options['student_ids'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt {counters} badge counters and awarded {awarded} new badges'
+        ))
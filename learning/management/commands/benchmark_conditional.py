@@ -0,0 +1,42 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from learning import benchmarks
+
+
+class Command(BaseCommand):
+    help = ('Seed a synthetic dataset in a throwaway test database and compare full responses '
+            'of the conditional GET views with their 304 revalidations')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--size', default='medium', choices=list(benchmarks.SIZES),
+                            help='Dataset size')
+        parser.add_argument('--repeat', type=int, default=20, help='Timed requests per view and mode')
+
+    def handle(self, *args, **options):
+        settings.DEBUG = False
+        setup_test_environment()
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            dataset = benchmarks.seed(**benchmarks.SIZES[options['size']])
+            results = benchmarks.run_conditional(dataset, repeat=options['repeat'])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        self.stdout.write('{:<26}{:>38}{:>38}'.format('view', 'full q / ms / cpu ms / bytes',
+                                                        'revalidated q / ms / cpu ms / bytes'))
+        missed = []
+        for view, m in results.items():
+            self.stdout.write('{:<26}{:>38}{:>38}'.format(view, *(
+                '{} {} / {} / {} / {}'.format(r['status'], r['queries'], r['median_ms'], r['cpu_ms'], r['bytes'])
+                for r in (m['full'], m['revalidated'])
+            )))
+            if m['revalidated']['status'] != 304:
+                missed.append(view)
+        if missed:
+            raise CommandError('Not revalidated with 304: {}'.format(', '.join(missed)))
+        self.stdout.write(self.style.SUCCESS('Every view revalidated with 304'))
@@ -0,0 +1,43 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from learning import benchmarks
+
+
+class Command(BaseCommand):
+    help = ('Seed a synthetic catalog in a throwaway test database and time full-text '
+            'course search against the icontains scan it replaces')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lessons', type=int, default=100000, help='Lessons in the catalog')
+        parser.add_argument('--repeat', type=int, default=20, help='Timed runs per query')
+        parser.add_argument('--difficulty', type=int, choices=range(1, 6),
+                            help='Also filter by this lesson difficulty level')
+        parser.add_argument('--budget-ms', type=float, default=10.0,
+                            help='Fail if any query has a p95 above this many milliseconds')
+
+    def handle(self, *args, **options):
+        settings.DEBUG = False
+        setup_test_environment()
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            benchmarks.seed_catalog(options['lessons'])
+            results = benchmarks.run_search(repeat=options['repeat'], difficulty=options['difficulty'])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        self.stdout.write('{:<16}{:>10}{:>12}{:>10}{:>16}'.format(
+            'query', 'courses', 'median ms', 'p95 ms', 'icontains ms'))
+        slow = []
+        for query, m in results.items():
+            self.stdout.write('{:<16}{:>10}{:>12}{:>10}{:>16}'.format(
+                query, m['courses'], m['median_ms'], m['p95_ms'], m['icontains_ms']))
+            if m['p95_ms'] > options['budget_ms']:
+                slow.append('{!r}: p95 {} ms'.format(query, m['p95_ms']))
+        if slow:
+            raise CommandError('Search slower than {} ms:\n  {}'.format(options['budget_ms'], '\n  '.join(slow)))
+        self.stdout.write(self.style.SUCCESS('Every query within {} ms'.format(options['budget_ms'])))
@@ -0,0 +1,84 @@
+import json
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from learning import benchmarks
+
+
+class Command(BaseCommand):
+    help = ('Seed synthetic datasets in a throwaway test database and record the query '
+            'count, wall time and peak memory of every view')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='small,medium',
+                            help='Comma separated dataset sizes ({})'.format(', '.join(benchmarks.SIZES)))
+        parser.add_argument('--save', metavar='PATH', help='Write the results to a baseline JSON file')
+        parser.add_argument('--baseline', metavar='PATH',
+                            help='Fail if any view issues more queries than in this baseline')
+        parser.add_argument('--no-warmup', action='store_true',
+                            help='Measure the first request instead of a warm one')
+
+    def handle(self, *args, **options):
+        sizes = [size.strip() for size in options['sizes'].split(',') if size.strip()]
+        unknown = [size for size in sizes if size not in benchmarks.SIZES]
+        if unknown:
+            raise CommandError('Unknown size(s): {}'.format(', '.join(unknown)))
+
+        # Like the test runner: measure the production error path, not the debug page.
+        settings.DEBUG = False
+        setup_test_environment()
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            results = {}
+            for size in sizes:
+                dataset = benchmarks.seed(**benchmarks.SIZES[size])
+                results[size] = benchmarks.run_views(dataset, warmup=not options['no_warmup'])
+                benchmarks.clear()
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        self._report(sizes, results)
+        failures = []
+        for size in sizes:
+            for view, status in benchmarks.find_failed_views(results[size]).items():
+                failures.append(f'{view}: HTTP {status} on {size}')
+        for smaller, larger in zip(sizes, sizes[1:]):
+            for view, (before, after) in benchmarks.find_scaling_views(results[smaller], results[larger]).items():
+                failures.append(f'{view}: {before} queries on {smaller}, {after} on {larger}')
+
+        if options['baseline']:
+            with open(options['baseline']) as fh:
+                baseline = json.load(fh)
+            for size in sizes:
+                if size not in baseline:
+                    continue
+                regressions = benchmarks.find_regressions(baseline[size], results[size])
+                for view, (before, after) in regressions.items():
+                    failures.append(f'{view}: {after} queries on {size}, baseline {before}')
+
+        if options['save']:
+            with open(options['save'], 'w') as fh:
+                json.dump(results, fh, indent=2, sort_keys=True)
+            self.stdout.write(f"Saved results to {options['save']}")
+
+        if failures:
+            raise CommandError('Failed views or query count regressions:\n  ' + '\n  '.join(failures))
+        self.stdout.write(self.style.SUCCESS('No failed views or query count regressions'))
+
+    def _report(self, sizes, results):
+        header = '{:<36}'.format('view') + ''.join(
+            '{:>24}'.format(f'{size} q / ms / KiB') for size in sizes
+        )
+        self.stdout.write(header)
+        for view in results[sizes[0]]:
+            line = '{:<36}'.format(view)
+            for size in sizes:
+                m = results[size][view]
+                line += '{:>24}'.format('{} {} / {:.1f} / {:.0f}'.format(
+                    m['status'], m['queries'], m['time_ms'], m['peak_kb']))
+            self.stdout.write(line)
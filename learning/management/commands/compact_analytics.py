@@ -0,0 +1,29 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from learning import analytics
+
+
+class Command(BaseCommand):
+    help = 'Fold old daily analytics rollup rows into monthly rows, or rebuild the rollup from raw attempts'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--older-than', type=int, default=90,
+                            help='Fold daily rows older than this many days (default: 90)')
+        parser.add_argument('--rebuild', action='store_true',
+                            help='Recompute the rollup from the raw attempts before compacting')
+        parser.add_argument('--assessment-id', type=int, action='append', dest='assessment_ids',
+                            help='Only rebuild this assessment (repeatable, with --rebuild)')
+
+    def handle(self, *args, **options):
+        if options['rebuild']:
+            written = analytics.rebuild(options['assessment_ids'])
+            self.stdout.write(f'Rebuilt {written} daily rollup rows from raw attempts')
+
+        before = timezone.localdate() - timedelta(days=options['older_than'])
+        folded = analytics.compact(before)
+        self.stdout.write(self.style.SUCCESS(
+            f'Folded {folded} daily rollup rows dated before {before} into monthly rows'
+        ))
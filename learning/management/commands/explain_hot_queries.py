@@ -0,0 +1,121 @@
+import sqlite3
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.backends.sqlite3.base import SQLiteCursorWrapper
+from django.db.models import Count, Max, Sum
+
+from learning.models import AssessmentAttempt, StudentProfile, StudentProgress
+
+# Indexes added for the queries below; "before" plans are taken without them,
+# see Command.explain_without_indexes().
+HOT_INDEXES = {
+    AssessmentAttempt: ['attempt_user_assess_recent', 'attempt_user_course', 'attempt_user_course_passed'],
+    StudentProgress: ['progress_student_status', 'progress_student_course', 'progress_completed'],
+}
+
+
+def hot_queries(profile, course_id, assessment_id):
+    """(name, query before denormalization, query now) for each hot access pattern"""
+    attempts = AssessmentAttempt.objects.filter(user_id=profile.user_id)
+    lessons = StudentProgress.objects.filter(student=profile)
+    completed = lessons.filter(status='completed')
+    totals = {'completed': Count('id'), 'total': Sum('score'), 'last': Max('completed_at')}
+    return [
+        ('Recent attempts at one assessment',
+         attempts.filter(assessment_id=assessment_id).order_by('-completed_at')[:5],
+         attempts.filter(assessment_id=assessment_id).order_by('-completed_at')[:5]),
+        ('Attempts in one course',
+         attempts.filter(assessment__course_id=course_id),
+         attempts.filter(course_id=course_id)),
+        ('Passed attempts in one course',
+         attempts.filter(assessment__course_id=course_id, passed=True),
+         attempts.filter(course_id=course_id, passed=True)),
+        ('Lesson progress by status',
+         lessons.filter(status='in_progress'),
+         lessons.filter(status='in_progress')),
+        ('Lesson progress in one course',
+         lessons.filter(lesson__course_id=course_id),
+         lessons.filter(course_id=course_id)),
+        ('Completed lesson totals for one course',
+         completed.filter(lesson__course_id=course_id).values('student_id').annotate(**totals),
+         completed.filter(course_id=course_id).values('student_id').annotate(**totals)),
+    ]
+
+
+class Command(BaseCommand):
+    help = 'Print EXPLAIN output for the hot progress and attempt queries, before and after the composite indexes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user-id', type=int,
+                            help='Learner to build the queries for (default: the one with most progress rows)')
+        parser.add_argument('--only', choices=['before', 'after'],
+                            help='Only print one of the two plans')
+
+    def handle(self, *args, **options):
+        profiles = StudentProfile.objects.all()
+        if options['user_id']:
+            profiles = profiles.filter(user_id=options['user_id'])
+        profile = profiles.annotate(rows=Count('studentprogress')).order_by('-rows').first()
+        if profile is None:
+            raise CommandError('No learner to build the queries for')
+
+        row = (
+            AssessmentAttempt.objects.filter(user_id=profile.user_id)
+            .values('assessment_id', 'assessment__course_id').first()
+        )
+        if row is None:
+            raise CommandError('The learner has no assessment attempts')
+        queries = hot_queries(profile, row['assessment__course_id'], row['assessment_id'])
+
+        plans = {}
+        if options['only'] != 'after':
+            plans['before'] = self.explain_without_indexes([q[1] for q in queries])
+        if options['only'] != 'before':
+            plans['after'] = [query.explain() for _, _, query in queries]
+
+        for index, (name, _, _) in enumerate(queries):
+            self.stdout.write(self.style.MIGRATE_HEADING(name))
+            for label, explained in plans.items():
+                self.stdout.write('  {}:'.format(label))
+                for line in explained[index].splitlines():
+                    self.stdout.write('    ' + line)
+            self.stdout.write('')
+
+    def explain_without_indexes(self, queries):
+        """EXPLAIN ``queries`` as if the hot indexes did not exist, leaving the schema alone.
+
+        SQLite: the plans come from an in-memory copy of the database with
+        the indexes dropped. PostgreSQL: index scans are switched off for one
+        transaction (SET LOCAL), which plans as if no secondary index existed
+        and takes no lock on the tables.
+        """
+        if connection.vendor == 'sqlite':
+            return self.explain_on_copy(queries)
+        if connection.vendor == 'postgresql':
+            with transaction.atomic(), connection.cursor() as cursor:
+                for setting in ('enable_indexscan', 'enable_indexonlyscan', 'enable_bitmapscan'):
+                    cursor.execute('SET LOCAL {} = off'.format(setting))
+                return [query.explain() for query in queries]
+        raise CommandError('Plans without the indexes need SQLite or PostgreSQL; use --only after')
+
+    def explain_on_copy(self, queries):
+        if connection.in_atomic_block:
+            # The copy would wait forever for our own write transaction
+            raise CommandError('Cannot copy the SQLite database inside a transaction')
+        connection.ensure_connection()
+        scratch = sqlite3.connect(':memory:')
+        try:
+            connection.connection.backup(scratch)
+            cursor = scratch.cursor(factory=SQLiteCursorWrapper)
+            for names in HOT_INDEXES.values():
+                for name in names:
+                    cursor.execute('DROP INDEX {}'.format(connection.ops.quote_name(name)))
+            plans = []
+            for query in queries:
+                sql, params = query.query.sql_with_params()
+                cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+                plans.append('\n'.join(' '.join(str(value) for value in row) for row in cursor.fetchall()))
+            return plans
+        finally:
+            scratch.close()
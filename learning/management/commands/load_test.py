@@ -0,0 +1,120 @@
+import http.client
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+from django.urls import reverse
+from django.utils.crypto import get_random_string
+
+from learning.models import Assessment, CourseProgress, Lesson, StudentProgress
+
+ENDPOINTS = ('progress_json', 'start_lesson', 'complete_lesson', 'submit_quiz_score')
+
+
+class Command(BaseCommand):
+    help = ('Fire concurrent requests at a running server and report throughput and latency. '
+            'Compare one worker of each stack, e.g. '
+            '`uvicorn giggles_project.asgi:application --workers 1` against '
+            '`gunicorn giggles_project.wsgi --workers 1 --threads 4`.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://127.0.0.1:8000', help='Base URL of the server')
+        parser.add_argument('--email', required=True, help='Learner to send the requests as')
+        parser.add_argument('--endpoint', choices=ENDPOINTS, default='progress_json')
+        parser.add_argument('--requests', type=int, default=1000)
+        parser.add_argument('--concurrency', type=int, default=50)
+        parser.add_argument('--lesson-id', type=int, help='Lesson to use (default: the first one)')
+
+    def handle(self, *args, **options):
+        try:
+            user = get_user_model().objects.get(email=options['email'])
+        except get_user_model().DoesNotExist:
+            raise CommandError('No user with email {}'.format(options['email']))
+        method, path, body, lesson = self.target(options['endpoint'], options['lesson_id'])
+
+        # A session in the server's database, plus a CSRF cookie/header pair
+        client = Client()
+        client.force_login(user)
+        csrf = get_random_string(32)
+        headers = {
+            'Cookie': '{}={}; {}={}'.format(
+                settings.SESSION_COOKIE_NAME, client.cookies[settings.SESSION_COOKIE_NAME].value,
+                settings.CSRF_COOKIE_NAME, csrf,
+            ),
+            'X-CSRFToken': csrf,
+            'X-Requested-With': 'XMLHttpRequest',
+            'Content-Type': 'application/json',
+        }
+        url = urlsplit(options['url'])
+        headers['Referer'] = options['url']
+
+        local = threading.local()
+
+        def send(_):
+            if not hasattr(local, 'conn'):
+                local.conn = http.client.HTTPConnection(url.hostname, url.port or 80, timeout=30)
+            started = time.perf_counter()
+            try:
+                local.conn.request(method, path, body=body, headers=headers)
+                response = local.conn.getresponse()
+                response.read()
+                status = response.status
+            except (OSError, http.client.HTTPException):
+                local.conn.close()
+                del local.conn
+                status = 'error'
+            return status, time.perf_counter() - started
+
+        before = self.progress(user, lesson) if lesson is not None else None
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['concurrency']) as pool:
+            results = list(pool.map(send, range(options['requests'])))
+        elapsed = time.perf_counter() - started
+        self.report(options, results, elapsed)
+        if lesson is not None:
+            self.stdout.write('  progress    before {}'.format(before))
+            self.stdout.write('              after  {}'.format(self.progress(user, lesson)))
+
+    def target(self, endpoint, lesson_id):
+        if endpoint == 'progress_json':
+            return 'GET', reverse('learning:progress_json'), None, None
+        lessons = Lesson.objects.select_related('course').order_by('pk')
+        lesson = lessons.filter(pk=lesson_id).first() if lesson_id else lessons.first()
+        if lesson is None:
+            raise CommandError('No lesson to load test with')
+        kwargs = {'course_slug': lesson.course.slug, 'lesson_slug': lesson.slug}
+        if endpoint != 'submit_quiz_score':
+            return 'POST', reverse('learning:' + endpoint, kwargs=kwargs), None, lesson
+        assessment = Assessment.objects.filter(course=lesson.course).order_by('pk').first()
+        if assessment is None:
+            raise CommandError('Course {} has no assessment'.format(lesson.course.slug))
+        path = reverse('learning:submit_quiz_score', kwargs={**kwargs, 'assessment_id': assessment.pk})
+        return 'POST', path, b'{"score": 1}', assessment.lesson
+
+    def progress(self, user, lesson):
+        """The learner's lesson and course progress, to check that no write was lost or doubled"""
+        row = StudentProgress.objects.filter(student__user=user, lesson=lesson).values(
+            'status', 'score', 'attempts').first()
+        course = CourseProgress.objects.filter(student__user=user, course_id=lesson.course_id).values(
+            'total_lessons_completed', 'attempts_count').first()
+        return 'lesson {}, course {}'.format(row, course)
+
+    def report(self, options, results, elapsed):
+        statuses = {}
+        for status, _ in results:
+            statuses[status] = statuses.get(status, 0) + 1
+        latencies = sorted(seconds * 1000 for _, seconds in results)
+        quantiles = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else latencies * 99
+        self.stdout.write('{} x {} at concurrency {}: {:.2f}s'.format(
+            options['endpoint'], len(results), options['concurrency'], elapsed))
+        self.stdout.write('  throughput  {:.1f} req/s'.format(len(results) / elapsed))
+        self.stdout.write('  latency ms  p50 {:.1f}  p95 {:.1f}  p99 {:.1f}  max {:.1f}'.format(
+            quantiles[49], quantiles[94], quantiles[98], latencies[-1]))
+        self.stdout.write('  statuses    {}'.format(
+            ', '.join('{}: {}'.format(status, count) for status, count in sorted(statuses.items(), key=str))))
@@ -0,0 +1,42 @@
+import logging
+import time
+
+from django.core.management.base import BaseCommand
+
+from learning.progress import drain, queue_stats
+
+logger = logging.getLogger('learning')
+
+
+class Command(BaseCommand):
+    help = 'Apply queued CourseProgress changes, batched per (student, course)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Maximum number of jobs applied per transaction')
+        parser.add_argument('--interval', type=float, default=1.0,
+                            help='Seconds to sleep when the queue is empty')
+        parser.add_argument('--once', action='store_true',
+                            help='Drain the queue once and exit')
+        parser.add_argument('--stats', action='store_true',
+                            help='Print the queue depth and lag and exit')
+
+    def handle(self, *args, **options):
+        if options['stats']:
+            pending, lag = queue_stats()
+            self.stdout.write(f'pending={pending} oldest_age={lag:.2f}s')
+            return
+
+        batch_size = options['batch_size']
+        try:
+            while True:
+                applied, lag = drain(batch_size)
+                if applied:
+                    logger.info('Applied %d progress jobs, lag %.2fs', applied, lag)
+                    self.stdout.write(f'applied={applied} lag={lag:.2f}s')
+                if options['once'] and applied < batch_size:
+                    break
+                if applied < batch_size:
+                    time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            pass
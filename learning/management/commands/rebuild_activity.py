@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from learning import activity
+
+
+class Command(BaseCommand):
+    help = 'Rebuild learner activity calendars and streaks from lesson and attempt history'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--student-id', type=int, action='append', dest='student_ids',
+                            help='Only rebuild the calendar of this StudentProfile (repeatable)')
+
+    def handle(self, *args, **options):
+        rebuilt = activity.rebuild(options['student_ids'])
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {rebuilt} activity calendars'))
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from learning.dashboard import refresh_dashboard
+from learning.models import StudentProfile
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the dashboard snapshot of every learner (or selected users)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user-id', type=int, action='append', dest='user_ids',
+                            help='Only rebuild the snapshot of this user (repeatable)')
+
+    def handle(self, *args, **options):
+        profiles = StudentProfile.objects.select_related('user').order_by('pk')
+        if options['user_ids']:
+            profiles = profiles.filter(user_id__in=options['user_ids'])
+
+        rebuilt = 0
+        for student_profile in profiles.iterator(chunk_size=500):
+            refresh_dashboard(student_profile)
+            rebuilt += 1
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {rebuilt} dashboard snapshots'))
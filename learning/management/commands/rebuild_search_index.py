@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from learning import search
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the course, lesson and assessment search index from the catalog'
+
+    def handle(self, *args, **options):
+        indexed = search.rebuild()
+        self.stdout.write(self.style.SUCCESS(f'Indexed {indexed} search entries'))
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from learning import rescoring
+
+
+class Command(BaseCommand):
+    help = 'Recompute percentage and pass status of stored attempts after assessment rules change'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--assessment-id', type=int, action='append', dest='assessment_ids',
+                            help='Only rescore this assessment (repeatable; default: all)')
+        parser.add_argument('--chunk-size', type=int, default=rescoring.CHUNK_SIZE,
+                            help='Attempt rows per UPDATE (default: %(default)s)')
+
+    def handle(self, *args, **options):
+        result = rescoring.rescore(options['assessment_ids'], chunk_size=options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Rescored {result['attempts']} attempts across {result['assessments']} assessments; "
+            f"rebuilt {result['progress_rebuilt']} course progress records"
+        ))
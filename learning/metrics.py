@@ -0,0 +1,243 @@
+"""
+In-process request metrics, per resolved URL name.
+
+``MetricsMiddleware`` times every request and installs a database execute
+wrapper that counts SQL queries, SQL time and duplicate queries (the same
+SQL with the same parameters run more than once in a request). The totals
+are kept per view in this process's ``registry``. They are exposed in the
+Prometheus text format by the ``metrics`` view, to staff and to scrapers
+sending ``Authorization: Bearer <METRICS_TOKEN>``. When ``METRICS_JSONL_PATH``
+is set, each request is also written as one JSON line to that file through
+the ``learning.metrics`` logger.
+"""
+import hmac
+import json
+import logging
+import threading
+import time
+from bisect import bisect_left
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger('learning.metrics')
+
+# Request latency histogram bucket bounds, in seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+# SQL queries per request histogram bucket bounds
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+UNRESOLVED = '<unresolved>'
+
+
+class QueryCollector:
+    """Database execute wrapper counting the queries of one request"""
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.duplicates = 0
+        self._seen = set()
+
+    def __call__(self, execute, sql, params, many, context):
+        key = (sql, repr(params))
+        if key in self._seen:
+            self.duplicates += 1
+        else:
+            self._seen.add(key)
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.seconds += time.perf_counter() - started
+            self.count += 1
+
+
+def wrap_connections(stack, wrapper):
+    """Install ``wrapper`` on every database connection of this thread until ``stack`` closes"""
+    for connection in connections.all():
+        stack.enter_context(connection.execute_wrapper(wrapper))
+
+
+class ViewStats:
+    def __init__(self):
+        self.requests = 0
+        self.statuses = {}
+        self.latency_buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.latency_sum = 0.0
+        self.query_buckets = [0] * (len(QUERY_BUCKETS) + 1)
+        self.queries = 0
+        self.sql_seconds = 0.0
+        self.duplicate_queries = 0
+        self.response_bytes = 0
+
+
+class Registry:
+    """Thread-safe per-view totals"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._views = {}
+
+    def observe(self, view, status, seconds, queries, sql_seconds, duplicates, size):
+        with self._lock:
+            stats = self._views.get(view)
+            if stats is None:
+                stats = self._views[view] = ViewStats()
+            stats.requests += 1
+            stats.statuses[status] = stats.statuses.get(status, 0) + 1
+            stats.latency_buckets[bisect_left(LATENCY_BUCKETS, seconds)] += 1
+            stats.latency_sum += seconds
+            stats.query_buckets[bisect_left(QUERY_BUCKETS, queries)] += 1
+            stats.queries += queries
+            stats.sql_seconds += sql_seconds
+            stats.duplicate_queries += duplicates
+            stats.response_bytes += size or 0
+
+    def add_bytes(self, view, size):
+        with self._lock:
+            if view in self._views:
+                self._views[view].response_bytes += size
+
+    def reset(self):
+        with self._lock:
+            self._views = {}
+
+    def snapshot(self):
+        with self._lock:
+            return {view: _copy(stats) for view, stats in self._views.items()}
+
+
+def _copy(stats):
+    copy = ViewStats()
+    copy.__dict__.update({
+        key: (list(value) if isinstance(value, list) else
+              dict(value) if isinstance(value, dict) else value)
+        for key, value in stats.__dict__.items()
+    })
+    return copy
+
+
+registry = Registry()
+
+
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _histogram(lines, name, view, bounds, buckets, total, count):
+    cumulative = 0
+    for bound, observed in zip(bounds, buckets):
+        cumulative += observed
+        lines.append('{}_bucket{{view="{}",le="{}"}} {}'.format(name, view, bound, cumulative))
+    lines.append('{}_bucket{{view="{}",le="+Inf"}} {}'.format(name, view, count))
+    lines.append('{}_sum{{view="{}"}} {}'.format(name, view, total))
+    lines.append('{}_count{{view="{}"}} {}'.format(name, view, count))
+
+
+def render_text(snapshot=None):
+    """The registry in the Prometheus text exposition format"""
+    snapshot = registry.snapshot() if snapshot is None else snapshot
+    views = sorted(snapshot.items())
+    lines = [
+        '# HELP giggles_requests_total Requests handled, by view and status.',
+        '# TYPE giggles_requests_total counter',
+    ]
+    for view, stats in views:
+        for status, count in sorted(stats.statuses.items()):
+            lines.append('giggles_requests_total{{view="{}",status="{}"}} {}'.format(
+                _label(view), status, count))
+
+    lines += [
+        '# HELP giggles_request_duration_seconds Request latency, by view.',
+        '# TYPE giggles_request_duration_seconds histogram',
+    ]
+    for view, stats in views:
+        _histogram(lines, 'giggles_request_duration_seconds', _label(view), LATENCY_BUCKETS,
+                   stats.latency_buckets, round(stats.latency_sum, 6), stats.requests)
+
+    lines += [
+        '# HELP giggles_request_queries SQL queries per request, by view.',
+        '# TYPE giggles_request_queries histogram',
+    ]
+    for view, stats in views:
+        _histogram(lines, 'giggles_request_queries', _label(view), QUERY_BUCKETS,
+                   stats.query_buckets, stats.queries, stats.requests)
+
+    for name, kind, help_text, attribute in [
+        ('giggles_sql_seconds_total', 'counter', 'Time spent in SQL, by view.', 'sql_seconds'),
+        ('giggles_duplicate_queries_total', 'counter',
+         'Queries repeating an earlier query of the same request, by view.', 'duplicate_queries'),
+        ('giggles_response_bytes_total', 'counter', 'Response body bytes, by view.', 'response_bytes'),
+    ]:
+        lines += ['# HELP {} {}'.format(name, help_text), '# TYPE {} {}'.format(name, kind)]
+        for view, stats in views:
+            value = getattr(stats, attribute)
+            lines.append('{}{{view="{}"}} {}'.format(
+                name, _label(view), round(value, 6) if isinstance(value, float) else value))
+    return '\n'.join(lines) + '\n'
+
+
+def can_read(request):
+    """Staff, or a scraper presenting ``METRICS_TOKEN`` as a bearer token.
+
+    Client addresses are not trusted: behind a reverse proxy every request
+    comes from the proxy's address.
+    """
+    if request.user.is_staff:
+        return True
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    scheme, _, presented = request.headers.get('Authorization', '').partition(' ')
+    return bool(token) and scheme.lower() == 'bearer' and hmac.compare_digest(presented.encode(), token.encode())
+
+
+def view_name(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return UNRESOLVED
+    return match.view_name or UNRESOLVED
+
+
+def record(request, response, seconds, collector):
+    """Add one finished request to the registry (and the JSON lines file)"""
+    view = view_name(request)
+    if response.streaming:
+        size = None
+        counting = _acounting if response.is_async else _counting
+        response.streaming_content = counting(response.streaming_content, view)
+    else:
+        size = len(response.content)
+    registry.observe(view, response.status_code, seconds, collector.count,
+                     collector.seconds, collector.duplicates, size)
+    if getattr(settings, 'METRICS_JSONL_PATH', ''):
+        logger.info(json.dumps({
+            'ts': round(time.time(), 3),
+            'view': view,
+            'method': request.method,
+            'status': response.status_code,
+            'duration_ms': round(seconds * 1000, 2),
+            'queries': collector.count,
+            'sql_ms': round(collector.seconds * 1000, 2),
+            'duplicate_queries': collector.duplicates,
+            'bytes': size,
+        }))
+
+
+def _counting(chunks, view):
+    size = 0
+    try:
+        for chunk in chunks:
+            size += len(chunk)
+            yield chunk
+    finally:
+        registry.add_bytes(view, size)
+
+
+async def _acounting(chunks, view):
+    size = 0
+    try:
+        async for chunk in chunks:
+            size += len(chunk)
+            yield chunk
+    finally:
+        registry.add_bytes(view, size)
@@ -0,0 +1,131 @@
+import time
+from contextlib import ExitStack
+from functools import partial
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.utils.functional import SimpleLazyObject
+
+from . import metrics, profiling
+from .models import StudentProfile
+from .progress import unit_of_work
+
+
+class HybridMiddleware:
+    """Base for middleware that runs in both WSGI and ASGI request chains.
+
+    Under ASGI, database work for a request runs on that request's
+    ``sync_to_async`` thread. State kept per thread or per connection, such
+    as execute wrappers and the progress unit of work, therefore has to be
+    set up and torn down on that thread.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        return self.handle(request)
+
+
+class MetricsMiddleware(HybridMiddleware):
+    """Record latency, SQL queries and response size per resolved view"""
+
+    def handle(self, request):
+        if not settings.METRICS_ENABLED:
+            return self.get_response(request)
+        collector = metrics.QueryCollector()
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            metrics.wrap_connections(stack, collector)
+            response = self.get_response(request)
+        metrics.record(request, response, time.perf_counter() - started, collector)
+        return response
+
+    async def __acall__(self, request):
+        if not settings.METRICS_ENABLED:
+            return await self.get_response(request)
+        collector = metrics.QueryCollector()
+        started = time.perf_counter()
+        stack = ExitStack()
+        await sync_to_async(metrics.wrap_connections)(stack, collector)
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(stack.close)()
+        metrics.record(request, response, time.perf_counter() - started, collector)
+        return response
+
+
+class ProfilingMiddleware(HybridMiddleware):
+    """Profile requests that staff flag with ?_profile=1 or X-Profile: 1"""
+
+    def handle(self, request):
+        if profiling.flagged(request) and profiling.is_staff(request.user):
+            return profiling.profile(request, self.get_response)
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        if profiling.flagged(request) and profiling.is_staff(await request.auser()):
+            return await profiling.aprofile(request, self.get_response)
+        return await self.get_response(request)
+
+
+def get_student_profile(request):
+    if not hasattr(request, '_cached_student_profile'):
+        user = request.user
+        request._cached_student_profile = (
+            StudentProfile.for_user(user) if user.is_authenticated else None
+        )
+    return request._cached_student_profile
+
+
+async def aget_student_profile(request):
+    if not hasattr(request, '_cached_student_profile'):
+        user = await request.auser()
+        request._cached_student_profile = (
+            await StudentProfile.afor_user(user) if user.is_authenticated else None
+        )
+    return request._cached_student_profile
+
+
+class StudentProfileMiddleware(HybridMiddleware):
+    """Attach the learner's profile as ``request.student_profile`` (lazy, loaded once).
+
+    Async views use ``await request.astudent_profile()``. Both are None for
+    anonymous users. Must come after AuthenticationMiddleware.
+    """
+
+    def attach(self, request):
+        request.student_profile = SimpleLazyObject(partial(get_student_profile, request))
+        request.astudent_profile = partial(aget_student_profile, request)
+
+    def handle(self, request):
+        self.attach(request)
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        self.attach(request)
+        return await self.get_response(request)
+
+
+class ProgressUnitOfWorkMiddleware(HybridMiddleware):
+    """Write each dirty CourseProgress row once per request"""
+
+    def handle(self, request):
+        with unit_of_work():
+            return self.get_response(request)
+
+    async def __acall__(self, request):
+        stack = ExitStack()
+        await sync_to_async(stack.enter_context)(unit_of_work())
+        try:
+            return await self.get_response(request)
+        finally:
+            await sync_to_async(stack.close)()
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:17
+
+import django.core.serializers.json
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('learning', '0002_alter_studentprogress_student'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProgressJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('delta', models.JSONField(default=dict, encoder=django.core.serializers.json.DjangoJSONEncoder)),
+                ('create_missing', models.BooleanField(default=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+                ('course', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='learning.course')),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='learning.studentprofile')),
+            ],
+            options={
+                'ordering': ['id'],
+            },
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:18
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('learning', '0003_progressjob'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='assessmentattempt',
+            name='client_attempt_id',
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+        migrations.AddConstraint(
+            model_name='assessmentattempt',
+            constraint=models.UniqueConstraint(fields=('user', 'client_attempt_id'), name='unique_user_client_attempt'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:19
+
+import django.core.serializers.json
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0004_alter_customuser_options_alter_customuser_managers_and_more'),
+        ('learning', '0004_assessmentattempt_client_attempt_id'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StudentDashboardSnapshot',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='dashboard_snapshot', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('data', models.JSONField(default=dict, encoder=django.core.serializers.json.DjangoJSONEncoder)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
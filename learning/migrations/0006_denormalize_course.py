@@ -0,0 +1,41 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:27
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def backfill_course(apps, schema_editor):
+    Lesson = apps.get_model('learning', 'Lesson')
+    Assessment = apps.get_model('learning', 'Assessment')
+    StudentProgress = apps.get_model('learning', 'StudentProgress')
+    AssessmentAttempt = apps.get_model('learning', 'AssessmentAttempt')
+    StudentProgress.objects.update(course_id=Subquery(
+        Lesson.objects.filter(pk=OuterRef('lesson_id')).values('course_id')[:1]
+    ))
+    AssessmentAttempt.objects.update(course_id=Subquery(
+        Assessment.objects.filter(pk=OuterRef('assessment_id')).values('course_id')[:1]
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('learning', '0005_studentdashboardsnapshot'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='assessmentattempt',
+            name='course',
+            field=models.ForeignKey(blank=True, db_index=False, editable=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='learning.course'),
+        ),
+        migrations.AddField(
+            model_name='studentprogress',
+            name='course',
+            field=models.ForeignKey(blank=True, db_index=False, editable=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='learning.course'),
+        ),
+        migrations.RunPython(backfill_course, migrations.RunPython.noop),
+    ]
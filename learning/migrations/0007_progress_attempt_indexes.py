@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:27
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('learning', '0006_denormalize_course'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='assessmentattempt',
+            index=models.Index(fields=['user', 'assessment', '-completed_at'], name='attempt_user_assess_recent'),
+        ),
+        migrations.AddIndex(
+            model_name='assessmentattempt',
+            index=models.Index(fields=['user', 'course', 'completed_at'], name='attempt_user_course'),
+        ),
+        migrations.AddIndex(
+            model_name='assessmentattempt',
+            index=models.Index(condition=models.Q(('passed', True)), fields=['user', 'course'], name='attempt_user_course_passed'),
+        ),
+        migrations.AddIndex(
+            model_name='studentprogress',
+            index=models.Index(fields=['student', 'status'], name='progress_student_status'),
+        ),
+        migrations.AddIndex(
+            model_name='studentprogress',
+            index=models.Index(fields=['student', 'course'], name='progress_student_course'),
+        ),
+        migrations.AddIndex(
+            model_name='studentprogress',
+            index=models.Index(condition=models.Q(('status', 'completed')), fields=['student', 'course', 'score', 'completed_at'], name='progress_completed'),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:30
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('learning', '0007_progress_attempt_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AttemptRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.CharField(choices=[('day', 'Day'), ('month', 'Month')], default='day', max_length=10)),
+                ('day', models.DateField()),
+                ('grade_level', models.CharField(blank=True, max_length=20)),
+                ('attempts', models.IntegerField(default=0)),
+                ('passed', models.IntegerField(default=0)),
+                ('percentage_sum', models.FloatField(default=0.0)),
+                ('timed_attempts', models.IntegerField(default=0)),
+                ('time_taken_seconds', models.FloatField(default=0.0)),
+                ('bucket_0', models.IntegerField(default=0)),
+                ('bucket_1', models.IntegerField(default=0)),
+                ('bucket_2', models.IntegerField(default=0)),
+                ('bucket_3', models.IntegerField(default=0)),
+                ('bucket_4', models.IntegerField(default=0)),
+                ('assessment', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='learning.assessment')),
+                ('course', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='learning.course')),
+                ('lesson', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='learning.lesson')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['course', 'day'], name='rollup_course_day')],
+                'constraints': [models.UniqueConstraint(fields=('assessment', 'grade_level', 'period', 'day'), name='unique_attempt_rollup')],
+            },
+        ),
+    ]
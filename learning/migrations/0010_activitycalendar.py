@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:35
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('learning', '0009_courseprogress_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ActivityCalendar',
+            fields=[
+                ('student', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='activity_calendar', serialize=False, to='learning.studentprofile')),
+                ('epoch', models.DateField()),
+                ('bits', models.BinaryField(default=b'')),
+                ('last_active', models.DateField(blank=True, null=True)),
+                ('streak', models.IntegerField(default=0)),
+                ('longest_streak', models.IntegerField(default=0)),
+            ],
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:37
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('learning', '0010_activitycalendar'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BadgeCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50)),
+                ('value', models.IntegerField(default=0)),
+                ('course', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='learning.course')),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='badge_counters', to='learning.studentprofile')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(condition=models.Q(('course__isnull', False)), fields=('student', 'course', 'name'), name='unique_course_badge_counter'), models.UniqueConstraint(condition=models.Q(('course__isnull', True)), fields=('student', 'name'), name='unique_badge_counter')],
+            },
+        ),
+        migrations.CreateModel(
+            name='StudentBadge',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('code', models.CharField(max_length=50)),
+                ('earned_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('course', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='learning.course')),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='badges', to='learning.studentprofile')),
+            ],
+            options={
+                'ordering': ['-earned_at'],
+                'constraints': [models.UniqueConstraint(condition=models.Q(('course__isnull', False)), fields=('student', 'course', 'code'), name='unique_course_badge'), models.UniqueConstraint(condition=models.Q(('course__isnull', True)), fields=('student', 'code'), name='unique_badge')],
+            },
+        ),
+    ]
@@ -0,0 +1,104 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:48
+
+import re
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+SQLITE_INDEX = [
+    "CREATE VIRTUAL TABLE learning_search_fts USING fts5("
+    "title, body, kind, content='learning_searchentry', content_rowid='id', "
+    "tokenize='unicode61 remove_diacritics 2', prefix='2 3')",
+    "CREATE TRIGGER learning_searchentry_ai AFTER INSERT ON learning_searchentry BEGIN "
+    "INSERT INTO learning_search_fts(rowid, title, body, kind) VALUES (new.id, new.title, new.body, new.kind); END",
+    "CREATE TRIGGER learning_searchentry_ad AFTER DELETE ON learning_searchentry BEGIN "
+    "INSERT INTO learning_search_fts(learning_search_fts, rowid, title, body, kind) "
+    "VALUES ('delete', old.id, old.title, old.body, old.kind); END",
+    "CREATE TRIGGER learning_searchentry_au AFTER UPDATE ON learning_searchentry BEGIN "
+    "INSERT INTO learning_search_fts(learning_search_fts, rowid, title, body, kind) "
+    "VALUES ('delete', old.id, old.title, old.body, old.kind); "
+    "INSERT INTO learning_search_fts(rowid, title, body, kind) VALUES (new.id, new.title, new.body, new.kind); END",
+]
+SQLITE_DROP = [
+    'DROP TRIGGER IF EXISTS learning_searchentry_ai',
+    'DROP TRIGGER IF EXISTS learning_searchentry_ad',
+    'DROP TRIGGER IF EXISTS learning_searchentry_au',
+    'DROP TABLE IF EXISTS learning_search_fts',
+]
+POSTGRES_INDEX = [
+    "CREATE INDEX learning_search_tsv ON learning_searchentry USING GIN (("
+    "setweight(to_tsvector('simple', title), 'A') || "
+    "setweight(to_tsvector('simple', body), 'B')))",
+]
+POSTGRES_DROP = ['DROP INDEX IF EXISTS learning_search_tsv']
+
+
+def create_text_index(apps, schema_editor):
+    statements = {'sqlite': SQLITE_INDEX, 'postgresql': POSTGRES_INDEX}
+    for sql in statements.get(schema_editor.connection.vendor, []):
+        schema_editor.execute(sql)
+
+
+def drop_text_index(apps, schema_editor):
+    statements = {'sqlite': SQLITE_DROP, 'postgresql': POSTGRES_DROP}
+    for sql in statements.get(schema_editor.connection.vendor, []):
+        schema_editor.execute(sql)
+
+
+def backfill_entries(apps, schema_editor):
+    Course = apps.get_model('learning', 'Course')
+    Lesson = apps.get_model('learning', 'Lesson')
+    Assessment = apps.get_model('learning', 'Assessment')
+    SearchEntry = apps.get_model('learning', 'SearchEntry')
+    contents = {}
+    for course_id, name in Lesson.objects.order_by('pk').values_list('course_id', 'name'):
+        contents.setdefault(course_id, []).append(name)
+    for course_id, title in Assessment.objects.order_by('pk').values_list('course_id', 'title'):
+        contents.setdefault(course_id, []).append(title)
+    entries = [
+        SearchEntry(kind='course', object_id=course.pk, course_id=course.pk, title=course.name,
+                    body=' '.join([course.description or ''] + list(dict.fromkeys(
+                        word.lower() for text in contents.get(course.pk, []) for word in re.findall(r'\w+', text)
+                    ))))
+        for course in Course.objects.all()
+    ]
+    entries += [
+        SearchEntry(kind='lesson', object_id=lesson.pk, course_id=lesson.course_id,
+                    difficulty_level=lesson.difficulty_level, title=lesson.name,
+                    body=lesson.slug.replace('-', ' '))
+        for lesson in Lesson.objects.all()
+    ]
+    entries += [
+        SearchEntry(kind='assessment', object_id=assessment.pk, course_id=assessment.course_id,
+                    difficulty_level=assessment.lesson.difficulty_level if assessment.lesson else None,
+                    title=assessment.title, body=assessment.lesson.name if assessment.lesson else '')
+        for assessment in Assessment.objects.select_related('lesson')
+    ]
+    SearchEntry.objects.bulk_create(entries, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('learning', '0011_badges'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('course', 'Course'), ('lesson', 'Lesson'), ('assessment', 'Assessment')], max_length=20)),
+                ('object_id', models.PositiveIntegerField()),
+                ('difficulty_level', models.IntegerField(blank=True, null=True)),
+                ('title', models.CharField(max_length=200)),
+                ('body', models.TextField(blank=True)),
+                ('course', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='learning.course')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('kind', 'object_id'), name='unique_search_entry')],
+            },
+        ),
+        migrations.RunPython(create_text_index, drop_text_index),
+        migrations.RunPython(backfill_entries, migrations.RunPython.noop),
+    ]
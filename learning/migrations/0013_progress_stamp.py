@@ -0,0 +1,22 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:17
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('learning', '0012_search_entry'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProgressStamp',
+            fields=[
+                ('student', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='progress_stamp', serialize=False, to='learning.studentprofile')),
+                ('token', models.CharField(max_length=32)),
+                ('changed_at', models.DateTimeField()),
+            ],
+        ),
+    ]
@@ -1,9 +1,14 @@
-from django.db import models
+from django.db import IntegrityError, connection, models, transaction
+from django.db.models.signals import post_save
 from django.contrib.auth import get_user_model
 User = get_user_model()
 from django.utils import timezone
 import json
-from django.db.models import UniqueConstraint
+import uuid
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import UniqueConstraint, F, Q, Value, Case, When, ExpressionWrapper
+from django.db.models.functions import Cast, Coalesce, Greatest, Now
+from django.db.models.lookups import GreaterThan, GreaterThanOrEqual
 
 class Course(models.Model):
     name = models.CharField(max_length=100)
@@ -34,7 +39,52 @@ class StudentProfile(models.Model):
     age = models.IntegerField(null=True, blank=True)
     grade_level = models.CharField(max_length=20, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
-    
+
+    # Editable fields as last read from or written to the database, so saving
+    # the User only writes the profile when one of them changed.
+    EDITABLE_FIELDS = ('age', 'grade_level')
+    _saved_fields = None
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        if all(f in instance.__dict__ for f in cls.EDITABLE_FIELDS):
+            instance._remember_fields()
+        return instance
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        self._remember_fields()
+
+    def _remember_fields(self):
+        self._saved_fields = tuple(getattr(self, f) for f in self.EDITABLE_FIELDS)
+
+    @property
+    def has_changed(self):
+        """Whether the editable fields differ from the saved row"""
+        return tuple(getattr(self, f) for f in self.EDITABLE_FIELDS) != self._saved_fields
+
+    @classmethod
+    def for_user(cls, user):
+        """The user's profile, cached on ``user`` so ``user.studentprofile`` needs no query.
+
+        Profiles are created with the user; the fallback covers users created
+        without the signal, e.g. through ``bulk_create``.
+        """
+        profile = cls.user.field.remote_field.get_cached_value(user, default=None)
+        if profile is None:
+            profile, _ = cls.objects.get_or_create(user=user)
+            profile.user = user
+        return profile
+
+    @classmethod
+    async def afor_user(cls, user):
+        profile = cls.user.field.remote_field.get_cached_value(user, default=None)
+        if profile is None:
+            profile, _ = await cls.objects.aget_or_create(user=user)
+            profile.user = user
+        return profile
+
     def __str__(self):
       if self.user:
          return "{}'s Profile".format(self.user.email)  # or self.user.full_name
@@ -48,6 +98,13 @@ class Assessment(models.Model):
     title = models.CharField(max_length=200)
     total_questions = models.IntegerField()
     passing_score = models.IntegerField(default=70)  # Percentage
+
+    def grade(self, score):
+        """Return (percentage, passed) for a number of correct answers"""
+        if self.total_questions <= 0:
+            return 0.0, False
+        percentage = (score / self.total_questions) * 100
+        return percentage, percentage >= self.passing_score
     
     def __str__(self):
       return self.title 
@@ -63,14 +120,28 @@ class AssessmentAttempt(models.Model):
     answers = models.JSONField(default=dict)  # Store user's answers
     completed_at = models.DateTimeField(auto_now_add=True)
     passed = models.BooleanField(default=False)
+    # Idempotency key sent by offline clients so re-uploads are not duplicated
+    client_attempt_id = models.CharField(max_length=64, null=True, blank=True)
+    # Copy of assessment.course, so per-course filters need no join
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='+',
+                               null=True, blank=True, editable=False, db_index=False)
     
     class Meta:
         ordering = ['-completed_at']
+        constraints = [
+            UniqueConstraint(fields=['user', 'client_attempt_id'], name='unique_user_client_attempt')
+        ]
+        indexes = [
+            models.Index(fields=['user', 'assessment', '-completed_at'], name='attempt_user_assess_recent'),
+            models.Index(fields=['user', 'course', 'completed_at'], name='attempt_user_course'),
+            models.Index(fields=['user', 'course'], condition=Q(passed=True),
+                         name='attempt_user_course_passed'),
+        ]
     
     def save(self, *args, **kwargs):
         # Calculate percentage and pass status
-        self.percentage = (self.score / self.assessment.total_questions) * 100
-        self.passed = self.percentage >= self.assessment.passing_score
+        self.percentage, self.passed = self.assessment.grade(self.score)
+        self.course_id = self.assessment.course_id
         super().save(*args, **kwargs)
     
     def __str__(self):
@@ -97,11 +168,179 @@ class StudentProgress(models.Model):
     started_at = models.DateTimeField(null=True, blank=True)  # Changed from auto_now_add
     completed_at = models.DateTimeField(null=True, blank=True)
     last_accessed = models.DateTimeField(null=True, blank=True)  # Added this field
+    # Copy of lesson.course, so per-course filters need no join
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='+',
+                               null=True, blank=True, editable=False, db_index=False)
 
     class Meta:
         constraints = [
             UniqueConstraint(fields=['student', 'lesson'], name='unique_student_lesson')
         ]
+        indexes = [
+            models.Index(fields=['student', 'status'], name='progress_student_status'),
+            models.Index(fields=['student', 'course'], name='progress_student_course'),
+            # Covers the completed-lesson aggregates of CourseProgress.rebuild()
+            models.Index(fields=['student', 'course', 'score', 'completed_at'],
+                         condition=Q(status='completed'), name='progress_completed'),
+        ]
+
+    # (status, score, completed_at) as last read from or written to the
+    # database, so the post_save/post_delete receivers can work out what changed.
+    _saved_state = (None, 0, None)
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        if all(f in instance.__dict__ for f in ('status', 'score', 'completed_at')):
+            instance._remember_completion()
+        return instance
+
+    def save(self, *args, **kwargs):
+        self.course_id = self.lesson.course_id
+        super().save(*args, **kwargs)
+        self._remember_completion()
+
+    # Race-free writes. A double-tapped "start" or two tabs submitting at
+    # once used to race in get_or_create(); these only issue single
+    # conditional statements (insert-if-missing, guarded UPDATEs with F()
+    # increments), so concurrent callers neither fail nor lose each other's
+    # changes. They send post_save themselves when a row's progress changed.
+
+    @classmethod
+    def ensure(cls, student_id, lesson, now=None):
+        """The learner's row for ``lesson``, added as not started if missing"""
+        row = cls.objects.filter(student_id=student_id, lesson=lesson).first()
+        if row is None:
+            cls._insert_missing(cls(student_id=student_id, lesson=lesson, course_id=lesson.course_id,
+                                    started_at=now or timezone.now()))
+            row = cls.objects.get(student_id=student_id, lesson=lesson)
+        return row
+
+    @classmethod
+    def start(cls, student_id, lesson, now=None):
+        """Mark a not started lesson as in progress and accessed ``now``.
+
+        Returns False, writing nothing, when the lesson was already started
+        or completed; callers record that access through ``heartbeats``.
+        """
+        now = now or timezone.now()
+        rows = cls.objects.filter(student_id=student_id, lesson=lesson)
+        row = cls(student_id=student_id, lesson=lesson, course_id=lesson.course_id,
+                  status='in_progress', started_at=now, last_accessed=now)
+        while True:
+            if rows.filter(status='not_started').update(
+                status='in_progress', started_at=Coalesce('started_at', Value(now)), last_accessed=now,
+            ):
+                # Adds nothing to CourseProgress, but the dashboard counts lessons in progress
+                row._saved_state = ('not_started', 0, None)
+                row._send_saved(created=False)
+                return True
+            if rows.exists():
+                return False
+            if cls._insert_missing(row):
+                return True
+
+    @classmethod
+    def complete(cls, student_id, lesson, score, attempts=0, now=None):
+        """Record a completion of ``lesson`` with ``score`` and add ``attempts`` to its count.
+
+        A completed lesson keeps its first completion time and its best
+        score, so a lower score never downgrades it. Returns True when the
+        lesson's status or score changed.
+        """
+        now = now or timezone.now()
+        rows = cls.objects.filter(student_id=student_id, lesson=lesson)
+        row = cls(student_id=student_id, lesson=lesson, course_id=lesson.course_id,
+                  status='completed', score=score, attempts=attempts,
+                  started_at=now, completed_at=now, last_accessed=now)
+        while True:
+            if rows.exclude(status='completed').update(
+                status='completed', score=score, completed_at=now, last_accessed=now,
+                started_at=Coalesce('started_at', Value(now)), attempts=F('attempts') + attempts,
+            ):
+                # Any status but completed adds nothing to CourseProgress
+                row._saved_state = ('in_progress', 0, None)
+                row._send_saved(created=False)
+                return True
+            if cls._insert_missing(row):
+                return True
+
+            saved = rows.filter(status='completed').values_list('score', 'completed_at').first()
+            if saved is None:
+                continue  # Reopened or deleted since the UPDATE above
+            old_score, completed_at = saved
+            best = max(old_score, score)
+            # Compare-and-set on the score read above; retried if it moved meanwhile
+            if rows.filter(status='completed', score=old_score).update(
+                score=best, last_accessed=now, attempts=F('attempts') + attempts,
+            ):
+                if best == old_score:
+                    ProgressStamp.touch([student_id])  # The attempt count and access time changed
+                    return False
+                row.score, row.completed_at = best, completed_at
+                row._saved_state = ('completed', old_score, completed_at)
+                row._send_saved(created=False)
+                return True
+
+    @classmethod
+    def _insert_missing(cls, row):
+        """INSERT ``row`` unless the learner already has a row for its lesson.
+
+        Returns whether it was inserted; post_save is sent if so.
+        """
+        if connection.features.supports_update_conflicts_with_target:
+            fields = [field for field in cls._meta.concrete_fields if not field.primary_key]
+            quote = connection.ops.quote_name
+            sql = 'INSERT INTO {} ({}) VALUES ({}) ON CONFLICT ({}, {}) DO NOTHING'.format(
+                quote(cls._meta.db_table),
+                ', '.join(quote(field.column) for field in fields),
+                ', '.join(['%s'] * len(fields)),
+                quote(cls._meta.get_field('student').column),
+                quote(cls._meta.get_field('lesson').column),
+            )
+            params = [field.get_db_prep_save(getattr(row, field.attname), connection) for field in fields]
+            with connection.cursor() as cursor:
+                cursor.execute(sql, params)
+                inserted = cursor.rowcount == 1
+        else:
+            try:
+                with transaction.atomic():
+                    cls.objects.bulk_create([row])
+                inserted = True
+            except IntegrityError:
+                inserted = False
+        if inserted:
+            row._send_saved(created=True)
+        return inserted
+
+    def _send_saved(self, created):
+        post_save.send(sender=type(self), instance=self, created=created,
+                       update_fields=None, raw=False, using=connection.alias)
+        self._remember_completion()
+
+    def _remember_completion(self):
+        self._saved_state = (self.status, self.score, self.completed_at)
+
+    @property
+    def progress_changed(self):
+        """Whether status, score or completion time differ from the saved row"""
+        return (self.status, self.score, self.completed_at) != self._saved_state
+
+    def completion_delta(self):
+        """Return the (lessons, score) change this row makes to its CourseProgress"""
+        old_status, old_score, _ = self._saved_state
+        was_completed = old_status == 'completed'
+        is_completed = self.status == 'completed'
+        lessons = int(is_completed) - int(was_completed)
+        score = (self.score if is_completed else 0) - (old_score if was_completed else 0)
+        return lessons, score
+
+    def deletion_delta(self):
+        """Return the (lessons, score) change caused by deleting this row"""
+        old_status, old_score, _ = self._saved_state
+        if old_status == 'completed':
+            return -1, -old_score
+        return 0, 0
 
     @property
     def completion_percentage(self):
@@ -140,58 +379,163 @@ class CourseProgress(models.Model):
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='not_started')
     started_at = models.DateTimeField(null=True, blank=True)
     completed_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
     
     class Meta:
         unique_together = ['student', 'course']
     
-    def update_progress(self):
-        """Update progress based on completed activities and quiz attempts"""
-        # Update activity-based progress
-        lessons = StudentProgress.objects.filter(
+    @staticmethod
+    def level_for_score(average_score):
+        """Achievement level for an average lesson score"""
+        if average_score >= 90:
+            return 3
+        elif average_score >= 70:
+            return 2
+        return 1
+
+    @classmethod
+    def apply_delta(cls, student_id, course_id, lessons=0, score=0, attempts=0,
+                    best_percentage=None, passed=False, started_at=None,
+                    last_lesson_date=None, create=True):
+        """Apply an incremental change to one course progress row.
+
+        Everything happens in a single UPDATE built from F() expressions, so
+        concurrent writers never lose each other's changes and the cost does
+        not grow with the learner's history. Derived columns (average score
+        and level) are computed from the new totals inside the same statement.
+        With ``create=False`` a missing row is left alone instead of created.
+        """
+        if create:
+            cls.insert_missing(student_id, course_id)
+        changes = {}
+
+        if lessons or score:
+            completed = F('total_lessons_completed') + lessons
+            total = F('total_score') + score
+            average = Case(
+                When(GreaterThan(completed, 0), then=ExpressionWrapper(
+                    Cast(total, models.FloatField()) / completed,
+                    output_field=models.FloatField(),
+                )),
+                default=Value(0.0),
+                output_field=models.FloatField(),
+            )
+            changes.update(
+                total_lessons_completed=completed,
+                total_score=total,
+                average_score=average,
+                level=Case(
+                    When(GreaterThanOrEqual(average, 90.0), then=Value(3)),
+                    When(GreaterThanOrEqual(average, 70.0), then=Value(2)),
+                    default=Value(1),
+                ),
+            )
+        if last_lesson_date is not None:
+            changes['last_lesson_date'] = Greatest(
+                Coalesce('last_lesson_date', Value(last_lesson_date)), Value(last_lesson_date)
+            )
+
+        if attempts:
+            changes['attempts_count'] = F('attempts_count') + attempts
+            changes['best_assessment_score'] = Greatest(
+                'best_assessment_score', Value(float(best_percentage or 0.0))
+            )
+            if passed:
+                changes['status'] = Value('completed')
+                changes['completed_at'] = Coalesce('completed_at', Value(timezone.now()))
+            else:
+                changes['status'] = Case(
+                    When(status__in=['completed', 'mastered'], then=F('status')),
+                    default=Value('in_progress'),
+                )
+            if started_at is not None:
+                changes['started_at'] = Coalesce('started_at', Value(started_at))
+
+        if changes:
+            changes['updated_at'] = Now()
+            cls.objects.filter(student_id=student_id, course_id=course_id).update(**changes)
+
+    @classmethod
+    def insert_missing(cls, student_id, course_id):
+        """Add the row of ``(student_id, course_id)`` unless it exists, in one statement"""
+        cls.objects.bulk_create([cls(student_id=student_id, course_id=course_id)], ignore_conflicts=True)
+
+    @classmethod
+    def for_pair(cls, student_id, course_id):
+        """The row of ``(student_id, course_id)``, added if missing"""
+        row = cls.objects.filter(student_id=student_id, course_id=course_id).first()
+        if row is None:
+            cls.insert_missing(student_id, course_id)
+            row = cls.objects.get(student_id=student_id, course_id=course_id)
+        return row
+
+    def rebuild(self):
+        """Recompute every aggregate from the full history (repair path).
+
+        The history already contains every change still queued for this row
+        as a ProgressJob (or pending in this thread's unit of work), so those
+        are discarded in the same transaction instead of being applied on top
+        of the rebuilt totals later. Jobs being applied by a worker are waited
+        for first.
+
+        A rebuild must not overlap with changes to this learner's history
+        that have committed but not been recorded yet (a request still inside
+        its unit of work): such a change would be counted by the rebuild and
+        again by its delta. Run repairs on quiet rows, or rebuild again.
+        """
+        from .progress import discard
+
+        with transaction.atomic():
+            # Jobs first, then the row: the progress worker locks in that order
+            discard(self.student_id, self.course_id)
+            self.refresh_from_db(from_queryset=type(self).objects.select_for_update())
+            self._rebuild()
+
+    def _rebuild(self):
+        lesson_totals = StudentProgress.objects.filter(
             student=self.student,
-            lesson__course=self.course,
+            course=self.course,
             status='completed'
+        ).aggregate(
+            completed=models.Count('id'),
+            total=models.Sum('score'),
+            last=models.Max('completed_at'),
         )
-        
-        self.total_lessons_completed = lessons.count()
-        self.total_score = sum(lesson.score for lesson in lessons)
+        self.total_lessons_completed = lesson_totals['completed']
+        self.total_score = lesson_totals['total'] or 0
+        self.last_lesson_date = lesson_totals['last']
         if self.total_lessons_completed > 0:
             self.average_score = self.total_score / self.total_lessons_completed
         else:
             self.average_score = 0.0
-        
-        # Update quiz-based progress
-        assessment_attempts = AssessmentAttempt.objects.filter(
-            user=self.student.user,
-            assessment__course=self.course
+        self.level = self.level_for_score(self.average_score)
+
+        attempt_totals = AssessmentAttempt.objects.filter(
+            user_id=self.student.user_id,
+            course=self.course
+        ).aggregate(
+            count=models.Count('id'),
+            best=models.Max('percentage'),
+            passed=models.Count('id', filter=Q(passed=True)),
+            first=models.Min('completed_at'),
         )
-        
-        if assessment_attempts.exists():
-            self.best_assessment_score = assessment_attempts.aggregate(
-                models.Max('percentage')
-            )['percentage__max'] or 0.0
-            self.attempts_count = assessment_attempts.count()
-            
-            # Check if any attempt passed
-            if assessment_attempts.filter(passed=True).exists():
+        self.attempts_count = attempt_totals['count']
+        self.best_assessment_score = attempt_totals['best'] or 0.0
+        if self.attempts_count:
+            if attempt_totals['passed']:
                 self.status = 'completed'
                 if not self.completed_at:
                     self.completed_at = timezone.now()
             else:
                 self.status = 'in_progress'
-                
             if not self.started_at:
-                self.started_at = assessment_attempts.order_by('completed_at').first().completed_at
-        
-        # Update level based on progress
-        if self.average_score >= 90:
-            self.level = 3
-        elif self.average_score >= 70:
-            self.level = 2
-        else:
-            self.level = 1
-        
+                self.started_at = attempt_totals['first']
+
         self.save()
+
+    def update_progress(self):
+        """Kept for existing callers; performs a full rebuild"""
+        self.rebuild()
     
     def __str__(self):
       return "{} - {} - {}".format(
@@ -199,4 +543,218 @@ class CourseProgress(models.Model):
         self.course.name,
         self.status
     )
-  
\ No newline at end of file
+  
+
+class ProgressJob(models.Model):
+    """Queued CourseProgress change waiting for the progress worker"""
+    student = models.ForeignKey(StudentProfile, on_delete=models.CASCADE)
+    course = models.ForeignKey(Course, on_delete=models.CASCADE)
+    delta = models.JSONField(default=dict, encoder=DjangoJSONEncoder)
+    create_missing = models.BooleanField(default=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        ordering = ['id']
+
+    def __str__(self):
+        return "Progress job {} ({} / {})".format(self.pk, self.student_id, self.course_id)
+
+
+class StudentDashboardSnapshot(models.Model):
+    """Denormalized dashboard data for one learner, refreshed by the progress pipeline"""
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True,
+                                related_name='dashboard_snapshot')
+    data = models.JSONField(default=dict, encoder=DjangoJSONEncoder)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return "Dashboard snapshot for user {}".format(self.user_id)
+
+
+class ProgressStamp(models.Model):
+    """Version of everything the progress views show about one learner.
+
+    Every write path that changes a learner's progress calls ``touch()``,
+    which stores a new random token. The token and time drive the ETag and
+    Last-Modified headers of those views, see learning.conditional.
+    """
+    student = models.OneToOneField(StudentProfile, on_delete=models.CASCADE, primary_key=True,
+                                   related_name='progress_stamp')
+    token = models.CharField(max_length=32)
+    changed_at = models.DateTimeField()
+
+    @classmethod
+    def touch(cls, student_ids):
+        """Give each learner a new stamp once the transaction commits.
+
+        ``student_ids`` may be a lazy queryset; it is read at commit time.
+        Deferring also makes touches from a cascade delete of the learner
+        find the learner gone instead of re-creating its stamp. Touches are
+        merged per unit of work (see learning.progress), so a request writes
+        each stamp once however many of its writes touch it.
+        """
+        from .progress import touch
+        touch(student_ids)
+
+    @classmethod
+    def _touch(cls, student_ids):
+        student_ids = set(student_ids) - {None}
+        if not student_ids:
+            return
+        token, now = uuid.uuid4().hex, timezone.now()
+        if cls.objects.filter(student_id__in=student_ids).update(token=token, changed_at=now) == len(student_ids):
+            return
+        stamped = set(cls.objects.filter(student_id__in=student_ids).values_list('student_id', flat=True))
+        cls.objects.bulk_create([
+            cls(student_id=student_id, token=token, changed_at=now)
+            for student_id in StudentProfile.objects.filter(
+                pk__in=student_ids - stamped).values_list('pk', flat=True)
+        ], ignore_conflicts=True)
+
+    @classmethod
+    def for_user(cls, user_id):
+        """``(token, changed_at)`` of a user's learner, or ``(None, None)`` before any change"""
+        return cls.objects.filter(student__user_id=user_id).values_list(
+            'token', 'changed_at').first() or (None, None)
+
+    def __str__(self):
+        return "Progress stamp {} for student {}".format(self.token, self.student_id)
+
+
+class AttemptRollup(models.Model):
+    """Assessment attempts pre-aggregated per assessment, period and grade level.
+
+    Maintained incrementally by learning.analytics as attempts arrive; old
+    daily rows are merged into monthly ones by ``manage.py compact_analytics``.
+    """
+    PERIOD_CHOICES = [
+        ('day', 'Day'),
+        ('month', 'Month'),
+    ]
+    # Score distribution in bands of 20 percentage points; 100% is in the top band
+    BUCKETS = 5
+    COUNTERS = ['attempts', 'passed', 'percentage_sum', 'timed_attempts', 'time_taken_seconds',
+                'bucket_0', 'bucket_1', 'bucket_2', 'bucket_3', 'bucket_4']
+
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='+')
+    lesson = models.ForeignKey(Lesson, on_delete=models.CASCADE, related_name='+', null=True, blank=True)
+    assessment = models.ForeignKey(Assessment, on_delete=models.CASCADE, related_name='+')
+    period = models.CharField(max_length=10, choices=PERIOD_CHOICES, default='day')
+    day = models.DateField()  # First day of the period
+    grade_level = models.CharField(max_length=20, blank=True)
+    attempts = models.IntegerField(default=0)
+    passed = models.IntegerField(default=0)
+    percentage_sum = models.FloatField(default=0.0)
+    timed_attempts = models.IntegerField(default=0)
+    time_taken_seconds = models.FloatField(default=0.0)
+    bucket_0 = models.IntegerField(default=0)
+    bucket_1 = models.IntegerField(default=0)
+    bucket_2 = models.IntegerField(default=0)
+    bucket_3 = models.IntegerField(default=0)
+    bucket_4 = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            UniqueConstraint(fields=['assessment', 'grade_level', 'period', 'day'],
+                             name='unique_attempt_rollup')
+        ]
+        indexes = [
+            models.Index(fields=['course', 'day'], name='rollup_course_day'),
+        ]
+
+    @classmethod
+    def bucket_for(cls, percentage):
+        return 'bucket_{}'.format(min(cls.BUCKETS - 1, max(0, int(percentage // 20))))
+
+    @classmethod
+    def apply_delta(cls, assessment_id, course_id, lesson_id, grade_level, day,
+                    period='day', **counters):
+        """Add ``counters`` to one rollup row with a single F() UPDATE"""
+        cls.objects.get_or_create(
+            assessment_id=assessment_id, grade_level=grade_level, period=period, day=day,
+            defaults={'course_id': course_id, 'lesson_id': lesson_id},
+        )
+        changes = {name: F(name) + value for name, value in counters.items() if value}
+        if changes:
+            cls.objects.filter(
+                assessment_id=assessment_id, grade_level=grade_level, period=period, day=day
+            ).update(**changes)
+
+    def __str__(self):
+        return "{} {} {} ({} attempts)".format(self.assessment_id, self.period, self.day, self.attempts)
+
+
+class ActivityCalendar(models.Model):
+    """One bit per day on which a learner was active, see learning.activity"""
+    student = models.OneToOneField(StudentProfile, on_delete=models.CASCADE, primary_key=True,
+                                   related_name='activity_calendar')
+    epoch = models.DateField()  # The day stored in bit 0
+    bits = models.BinaryField(default=b'')  # Little-endian day bitmap
+    last_active = models.DateField(null=True, blank=True)
+    streak = models.IntegerField(default=0)  # Run of active days ending on last_active
+    longest_streak = models.IntegerField(default=0)
+
+    def __str__(self):
+        return "Activity calendar for student {}".format(self.student_id)
+
+
+class BadgeCounter(models.Model):
+    """Running count a badge rule is evaluated against, see learning.badges"""
+    student = models.ForeignKey(StudentProfile, on_delete=models.CASCADE, related_name='badge_counters')
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, null=True, blank=True, related_name='+')
+    name = models.CharField(max_length=50)
+    value = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            UniqueConstraint(fields=['student', 'course', 'name'], condition=Q(course__isnull=False),
+                             name='unique_course_badge_counter'),
+            UniqueConstraint(fields=['student', 'name'], condition=Q(course__isnull=True),
+                             name='unique_badge_counter'),
+        ]
+
+    def __str__(self):
+        return "{} = {} (student {})".format(self.name, self.value, self.student_id)
+
+
+class StudentBadge(models.Model):
+    """A badge earned by a learner, optionally within one course"""
+    student = models.ForeignKey(StudentProfile, on_delete=models.CASCADE, related_name='badges')
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, null=True, blank=True, related_name='+')
+    code = models.CharField(max_length=50)
+    earned_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ['-earned_at']
+        constraints = [
+            UniqueConstraint(fields=['student', 'course', 'code'], condition=Q(course__isnull=False),
+                             name='unique_course_badge'),
+            UniqueConstraint(fields=['student', 'code'], condition=Q(course__isnull=True),
+                             name='unique_badge'),
+        ]
+
+    def __str__(self):
+        return "{} earned {}".format(self.student_id, self.code)
+
+
+class SearchEntry(models.Model):
+    """Searchable text of one course, lesson or assessment, see learning.search"""
+    KIND_CHOICES = [
+        ('course', 'Course'),
+        ('lesson', 'Lesson'),
+        ('assessment', 'Assessment'),
+    ]
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    object_id = models.PositiveIntegerField()
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='+')
+    difficulty_level = models.IntegerField(null=True, blank=True)  # Of the lesson; None for courses
+    title = models.CharField(max_length=200)
+    body = models.TextField(blank=True)
+
+    class Meta:
+        constraints = [
+            UniqueConstraint(fields=['kind', 'object_id'], name='unique_search_entry'),
+        ]
+
+    def __str__(self):
+        return "{} {}: {}".format(self.kind, self.object_id, self.title)
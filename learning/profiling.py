@@ -0,0 +1,206 @@
+"""
+Opt-in profiling of single requests.
+
+A staff user adds ``?_profile=1`` or an ``X-Profile: 1`` header to a request.
+That request then runs under cProfile with every SQL statement timed. The
+result is written as one JSON file under ``PROFILE_DIR``, which keeps the
+newest ``PROFILE_KEEP`` files. It is browsed through the staff-only
+``profile_list`` and ``profile_detail`` views. Requests without the flag
+pay only for the flag check.
+"""
+import cProfile
+import json
+import os
+import pstats
+import re
+import time
+import uuid
+from contextlib import ExitStack
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.utils import timezone
+
+from .metrics import view_name, wrap_connections
+
+HEADER = 'HTTP_X_PROFILE'
+PARAM = '_profile'
+TOP_FUNCTIONS = 40
+PROFILE_ID = re.compile(r'^[0-9]+-[0-9a-f]+$')
+
+
+def flagged(request):
+    """True when the request asks to be profiled"""
+    if not settings.PROFILING_ENABLED:
+        return False
+    if request.META.get(HEADER) == '1':
+        return True
+    # Only parse the query string when it may carry the flag
+    return PARAM in request.META.get('QUERY_STRING', '') and request.GET.get(PARAM) == '1'
+
+
+def is_staff(user):
+    return bool(user and user.is_staff)
+
+
+class QueryLog:
+    """Database execute wrapper keeping each statement with its duration"""
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append({
+                'sql': sql,
+                'params': repr(params)[:500],
+                'many': many,
+                'ms': round((time.perf_counter() - started) * 1000, 3),
+            })
+
+
+def profile(request, get_response):
+    """Run ``get_response`` under the profiler and store the result"""
+    log = QueryLog()
+    profiler = cProfile.Profile()
+    started = time.perf_counter()
+    with ExitStack() as stack:
+        wrap_connections(stack, log)
+        profiler.enable()
+        try:
+            response = get_response(request)
+        finally:
+            profiler.disable()
+    return _finish(request, response, time.perf_counter() - started, profiler, log)
+
+
+async def aprofile(request, get_response):
+    """``profile()`` for the ASGI chain.
+
+    cProfile only sees the event loop thread, so time the view spends in
+    ``sync_to_async`` calls shows up as waiting; the SQL log is still complete.
+    """
+    log = QueryLog()
+    profiler = cProfile.Profile()
+    started = time.perf_counter()
+    stack = ExitStack()
+    await sync_to_async(wrap_connections)(stack, log)
+    profiler.enable()
+    try:
+        response = await get_response(request)
+    finally:
+        profiler.disable()
+        await sync_to_async(stack.close)()
+    return await sync_to_async(_finish)(request, response, time.perf_counter() - started, profiler, log)
+
+
+def _finish(request, response, duration, profiler, log):
+    profile_id = save({
+        'path': request.get_full_path(),
+        'method': request.method,
+        'view': view_name(request),
+        'user_id': request.user.pk,
+        'status': response.status_code,
+        'created_at': timezone.now().isoformat(),
+        'duration_ms': round(duration * 1000, 3),
+        'sql_ms': round(sum(query['ms'] for query in log.queries), 3),
+        'functions': top_functions(profiler),
+        'queries': log.queries,
+    })
+    response['X-Profile-Id'] = profile_id
+    return response
+
+
+def top_functions(profiler, limit=TOP_FUNCTIONS):
+    """The most expensive functions by cumulative time"""
+    stats = pstats.Stats(profiler)
+    rows = []
+    for (filename, line, name), (_, calls, own, cumulative, _) in stats.stats.items():
+        rows.append({
+            'function': '{}:{}({})'.format(_short(filename), line, name),
+            'calls': calls,
+            'own_ms': round(own * 1000, 3),
+            'cumulative_ms': round(cumulative * 1000, 3),
+        })
+    rows.sort(key=lambda row: row['cumulative_ms'], reverse=True)
+    return rows[:limit]
+
+
+def _short(filename):
+    base = str(settings.BASE_DIR)
+    return os.path.relpath(filename, base) if filename.startswith(base) else filename
+
+
+def _path(profile_id):
+    return os.path.join(settings.PROFILE_DIR, profile_id + '.json')
+
+
+def save(data):
+    """Write one profile and drop the oldest beyond PROFILE_KEEP; returns its id"""
+    os.makedirs(settings.PROFILE_DIR, exist_ok=True)
+    profile_id = '{}-{}'.format(time.time_ns(), uuid.uuid4().hex[:8])
+    data['id'] = profile_id
+    with open(_path(profile_id), 'w') as handle:
+        json.dump(data, handle)
+    for stale in stored_ids()[settings.PROFILE_KEEP:]:
+        try:
+            os.remove(_path(stale))
+        except FileNotFoundError:
+            pass
+    return profile_id
+
+
+def stored_ids():
+    """Ids of the stored profiles, newest first"""
+    try:
+        names = os.listdir(settings.PROFILE_DIR)
+    except FileNotFoundError:
+        return []
+    ids = [name[:-5] for name in names if name.endswith('.json') and PROFILE_ID.match(name[:-5])]
+    return sorted(ids, key=lambda profile_id: int(profile_id.split('-')[0]), reverse=True)
+
+
+def load(profile_id):
+    """A stored profile, or None"""
+    if not PROFILE_ID.match(profile_id):
+        return None
+    try:
+        with open(_path(profile_id)) as handle:
+            return json.load(handle)
+    except FileNotFoundError:
+        return None
+
+
+def summaries():
+    """One line per stored profile, newest first"""
+    rows = []
+    for profile_id in stored_ids():
+        data = load(profile_id)
+        if data is None:
+            continue
+        rows.append({key: data.get(key) for key in (
+            'id', 'path', 'method', 'view', 'status', 'created_at', 'duration_ms', 'sql_ms'
+        )} | {'queries': len(data.get('queries', []))})
+    return rows
+
+
+def report(data, limit=20):
+    """The most expensive functions and queries of one profile"""
+    queries = {}
+    for query in data['queries']:
+        entry = queries.setdefault(query['sql'], {'sql': query['sql'], 'count': 0, 'ms': 0.0})
+        entry['count'] += 1
+        entry['ms'] = round(entry['ms'] + query['ms'], 3)
+    return {
+        **{key: value for key, value in data.items() if key not in ('functions', 'queries')},
+        'query_count': len(data['queries']),
+        'functions': data['functions'][:limit],
+        'slowest_queries': sorted(data['queries'], key=lambda query: query['ms'], reverse=True)[:limit],
+        'repeated_queries': sorted(
+            (entry for entry in queries.values() if entry['count'] > 1),
+            key=lambda entry: entry['ms'], reverse=True,
+        )[:limit],
+    }
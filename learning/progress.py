@@ -0,0 +1,258 @@
+"""
+Request-scoped unit of work for CourseProgress updates.
+
+A single submission touches CourseProgress several times through the signal
+cascade (the attempt itself, the lesson it completes, ...). Instead of
+writing each change as it happens, receivers ``record()`` it here. Changes
+are merged per (student, course) pair and each pair is written exactly once
+when the surrounding ``unit_of_work()`` ends. Changes recorded inside a
+``transaction.atomic`` block are only collected once that block commits, so
+rolled back work never reaches CourseProgress.
+
+Unless ``PROGRESS_QUEUE_SYNC`` is set, "written" means queued: each pair
+becomes one ProgressJob row and ``manage.py progress_worker`` applies the
+queue in batches, outside the request/response cycle.
+``CourseProgress.rebuild()`` recomputes a row from history and discards its
+queued changes, see ``discard()``.
+
+ProgressStamp touches (``touch()``) are merged the same way: each learner's
+stamp is written once when the unit of work ends.
+"""
+import threading
+from contextlib import contextmanager
+from functools import partial
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+_state = threading.local()
+
+
+class ProgressDelta:
+    """Accumulated change to one (student, course) CourseProgress row"""
+
+    def __init__(self):
+        self.lessons = 0
+        self.score = 0
+        self.attempts = 0
+        self.best_percentage = None
+        self.passed = False
+        self.started_at = None
+        self.last_lesson_date = None
+
+    def merge(self, lessons=0, score=0, attempts=0, best_percentage=None,
+              passed=False, started_at=None, last_lesson_date=None):
+        self.lessons += lessons
+        self.score += score
+        self.attempts += attempts
+        self.passed = self.passed or passed
+        if best_percentage is not None:
+            self.best_percentage = max(self.best_percentage or 0.0, best_percentage)
+        if started_at is not None:
+            self.started_at = min(self.started_at or started_at, started_at)
+        if last_lesson_date is not None:
+            self.last_lesson_date = max(self.last_lesson_date or last_lesson_date, last_lesson_date)
+
+    def as_kwargs(self):
+        return {
+            'lessons': self.lessons,
+            'score': self.score,
+            'attempts': self.attempts,
+            'best_percentage': self.best_percentage,
+            'passed': self.passed,
+            'started_at': self.started_at,
+            'last_lesson_date': self.last_lesson_date,
+        }
+
+    @classmethod
+    def from_json(cls, data):
+        """Rebuild a delta stored on a ProgressJob"""
+        delta = cls()
+        delta.merge(
+            lessons=data.get('lessons', 0),
+            score=data.get('score', 0),
+            attempts=data.get('attempts', 0),
+            best_percentage=data.get('best_percentage'),
+            passed=data.get('passed', False),
+            started_at=_parse(data.get('started_at')),
+            last_lesson_date=_parse(data.get('last_lesson_date')),
+        )
+        return delta
+
+
+def _parse(value):
+    return parse_datetime(value) if isinstance(value, str) else value
+
+
+def queue_is_sync():
+    return getattr(settings, 'PROGRESS_QUEUE_SYNC', False)
+
+
+def _pending():
+    if not hasattr(_state, 'pending'):
+        _state.pending = {}
+    return _state.pending
+
+
+def _touched():
+    if not hasattr(_state, 'touched'):
+        _state.touched = set()
+    return _state.touched
+
+
+def _in_unit_of_work():
+    return getattr(_state, 'depth', 0) > 0
+
+
+def record(student_id, course_id, create=True, **changes):
+    """Record a change to the CourseProgress row of ``(student_id, course_id)``"""
+    transaction.on_commit(partial(_collect, student_id, course_id, create, changes))
+
+
+def _collect(student_id, course_id, create, changes):
+    key = (student_id, course_id, create)
+    _pending().setdefault(key, ProgressDelta()).merge(**changes)
+    if not _in_unit_of_work():
+        flush()
+
+
+def flush():
+    """Write or queue every pending change, once per (student, course) pair"""
+    from .models import CourseProgress, ProgressJob
+
+    pending = _pending()
+    if not pending:
+        return
+    if queue_is_sync():
+        pairs = set()
+        while pending:
+            (student_id, course_id, create), delta = pending.popitem()
+            CourseProgress.apply_delta(student_id, course_id, create=create, **delta.as_kwargs())
+            pairs.add((student_id, course_id))
+        _after_apply(pairs)
+        return
+
+    jobs = []
+    while pending:
+        (student_id, course_id, create), delta = pending.popitem()
+        if not create:
+            # Removals come from deletes, often cascading from the student or
+            # course itself, so a queued job could not reference them. They
+            # only touch an existing row, so apply them straight away.
+            CourseProgress.apply_delta(student_id, course_id, create=False, **delta.as_kwargs())
+            continue
+        jobs.append(ProgressJob(student_id=student_id, course_id=course_id, delta=delta.as_kwargs()))
+    ProgressJob.objects.bulk_create(jobs)
+
+
+def touch(student_ids):
+    """Renew the ProgressStamp of ``student_ids`` after commit, once per unit of work"""
+    transaction.on_commit(partial(_collect_touch, student_ids))
+
+
+def _collect_touch(student_ids):
+    _touched().update(student_ids)
+    if not _in_unit_of_work():
+        flush_touches()
+
+
+def flush_touches():
+    """Write every pending ProgressStamp touch in one go"""
+    from .models import ProgressStamp
+
+    touched = _touched()
+    if touched:
+        student_ids = set(touched)
+        touched.clear()
+        ProgressStamp._touch(student_ids)
+
+
+def discard(student_id, course_id):
+    """Drop every change of ``(student_id, course_id)`` not yet applied.
+
+    For ``CourseProgress.rebuild()``, whose totals already include them.
+    Queued jobs are locked before they are deleted, so jobs a worker is
+    applying right now are waited for instead of being applied afterwards.
+    """
+    from .models import ProgressJob
+
+    pending = _pending()
+    for create in (True, False):
+        pending.pop((student_id, course_id, create), None)
+    jobs = ProgressJob.objects.filter(student_id=student_id, course_id=course_id)
+    locked = list(jobs.select_for_update().values_list('pk', flat=True))
+    if locked:
+        ProgressJob.objects.filter(pk__in=locked).delete()
+
+
+def _after_apply(pairs):
+    """Refresh the read models that depend on the given (student, course) rows"""
+    from . import leaderboard
+    from .dashboard import refresh_dashboards
+    from .models import ProgressStamp
+
+    student_ids = {student_id for student_id, _ in pairs}
+    refresh_dashboards(student_ids)
+    ProgressStamp.touch(student_ids)
+    leaderboard.refresh(pairs)
+
+
+def drain(limit=500):
+    """Apply up to ``limit`` queued jobs, merged per (student, course).
+
+    Returns ``(jobs applied, age in seconds of the oldest job applied)`` so
+    callers can report how far behind the queue is.
+    """
+    from .models import CourseProgress, ProgressJob
+
+    with transaction.atomic():
+        jobs = list(
+            ProgressJob.objects.select_for_update(skip_locked=True).order_by('id')[:limit]
+        )
+        if not jobs:
+            return 0, 0.0
+
+        merged = {}
+        for job in jobs:
+            key = (job.student_id, job.course_id)
+            delta, create = merged.get(key, (ProgressDelta(), False))
+            delta.merge(**ProgressDelta.from_json(job.delta).as_kwargs())
+            merged[key] = (delta, create or job.create_missing)
+
+        for (student_id, course_id), (delta, create) in merged.items():
+            CourseProgress.apply_delta(student_id, course_id, create=create, **delta.as_kwargs())
+        ProgressJob.objects.filter(pk__in=[job.pk for job in jobs]).delete()
+        _after_apply(set(merged))
+
+    lag = (timezone.now() - jobs[0].created_at).total_seconds()
+    return len(jobs), lag
+
+
+def queue_stats():
+    """Return ``(pending jobs, age in seconds of the oldest pending job)``"""
+    from .models import ProgressJob
+
+    oldest = ProgressJob.objects.order_by('id').values_list('created_at', flat=True).first()
+    if oldest is None:
+        return 0, 0.0
+    return ProgressJob.objects.count(), (timezone.now() - oldest).total_seconds()
+
+
+@contextmanager
+def unit_of_work():
+    """Coalesce CourseProgress changes until the outermost block exits.
+
+    Wrap a request (see ``ProgressUnitOfWorkMiddleware``) or a
+    ``transaction.atomic()`` block with it. Changes committed while the
+    block is open are written once when it exits.
+    """
+    _state.depth = getattr(_state, 'depth', 0) + 1
+    try:
+        yield
+    finally:
+        _state.depth -= 1
+        if _state.depth == 0:
+            flush()
+            flush_touches()
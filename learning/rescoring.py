@@ -0,0 +1,100 @@
+"""
+Bulk re-scoring of assessment attempts after an assessment's rules change.
+
+``percentage`` and ``passed`` are stored on each AssessmentAttempt when it is
+saved, so editing ``total_questions`` or ``passing_score`` leaves existing
+attempts stale. ``rescore()`` recomputes them with set-based UPDATEs over
+primary-key ranges of ``chunk_size`` rows, touching only rows whose values
+change and firing no signals. Afterwards each affected CourseProgress row is
+rebuilt once, along with the dashboards and analytics rollup built on them.
+Rebuilding discards the rows' queued ProgressJobs, which were computed with
+the old grades.
+"""
+from django.db import transaction
+from django.db.models import (
+    BooleanField, Case, ExpressionWrapper, FloatField, Max, Min, Value, When
+)
+from django.db.models.functions import Cast
+from django.db.models.lookups import GreaterThanOrEqual
+
+from . import analytics, progress
+from .models import Assessment, AssessmentAttempt, CourseProgress, ProgressJob
+
+CHUNK_SIZE = 5000
+
+
+def _grade_expressions(assessment):
+    """SQL equivalents of ``Assessment.grade()`` for one assessment"""
+    if assessment.total_questions <= 0:
+        return Value(0.0), Value(False)
+    # Same operation order as grade() so the floats match exactly
+    percentage = ExpressionWrapper(
+        Cast('score', FloatField()) / Value(float(assessment.total_questions)) * Value(100.0),
+        output_field=FloatField(),
+    )
+    passed = Case(
+        When(GreaterThanOrEqual(percentage, assessment.passing_score), then=Value(True)),
+        default=Value(False),
+        output_field=BooleanField(),
+    )
+    return percentage, passed
+
+
+def _rescore_assessment(assessment, chunk_size):
+    """Rescore one assessment's attempts; returns (rows updated, affected user ids)"""
+    attempts = AssessmentAttempt.objects.filter(assessment=assessment)
+    bounds = attempts.aggregate(low=Min('pk'), high=Max('pk'))
+    if bounds['low'] is None:
+        return 0, set()
+
+    percentage, passed = _grade_expressions(assessment)
+    updated = 0
+    users = set()
+    for start in range(bounds['low'], bounds['high'] + 1, chunk_size):
+        stale = attempts.filter(pk__gte=start, pk__lt=start + chunk_size).exclude(
+            percentage=percentage, passed=passed
+        )
+        users.update(stale.values_list('user_id', flat=True).distinct())
+        updated += stale.update(percentage=percentage, passed=passed)
+    return updated, users
+
+
+def rescore(assessment_ids=None, chunk_size=CHUNK_SIZE):
+    """Recompute percentage and pass status of the given (or all) assessments.
+
+    Returns ``{'assessments', 'attempts', 'progress_rebuilt'}`` counts.
+    """
+    assessments = Assessment.objects.all()
+    if assessment_ids is not None:
+        assessments = assessments.filter(pk__in=assessment_ids)
+
+    attempts_changed = 0
+    affected = {}  # course id -> user ids
+    rescored = []
+    with transaction.atomic():
+        for assessment in assessments:
+            changed, users = _rescore_assessment(assessment, chunk_size)
+            rescored.append(assessment.pk)
+            attempts_changed += changed
+            if users:
+                affected.setdefault(assessment.course_id, set()).update(users)
+
+        rows = CourseProgress.objects.none()
+        for course_id, users in affected.items():
+            # A queued job may be about to create the row; create it now so
+            # the rebuild replaces the job
+            queued = ProgressJob.objects.filter(course_id=course_id, student__user_id__in=users)
+            for student_id in set(queued.values_list('student_id', flat=True)):
+                CourseProgress.insert_missing(student_id, course_id)
+            rows |= CourseProgress.objects.filter(course_id=course_id, student__user_id__in=users)
+        pairs = set()
+        for course_progress in rows.select_related('student', 'course'):
+            course_progress.rebuild()
+            pairs.add((course_progress.student_id, course_progress.course_id))
+
+        if pairs:
+            transaction.on_commit(lambda: progress._after_apply(pairs))
+        if rescored:
+            analytics.rebuild(rescored)
+
+    return {'assessments': len(rescored), 'attempts': attempts_changed, 'progress_rebuilt': len(pairs)}
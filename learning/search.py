@@ -0,0 +1,240 @@
+"""
+Full-text search over courses, lessons and assessments.
+
+Each searchable object has one SearchEntry row (title, body, course and
+difficulty level). A course's entry also carries the names of its lessons and
+assessments, so course search ranks one row per course. Signals keep the
+rows in step with saves and deletes.
+The text index depends on the database backend:
+
+* SQLite: an external-content FTS5 table, ``learning_search_fts``, kept in
+  sync with SearchEntry by triggers and ranked with bm25(). The entry kind
+  is indexed too, so kind filters are applied inside the FTS query.
+* PostgreSQL: a GIN index on a weighted ``tsvector`` expression, ranked with
+  ts_rank_cd().
+
+Other backends fall back to ``icontains`` on SearchEntry. Every search term
+is matched as a prefix once it has ``MIN_PREFIX`` characters, so partially
+typed words ("dino") find whole ones ("dinosaurs"). A title match ranks
+above a body match.
+"""
+import re
+from functools import partial
+
+from django.db import connection, transaction
+from django.db.models import Q
+
+from .models import Assessment, Course, Lesson, SearchEntry
+
+FTS_TABLE = 'learning_search_fts'
+# Must match the expression indexed in migration 0012 for the index to be used
+PG_VECTOR = ("setweight(to_tsvector('simple', e.title), 'A') || "
+             "setweight(to_tsvector('simple', e.body), 'B')")
+# bm25() weights for the title and body columns
+TITLE_WEIGHT, BODY_WEIGHT = 10.0, 1.0
+MIN_PREFIX = 2
+MAX_TERMS = 8
+BATCH_SIZE = 1000
+
+WORD = re.compile(r'\w+', re.UNICODE)
+
+
+def terms(query):
+    """Lower-cased words of a user query"""
+    return [word.lower() for word in WORD.findall(query or '')][:MAX_TERMS]
+
+
+def _fts5_query(words, kinds=None):
+    text = ' '.join('"{}"{}'.format(word, '*' if len(word) >= MIN_PREFIX else '') for word in words)
+    if not kinds:
+        return '{title body} : (' + text + ')'
+    # Filtering on the indexed kind column inside FTS5 keeps rows of other
+    # kinds from being joined and ranked at all
+    return '{{title body}} : ({}) AND kind : ({})'.format(text, ' OR '.join(kinds))
+
+
+def _tsquery(words):
+    return ' & '.join("'{}'{}".format(word, ':*' if len(word) >= MIN_PREFIX else '') for word in words)
+
+
+def _filters(kinds, difficulty, course_ids):
+    """Extra WHERE clauses on the SearchEntry alias ``e``, with their params"""
+    clauses, params = [], []
+    if kinds and connection.vendor != 'sqlite':
+        clauses.append('e.kind IN ({})'.format(', '.join(['%s'] * len(kinds))))
+        params += list(kinds)
+    if course_ids is not None:
+        course_ids = list(course_ids) or [None]
+        clauses.append('e.course_id IN ({})'.format(', '.join(['%s'] * len(course_ids))))
+        params += course_ids
+    if difficulty is not None:
+        # Lessons and assessments at that level, and courses that have such a lesson
+        clauses.append(
+            '(e.difficulty_level = %s OR (e.kind = %s AND EXISTS ('
+            'SELECT 1 FROM {} l WHERE l.course_id = e.course_id AND l.difficulty_level = %s)))'.format(
+                Lesson._meta.db_table)
+        )
+        params += [difficulty, 'course', difficulty]
+    return ''.join(' AND ' + clause for clause in clauses), params
+
+
+def search(query, kinds=None, difficulty=None, course_ids=None, limit=50):
+    """Best matching entries as ``(kind, object_id, course_id, title, rank)``, best first.
+
+    ``rank`` is only comparable within one result list.
+    """
+    words = terms(query)
+    if not words:
+        return []
+    where, params = _filters(kinds, difficulty, course_ids)
+    table = SearchEntry._meta.db_table
+
+    if connection.vendor == 'sqlite':
+        sql = (
+            'SELECT e.kind, e.object_id, e.course_id, e.title, -bm25({fts}, %s, %s, 0.0) AS rank '
+            'FROM {fts} JOIN {table} e ON e.id = {fts}.rowid '
+            'WHERE {fts} MATCH %s{where} ORDER BY rank DESC, e.id LIMIT %s'
+        ).format(fts=FTS_TABLE, table=table, where=where)
+        params = [TITLE_WEIGHT, BODY_WEIGHT, _fts5_query(words, kinds)] + params + [limit]
+    elif connection.vendor == 'postgresql':
+        sql = (
+            'SELECT e.kind, e.object_id, e.course_id, e.title, ts_rank_cd({vector}, q) AS rank '
+            'FROM {table} e, to_tsquery(\'simple\', %s) q '
+            'WHERE {vector} @@ q{where} ORDER BY rank DESC, e.id LIMIT %s'
+        ).format(vector=PG_VECTOR, table=table, where=where)
+        params = [_tsquery(words)] + params + [limit]
+    else:
+        entries = SearchEntry.objects.all()
+        for word in words:
+            entries = entries.filter(Q(title__icontains=word) | Q(body__icontains=word))
+        if kinds:
+            entries = entries.filter(kind__in=kinds)
+        if course_ids is not None:
+            entries = entries.filter(course_id__in=course_ids)
+        if difficulty is not None:
+            entries = entries.filter(
+                Q(difficulty_level=difficulty)
+                | Q(kind='course', course__lessons__difficulty_level=difficulty)
+            ).distinct()
+        return [row + (0.0,) for row in entries.values_list(
+            'kind', 'object_id', 'course_id', 'title'
+        ).order_by('title')[:limit]]
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.fetchall()
+
+
+def course_ids(query, difficulty=None, limit=200):
+    """Ids of courses matching ``query``, best first.
+
+    Course entries also hold the names of the course's lessons and
+    assessments, so this ranks one entry per course instead of every
+    matching lesson.
+    """
+    return [row[1] for row in search(query, kinds=['course'], difficulty=difficulty, limit=limit)]
+
+
+# Index maintenance
+
+def course_entry(course, contents=None):
+    """The entry of a course; ``contents`` are its lesson names and assessment titles"""
+    if contents is None:
+        contents = course_contents([course.pk]).get(course.pk, [])
+    return SearchEntry(kind='course', object_id=course.pk, course_id=course.pk, title=course.name,
+                       body=course_body(course.description, contents))
+
+
+def course_body(description, contents):
+    """The description plus each distinct word of ``contents`` once.
+
+    Lesson names repeat words a lot; keeping each once keeps course entries
+    and the index small.
+    """
+    words = dict.fromkeys(word.lower() for text in contents for word in WORD.findall(text))
+    return ' '.join([description or ''] + list(words))
+
+
+def course_contents(course_ids=None):
+    """{course id: lesson names and assessment titles}"""
+    lessons = Lesson.objects.all()
+    assessments = Assessment.objects.all()
+    if course_ids is not None:
+        lessons = lessons.filter(course_id__in=course_ids)
+        assessments = assessments.filter(course_id__in=course_ids)
+    contents = {}
+    for queryset, field in ((lessons, 'name'), (assessments, 'title')):
+        for course_id, text in queryset.order_by('pk').values_list('course_id', field).iterator():
+            contents.setdefault(course_id, []).append(text)
+    return contents
+
+
+def lesson_entry(lesson):
+    return SearchEntry(kind='lesson', object_id=lesson.pk, course_id=lesson.course_id,
+                       difficulty_level=lesson.difficulty_level, title=lesson.name,
+                       body=lesson.slug.replace('-', ' '))
+
+
+def assessment_entry(assessment, lesson=None):
+    lesson = lesson if lesson is not None else assessment.lesson
+    return SearchEntry(kind='assessment', object_id=assessment.pk, course_id=assessment.course_id,
+                       difficulty_level=lesson.difficulty_level if lesson else None,
+                       title=assessment.title, body=lesson.name if lesson else '')
+
+
+def index(entry):
+    """Insert or update one entry"""
+    SearchEntry.objects.update_or_create(
+        kind=entry.kind, object_id=entry.object_id,
+        defaults={field: getattr(entry, field)
+                  for field in ('course_id', 'difficulty_level', 'title', 'body')},
+    )
+
+
+def index_lesson(lesson):
+    """Index a lesson, and its assessments, which carry its name and difficulty"""
+    index(lesson_entry(lesson))
+    for assessment in Assessment.objects.filter(lesson=lesson):
+        index(assessment_entry(assessment, lesson))
+
+
+def unindex(kind, object_id):
+    SearchEntry.objects.filter(kind=kind, object_id=object_id).delete()
+
+
+def reindex_courses(course_ids):
+    """Refresh the given course entries once the transaction commits"""
+    transaction.on_commit(partial(_reindex_courses, set(course_ids)))
+
+
+def _reindex_courses(course_ids):
+    contents = course_contents(course_ids)
+    for course in Course.objects.filter(pk__in=course_ids):  # Skips courses deleted meanwhile
+        index(course_entry(course, contents.get(course.pk, [])))
+
+
+def rebuild():
+    """Recreate every entry from Course, Lesson and Assessment (backfill/repair path)"""
+    def entries():
+        contents = course_contents()
+        for course in Course.objects.iterator(chunk_size=BATCH_SIZE):
+            yield course_entry(course, contents.get(course.pk, []))
+        for lesson in Lesson.objects.iterator(chunk_size=BATCH_SIZE):
+            yield lesson_entry(lesson)
+        for assessment in Assessment.objects.select_related('lesson').iterator(chunk_size=BATCH_SIZE):
+            yield assessment_entry(assessment)
+
+    count = 0
+    with transaction.atomic():
+        SearchEntry.objects.all().delete()
+        batch = []
+        for entry in entries():
+            batch.append(entry)
+            if len(batch) >= BATCH_SIZE:
+                count += len(SearchEntry.objects.bulk_create(batch))
+                batch = []
+        count += len(SearchEntry.objects.bulk_create(batch))
+        if connection.vendor == 'sqlite':
+            with connection.cursor() as cursor:
+                cursor.execute("INSERT INTO {0}({0}) VALUES ('optimize')".format(FTS_TABLE))
+    return count
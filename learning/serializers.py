@@ -7,9 +7,12 @@ from .models import (
 
 User = get_user_model()
 
+# The *_count fields are read from annotations added by the querysets in
+# learning/api.py, so serializing a list costs no extra COUNT per row.
+
 class CourseSerializer(serializers.ModelSerializer):
-    lesson_count = serializers.IntegerField(source='lessons.count', read_only=True)
-    assessment_count = serializers.IntegerField(source='assessments.count', read_only=True)
+    lesson_count = serializers.IntegerField(read_only=True)
+    assessment_count = serializers.IntegerField(read_only=True)
     
     class Meta:
         model = Course
@@ -19,7 +22,7 @@ class CourseSerializer(serializers.ModelSerializer):
 
 class LessonSerializer(serializers.ModelSerializer):
     course_name = serializers.CharField(source='course.name', read_only=True)
-    assessment_count = serializers.IntegerField(source='assessments.count', read_only=True)
+    assessment_count = serializers.IntegerField(read_only=True)
     
     class Meta:
         model = Lesson
@@ -39,7 +42,7 @@ class StudentProfileSerializer(serializers.ModelSerializer):
 class AssessmentSerializer(serializers.ModelSerializer):
     course_name = serializers.CharField(source='course.name', read_only=True)
     lesson_name = serializers.CharField(source='lesson.name', read_only=True)
-    attempt_count = serializers.IntegerField(source='assessmentattempt_set.count', read_only=True)
+    attempt_count = serializers.IntegerField(read_only=True)
     
     class Meta:
         model = Assessment
@@ -1,7 +1,13 @@
 from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 from django.contrib.auth import get_user_model
-from .models import StudentProfile, StudentProgress, CourseProgress, AssessmentAttempt
+from django.utils import timezone
+from django.db import transaction
+from . import activity, analytics, badges, catalog, leaderboard, progress, search
+from .models import (
+    Course, Lesson, Assessment, StudentProfile, StudentProgress,
+    CourseProgress, AssessmentAttempt, AttemptRollup, ActivityCalendar, ProgressStamp
+)
 
 User = get_user_model()
 
@@ -13,41 +19,150 @@ def create_student_profile(sender, instance, created, **kwargs):
 
 @receiver(post_save, sender=User)
 def save_student_profile(sender, instance, **kwargs):
-    """Save the StudentProfile when the User is saved"""
-    if hasattr(instance, 'studentprofile'):
-        instance.studentprofile.save()
+    """Save the StudentProfile with the User, if it was loaded and edited.
+
+    Never loads the profile, so saves such as the last_login update on each
+    login cost no extra query or write.
+    """
+    profile = User.studentprofile.related.get_cached_value(instance, default=None)
+    if profile is not None and profile.has_changed:
+        profile.save()
 
 @receiver(post_save, sender=StudentProgress)
 def update_course_progress_on_lesson_completion(sender, instance, created, **kwargs):
-    """Update CourseProgress when a lesson is completed"""
-    if instance.status == 'completed':
-        course_progress, created = CourseProgress.objects.get_or_create(
-            student=instance.student,
-            course=instance.lesson.course
+    """Record the change from a lesson completion for CourseProgress"""
+    if instance.progress_changed:
+        lessons, score = instance.completion_delta()
+        completed_at = instance.completed_at if instance.status == 'completed' else None
+        progress.record(
+            instance.student_id,
+            instance.course_id,
+            lessons=lessons,
+            score=score,
+            last_lesson_date=completed_at,
         )
-        course_progress.update_progress()
+        badges.lesson_changed(instance)
 
 @receiver(post_save, sender=AssessmentAttempt)
-def update_course_progress_on_assessment(sender, instance, created, **kwargs):
-    """Update CourseProgress when an assessment is completed"""
-    if created:
-        student_profile, created = StudentProfile.objects.get_or_create(
-            user=instance.user
-        )
-        course_progress, created = CourseProgress.objects.get_or_create(
-            student=student_profile,
-            course=instance.assessment.course
-        )
-        course_progress.update_progress()
+def update_progress_on_assessment(sender, instance, created, **kwargs):
+    """Complete the attempt's lesson and record the attempt for CourseProgress"""
+    if not created:
+        return
+
+    assessment = instance.assessment
+    student_profile = StudentProfile.for_user(instance.user)
+
+    if assessment.lesson:
+        StudentProgress.complete(student_profile.pk, assessment.lesson, instance.score, attempts=1)
+
+    progress.record(
+        student_profile.pk,
+        assessment.course_id,
+        attempts=1,
+        best_percentage=instance.percentage,
+        passed=instance.passed,
+        started_at=instance.completed_at,
+    )
+    analytics.record_attempts([instance], student_profile.grade_level)
+    activity.record(student_profile.pk, timezone.localdate(instance.completed_at))
+    badges.emit(student_profile.pk, 'quiz_submitted', perfect_quizzes=int(instance.percentage >= 100))
 
 @receiver(post_delete, sender=StudentProgress)
 def update_course_progress_on_lesson_deletion(sender, instance, **kwargs):
-    """Update CourseProgress when a lesson progress is deleted"""
-    try:
-        course_progress = CourseProgress.objects.get(
-            student=instance.student,
-            course=instance.lesson.course
+    """Record the removal of a deleted lesson completion for CourseProgress"""
+    lessons, score = instance.deletion_delta()
+    if lessons or score:
+        progress.record(
+            instance.student_id,
+            instance.course_id,
+            create=False,
+            lessons=lessons,
+            score=score,
         )
-        course_progress.update_progress()
-    except CourseProgress.DoesNotExist:
-        pass
\ No newline at end of file
+
+
+@receiver(post_save, sender=Course)
+@receiver(post_delete, sender=Course)
+@receiver(post_save, sender=Lesson)
+@receiver(post_delete, sender=Lesson)
+@receiver(post_save, sender=Assessment)
+@receiver(post_delete, sender=Assessment)
+def invalidate_catalog(sender, instance, **kwargs):
+    """Drop cached catalog pages when courses, lessons or assessments change.
+
+    Only after commit: a reader rebuilding under a new version before then
+    would cache the old data until the next edit.
+    """
+    course_ids = [instance.pk if sender is Course else instance.course_id]
+    transaction.on_commit(lambda: catalog.invalidate(course_ids))
+
+
+@receiver(post_save, sender=Course)
+def index_course(sender, instance, **kwargs):
+    search.index(search.course_entry(instance))
+
+
+@receiver(post_save, sender=Lesson)
+def index_lesson(sender, instance, **kwargs):
+    search.index_lesson(instance)
+    search.reindex_courses([instance.course_id])
+
+
+@receiver(post_save, sender=Assessment)
+def index_assessment(sender, instance, **kwargs):
+    search.index(search.assessment_entry(instance))
+    search.reindex_courses([instance.course_id])
+
+
+@receiver(post_delete, sender=Lesson)
+@receiver(post_delete, sender=Assessment)
+def unindex_catalog_object(sender, instance, **kwargs):
+    # Course entries go with the course through the foreign key cascade
+    search.unindex(sender._meta.model_name, instance.pk)
+    search.reindex_courses([instance.course_id])
+
+
+@receiver(post_save, sender=Lesson)
+def sync_lesson_course(sender, instance, created, **kwargs):
+    """Keep StudentProgress.course in step when a lesson moves to another course"""
+    if not created:
+        StudentProgress.objects.filter(lesson=instance).exclude(
+            course_id=instance.course_id
+        ).update(course_id=instance.course_id)
+
+@receiver(post_save, sender=Assessment)
+def sync_assessment_course(sender, instance, created, **kwargs):
+    """Keep AssessmentAttempt and AttemptRollup in step when an assessment moves"""
+    if not created:
+        AssessmentAttempt.objects.filter(assessment=instance).exclude(
+            course_id=instance.course_id
+        ).update(course_id=instance.course_id)
+        AttemptRollup.objects.filter(assessment=instance).exclude(
+            course_id=instance.course_id, lesson_id=instance.lesson_id
+        ).update(course_id=instance.course_id, lesson_id=instance.lesson_id)
+
+
+@receiver(post_save, sender=CourseProgress)
+@receiver(post_delete, sender=CourseProgress)
+def refresh_leaderboard(sender, instance, **kwargs):
+    """Re-rank a course progress row saved or deleted outside the progress pipeline"""
+    pair = {(instance.student_id, instance.course_id)}
+    transaction.on_commit(lambda: leaderboard.refresh(pair))
+
+
+@receiver(post_save, sender=StudentProgress)
+@receiver(post_delete, sender=StudentProgress)
+@receiver(post_save, sender=CourseProgress)
+@receiver(post_delete, sender=CourseProgress)
+@receiver(post_save, sender=ActivityCalendar)
+def touch_progress_stamp(sender, instance, **kwargs):
+    """Give the learner a new progress stamp, so conditional GETs serve the change"""
+    ProgressStamp.touch([instance.student_id])
+
+
+@receiver(post_save, sender=User)
+def touch_progress_stamp_of_user(sender, instance, created, update_fields=None, **kwargs):
+    """The progress views and pages show the user's name; logins do not change it"""
+    if created or (update_fields is not None and set(update_fields) <= {'last_login'}):
+        return
+    ProgressStamp.touch(StudentProfile.objects.filter(user=instance).values_list('pk', flat=True))
@@ -1,3 +1,1205 @@
-from django.test import TestCase
+import inspect
+import json
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group, Permission
+from django.core.management import call_command
+from django.db import connection, connections, transaction
+from django.db.migrations.executor import MigrationExecutor
+from django.test import (
+    AsyncClient, Client, RequestFactory, TestCase, TransactionTestCase, override_settings, skipUnlessDBFeature
+)
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from . import (
+    activity, analytics, badges, benchmarks, catalog, heartbeats, leaderboard, metrics, profiling,
+    progress, rescoring, search, views
+)
+from .dashboard import get_dashboard_data
+from .ingest import MAX_BULK_ATTEMPTS, BulkIngestError, ingest_attempts
+from .management.commands.explain_hot_queries import HOT_INDEXES
+from .middleware import StudentProfileMiddleware
+from .models import (
+    Course, Lesson, Assessment, AssessmentAttempt, AttemptRollup, CourseProgress, StudentProfile,
+    StudentProgress, ActivityCalendar, StudentBadge, BadgeCounter, SearchEntry, ProgressJob, ProgressStamp,
+    StudentDashboardSnapshot
+)
+
+
+@override_settings(PROGRESS_QUEUE_SYNC=True)
+class ProgressDeltaTests(TestCase):
+    """Incremental CourseProgress updates agree with a rebuild from history"""
+
+    def setUp(self):
+        self.course = Course.objects.create(name='Maths', slug='maths')
+        self.lessons = [
+            Lesson.objects.create(course=self.course, name='Lesson {}'.format(i), slug='lesson-{}'.format(i),
+                                  max_score=10)
+            for i in range(3)
+        ]
+        self.assessment = Assessment.objects.create(
+            course=self.course, lesson=self.lessons[0], title='Quiz', total_questions=10
+        )
+        self.user = get_user_model().objects.create_user(
+            email='delta@example.com', password='pass', full_name='Delta', user_type='learner'
+        )
+        self.student = self.user.studentprofile
+
+    def totals(self, row):
+        return (row.total_lessons_completed, row.total_score, row.average_score, row.level,
+                row.attempts_count, row.best_assessment_score, row.status)
+
+    def test_deltas_match_rebuild(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            StudentProgress.complete(self.student.pk, self.lessons[1], 7)
+            StudentProgress.complete(self.student.pk, self.lessons[1], 8)
+            StudentProgress.start(self.student.pk, self.lessons[2])
+            AssessmentAttempt.objects.create(user=self.user, assessment=self.assessment, score=4)
+            AssessmentAttempt.objects.create(user=self.user, assessment=self.assessment, score=9)
+        row = CourseProgress.objects.get(student=self.student)
+        self.assertEqual(self.totals(row)[:2], (2, 17))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            StudentProgress.objects.get(lesson=self.lessons[1]).delete()
+        row.refresh_from_db()
+        incremental = self.totals(row)
+        row.rebuild()
+        self.assertEqual(incremental, self.totals(row))
+        self.assertEqual(incremental[:2], (1, 9))
+
+    def test_unit_of_work_writes_each_pair_once(self):
+        with CaptureQueriesContext(connection) as queries, progress.unit_of_work():
+            with self.captureOnCommitCallbacks(execute=True):
+                for lesson, score in zip(self.lessons, (5, 6, 7)):
+                    StudentProgress.complete(self.student.pk, lesson, score)
+                AssessmentAttempt.objects.create(user=self.user, assessment=self.assessment, score=9)
+        updates = [
+            query for query in queries.captured_queries
+            if query['sql'].startswith('UPDATE "learning_courseprogress"')
+        ]
+        self.assertEqual(len(updates), 1)
+        row = CourseProgress.objects.get(student=self.student)
+        self.assertEqual((row.total_lessons_completed, row.total_score, row.attempts_count), (3, 22, 1))
+
+
+@override_settings(PROGRESS_QUEUE_SYNC=False)
+class ProgressQueueTests(TestCase):
+    """Queued CourseProgress changes are applied once, by the worker or by a rebuild"""
+
+    def setUp(self):
+        self.course = Course.objects.create(name='Maths', slug='maths')
+        self.lessons = [
+            Lesson.objects.create(course=self.course, name='Lesson {}'.format(i), slug='lesson-{}'.format(i))
+            for i in range(2)
+        ]
+        user = get_user_model().objects.create_user(
+            email='queue@example.com', password='pass', full_name='Queue', user_type='learner'
+        )
+        self.student = user.studentprofile
+
+    def complete(self, lesson, score):
+        with self.captureOnCommitCallbacks(execute=True):
+            StudentProgress.complete(self.student.pk, lesson, score)
+
+    def test_drain_merges_jobs_per_pair(self):
+        other = get_user_model().objects.create_user(
+            email='other@example.com', password='pass', full_name='Other', user_type='learner'
+        ).studentprofile
+        self.complete(self.lessons[0], 60)
+        self.complete(self.lessons[1], 80)
+        with self.captureOnCommitCallbacks(execute=True):
+            StudentProgress.complete(other.pk, self.lessons[0], 70)
+        self.assertEqual(ProgressJob.objects.count(), 3)
+        self.assertFalse(CourseProgress.objects.filter(total_lessons_completed__gt=0).exists())
+
+        with CaptureQueriesContext(connection) as queries:
+            applied, lag = progress.drain(limit=2)
+        self.assertEqual(applied, 2)
+        self.assertGreaterEqual(lag, 0)
+        updates = [q for q in queries.captured_queries if q['sql'].startswith('UPDATE "learning_courseprogress"')]
+        self.assertEqual(len(updates), 1)
+        self.assertEqual(progress.queue_stats()[0], 1)
+
+        self.assertEqual(progress.drain()[0], 1)
+        self.assertEqual(progress.queue_stats(), (0, 0.0))
+        totals = dict(CourseProgress.objects.values_list('student_id', 'total_score'))
+        self.assertEqual(totals, {self.student.pk: 140, other.pk: 70})
+
+    def test_rebuild_discards_queued_jobs(self):
+        self.complete(self.lessons[0], 60)
+        progress.drain()
+        self.complete(self.lessons[1], 80)
+        self.assertEqual(ProgressJob.objects.count(), 1)
+
+        row = CourseProgress.objects.get(student=self.student)
+        row.rebuild()
+        self.assertFalse(ProgressJob.objects.exists())
+        self.assertEqual(progress.drain(), (0, 0.0))
+        row.refresh_from_db()
+        self.assertEqual((row.total_lessons_completed, row.total_score), (2, 140))
+
+
+@skipUnlessDBFeature('has_select_for_update_skip_locked')
+@override_settings(PROGRESS_QUEUE_SYNC=False)
+class ProgressQueueLockingTests(TransactionTestCase):
+    """Workers skip jobs another worker has locked instead of waiting for them"""
+
+    def test_drain_skips_locked_jobs(self):
+        course = Course.objects.create(name='Maths', slug='maths')
+        students = [
+            get_user_model().objects.create_user(
+                email='worker{}@example.com'.format(i), password='pass', full_name='Worker', user_type='learner'
+            ).studentprofile
+            for i in range(2)
+        ]
+        first, second = [
+            ProgressJob.objects.create(student=student, course=course, delta={'lessons': 1, 'score': 5})
+            for student in students
+        ]
+        locked, release = threading.Event(), threading.Event()
+
+        def other_worker():
+            try:
+                with transaction.atomic():
+                    list(ProgressJob.objects.select_for_update().filter(pk=first.pk))
+                    locked.set()
+                    release.wait(10)
+            finally:
+                connections.close_all()
+
+        thread = threading.Thread(target=other_worker)
+        thread.start()
+        try:
+            self.assertTrue(locked.wait(10))
+            self.assertEqual(progress.drain()[0], 1)
+            self.assertEqual(list(ProgressJob.objects.values_list('pk', flat=True)), [first.pk])
+        finally:
+            release.set()
+            thread.join()
+        self.assertEqual(progress.drain()[0], 1)
+        self.assertEqual(CourseProgress.objects.filter(total_lessons_completed=1).count(), 2)
+
+
+class ViewQueryScalingTests(TestCase):
+    """Views must issue the same number of queries however much data there is"""
+
+    def run_size(self, size):
+        with self.captureOnCommitCallbacks(execute=True):
+            dataset = benchmarks.seed(**benchmarks.SIZES[size])
+        results = benchmarks.run_views(dataset)
+        with self.captureOnCommitCallbacks(execute=True):
+            benchmarks.clear()
+        return results
+
+    def test_query_counts_do_not_grow_with_data(self):
+        small = self.run_size('small')
+        medium = self.run_size('medium')
+        self.assertEqual(set(small), set(medium))
+        self.assertEqual(benchmarks.find_failed_views(small), {})
+        self.assertEqual(benchmarks.find_failed_views(medium), {})
+        self.assertEqual(benchmarks.find_scaling_views(small, medium), {})
+
+
+class APIQueryCountTests(TestCase):
+    """Serializer counts come from annotations, not one COUNT per row"""
+
+    def grow_courses(self, size):
+        start = Course.objects.count()
+        courses = Course.objects.bulk_create([
+            Course(name='Course {}'.format(i), slug='course-{}'.format(i))
+            for i in range(start, size)
+        ])
+        lessons = Lesson.objects.bulk_create([
+            Lesson(course=course, name='Lesson', slug='lesson') for course in courses
+        ])
+        Assessment.objects.bulk_create([
+            Assessment(course=lesson.course, lesson=lesson, title='Quiz', total_questions=5)
+            for lesson in lessons
+        ])
+
+    def test_course_list_queries_are_constant(self):
+        url = reverse('learning:api-course-list')
+        benchmarks.assert_constant_queries(lambda: self.client.get(url), self.grow_courses)
+        response = self.client.get(url)
+        self.assertEqual(response.json()['count'], 1000)
+        self.assertEqual(len(response.json()['results']), settings.REST_FRAMEWORK['PAGE_SIZE'])
+        self.assertEqual(response.json()['results'][0]['lesson_count'], 1)
+        self.assertEqual(response.json()['results'][0]['assessment_count'], 1)
+
+    def test_lists_are_paginated(self):
+        page_size = settings.REST_FRAMEWORK['PAGE_SIZE']
+        self.grow_courses(page_size + 10)
+        url = reverse('learning:api-lesson-list')
+        first = self.client.get(url).json()
+        self.assertEqual((first['count'], len(first['results'])), (page_size + 10, page_size))
+        second = self.client.get(first['next']).json()
+        self.assertEqual(len(second['results']), 10)
+        self.assertIsNone(second['next'])
+        ids = [lesson['id'] for lesson in first['results'] + second['results']]
+        self.assertEqual(len(set(ids)), page_size + 10)
+
+    def test_lesson_and_assessment_lists_are_constant(self):
+        for name in ('learning:api-lesson-list', 'learning:api-assessment-list'):
+            url = reverse(name)
+            benchmarks.assert_constant_queries(
+                lambda: self.client.get(url), self.grow_courses, sizes=(5, 50)
+            )
+
+
+class HotQueryIndexTests(TransactionTestCase):
+    """explain_hot_queries shows plans without the hot indexes without dropping them"""
+
+    def test_before_plans_leave_the_schema_alone(self):
+        # Outside a test transaction, like the command runs: SQLite cannot
+        # copy a database that has a write transaction open
+        benchmarks.seed(**benchmarks.SIZES['small'])
+        before, after = StringIO(), StringIO()
+        call_command('explain_hot_queries', only='before', stdout=before)
+        call_command('explain_hot_queries', only='after', stdout=after)
+
+        hot = [name for names in HOT_INDEXES.values() for name in names]
+        self.assertFalse([name for name in hot if name in before.getvalue()])
+        self.assertIn('attempt_user_course', after.getvalue())
+        with connection.cursor() as cursor:
+            indexes = set(connection.introspection.get_constraints(cursor, 'learning_studentprogress'))
+        self.assertLessEqual(set(HOT_INDEXES[StudentProgress]), indexes)
+
+
+class CourseBackfillMigrationTests(TransactionTestCase):
+    """Migration 0006 copies each lesson's and assessment's course onto existing rows"""
+
+    def migrate(self, target):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(target)
+        return executor.loader.project_state(target).apps
+
+    def tearDown(self):
+        self.migrate(MigrationExecutor(connection).loader.graph.leaf_nodes())
+
+    def test_course_is_backfilled(self):
+        apps = self.migrate([('learning', '0005_studentdashboardsnapshot')])
+        user = apps.get_model(settings.AUTH_USER_MODEL).objects.create(
+            email='old@example.com', full_name='Old', user_type='learner', password='!'
+        )
+        student = apps.get_model('learning', 'StudentProfile').objects.create(user=user)
+        course = apps.get_model('learning', 'Course').objects.create(name='Art', slug='arts')
+        lesson = apps.get_model('learning', 'Lesson').objects.create(course=course, name='Paint', slug='paint')
+        assessment = apps.get_model('learning', 'Assessment').objects.create(
+            course=course, lesson=lesson, title='Colours', total_questions=5
+        )
+        apps.get_model('learning', 'StudentProgress').objects.create(student=student, lesson=lesson)
+        apps.get_model('learning', 'AssessmentAttempt').objects.create(
+            user=user, assessment=assessment, score=3, percentage=60.0
+        )
+
+        apps = self.migrate([('learning', '0006_denormalize_course')])
+        self.assertEqual(
+            list(apps.get_model('learning', 'StudentProgress').objects.values_list('course_id', flat=True)),
+            [course.pk],
+        )
+        self.assertEqual(
+            list(apps.get_model('learning', 'AssessmentAttempt').objects.values_list('course_id', flat=True)),
+            [course.pk],
+        )
+
+
+class AnalyticsRollupTests(TestCase):
+    """The rollup agrees with the raw attempts and survives compaction"""
+
+    def setUp(self):
+        User = get_user_model()
+        self.course = Course.objects.create(name='Maths', slug='maths')
+        lesson = Lesson.objects.create(course=self.course, name='Counting', slug='counting')
+        self.assessment = Assessment.objects.create(
+            course=self.course, lesson=lesson, title='Count to ten', total_questions=10
+        )
+        self.learner = User.objects.create_user(
+            email='learner@example.com', password='pass', full_name='Learner', user_type='learner'
+        )
+        self.learner.studentprofile.grade_level = 'P2'
+        self.learner.studentprofile.save()
+        self.parent = User.objects.create_user(
+            email='parent@example.com', password='pass', full_name='Parent', user_type='parent'
+        )
+
+    def submit(self, scores):
+        with self.captureOnCommitCallbacks(execute=True):
+            ingest_attempts(self.learner, [
+                {'assessment_id': self.assessment.pk, 'score': score, 'time_taken': 30}
+                for score in scores
+            ])
+
+    def test_incremental_rollup_matches_rebuild(self):
+        self.submit([10, 7, 3])
+        summary = analytics.summarize(course='maths')
+        self.assertEqual(summary['attempts'], 3)
+        self.assertEqual(summary['passed'], 2)
+        self.assertAlmostEqual(summary['average_percentage'], 200 / 3)
+        self.assertEqual(summary['average_time_seconds'], 30)
+        self.assertEqual(summary['distribution'], {
+            '0-19': 0, '20-39': 1, '40-59': 0, '60-79': 1, '80-100': 1,
+        })
+
+        analytics.rebuild()
+        self.assertEqual(analytics.summarize(course='maths'), summary)
+
+    def test_compaction_keeps_totals(self):
+        self.submit([9, 4])
+        AssessmentAttempt.objects.update(completed_at=timezone.now() - timedelta(days=120))
+        analytics.rebuild()
+        before = analytics.summarize(grade_level='P2')
+
+        self.assertEqual(analytics.compact(timezone.localdate() - timedelta(days=90)), 1)
+        self.assertEqual(AttemptRollup.objects.get().period, 'month')
+        self.assertEqual(analytics.summarize(grade_level='P2'), before)
+
+    def test_api_is_for_staff_and_teachers(self):
+        self.submit([8])
+        url = reverse('learning:api-analytics')
+        for user in (self.learner, self.parent):
+            self.client.force_login(user)
+            self.assertEqual(self.client.get(url).status_code, 403)
+
+        teachers = Group.objects.create(name='Teachers')
+        teachers.permissions.add(Permission.objects.get(codename='view_attemptrollup'))
+        self.parent.groups.add(teachers)
+        self.client.force_login(self.parent)
+        response = self.client.get(url, {'course': 'maths', 'group_by': 'grade_level'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['groups'][0]['grade_level'], 'P2')
+        self.assertEqual(response.json()['groups'][0]['attempts'], 1)
+        self.assertEqual(self.client.get(url, {'group_by': 'nope'}).status_code, 400)
+
+
+@override_settings(PROGRESS_QUEUE_SYNC=True)
+class RescoreTests(TestCase):
+    """Bulk rescoring matches Assessment.grade() and refreshes course progress"""
+
+    def setUp(self):
+        self.course = Course.objects.create(name='Science', slug='science')
+        self.assessment = Assessment.objects.create(
+            course=self.course, title='Plants', total_questions=10, passing_score=70
+        )
+        self.learner = get_user_model().objects.create_user(
+            email='learner@example.com', password='pass', full_name='Learner', user_type='learner'
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            ingest_attempts(self.learner, [
+                {'assessment_id': self.assessment.pk, 'score': score} for score in (6, 7, 8)
+            ])
+
+    def assertAttemptsGraded(self):
+        self.assessment.refresh_from_db()
+        for attempt in AssessmentAttempt.objects.all():
+            self.assertEqual((attempt.percentage, attempt.passed), self.assessment.grade(attempt.score))
+
+    def test_rescore_after_rule_changes(self):
+        Assessment.objects.filter(pk=self.assessment.pk).update(passing_score=80)
+        with self.captureOnCommitCallbacks(execute=True):
+            result = rescoring.rescore([self.assessment.pk], chunk_size=2)
+        self.assertEqual(result['attempts'], 1)
+        self.assertAttemptsGraded()
+
+        Assessment.objects.filter(pk=self.assessment.pk).update(total_questions=8)
+        with self.captureOnCommitCallbacks(execute=True):
+            result = rescoring.rescore(chunk_size=2)
+        self.assertEqual(result['attempts'], 3)
+        self.assertEqual(result['progress_rebuilt'], 1)
+        self.assertAttemptsGraded()
+        progress = CourseProgress.objects.get(course=self.course)
+        self.assertEqual(progress.best_assessment_score, 100.0)
+        self.assertEqual(analytics.summarize(course='science')['passed'], 2)
+
+        self.assertEqual(rescoring.rescore()['attempts'], 0)
+
+    @override_settings(PROGRESS_QUEUE_SYNC=False)
+    def test_rescore_replaces_queued_jobs(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            ingest_attempts(self.learner, [{'assessment_id': self.assessment.pk, 'score': 8}])
+        self.assertEqual(ProgressJob.objects.count(), 1)
+
+        Assessment.objects.filter(pk=self.assessment.pk).update(passing_score=90)
+        with self.captureOnCommitCallbacks(execute=True):
+            rescoring.rescore([self.assessment.pk])
+        self.assertFalse(ProgressJob.objects.exists())
+        progress.drain()
+        row = CourseProgress.objects.get(course=self.course)
+        self.assertEqual((row.attempts_count, row.status), (4, 'in_progress'))
+
+
+class SortedBoardTests(TestCase):
+
+    def test_ranks_ties_and_neighbours(self):
+        board = leaderboard.SortedBoard()
+        for student_id, score in [(1, (80, 90, 2)), (2, (95, 100, 3)), (3, (80, 90, 2)), (4, (60, 70, 1))]:
+            board.set(student_id, score)
+        self.assertEqual([e['student_id'] for e in board.top(2)], [2, 1])
+        self.assertEqual([board.rank(s) for s in (1, 2, 3, 4)], [2, 1, 2, 4])
+        self.assertEqual([e['student_id'] for e in board.around(3, 1)], [1, 3, 4])
+
+        board.set(4, (99, 100, 3))
+        board.remove(2)
+        self.assertEqual(board.top(1)[0], {'rank': 1, 'student_id': 4, 'score': (99, 100, 3)})
+        self.assertEqual(len(board), 3)
+        self.assertIsNone(board.rank(2))
+
+
+@override_settings(PROGRESS_QUEUE_SYNC=True)
+class LeaderboardTests(TestCase):
+
+    def setUp(self):
+        leaderboard.boards.reset()
+        self.addCleanup(leaderboard.boards.reset)
+        User = get_user_model()
+        self.course = Course.objects.create(name='Arts', slug='arts')
+        self.profiles = []
+        for i, average in enumerate([70.0, 95.0, 85.0]):
+            user = User.objects.create_user(
+                email='kid{}@example.com'.format(i), password='pass',
+                full_name='Kid {}'.format(i), user_type='learner'
+            )
+            CourseProgress.objects.create(
+                student=user.studentprofile, course=self.course, average_score=average,
+                total_lessons_completed=1, total_score=int(average), level=CourseProgress.level_for_score(average)
+            )
+            self.profiles.append(user.studentprofile)
+
+    def test_top_and_standing(self):
+        self.client.force_login(self.profiles[0].user)
+        response = self.client.get(reverse('learning:api-course-leaderboard', args=['arts']))
+        self.assertEqual([e['name'] for e in response.json()['entries']], ['Kid', 'Kid', 'Kid'])
+        self.assertEqual([e['student_id'] for e in response.json()['entries']],
+                         [self.profiles[1].pk, self.profiles[2].pk, self.profiles[0].pk])
+
+        response = self.client.get(reverse('learning:api-leaderboard-me'), {'around': 1})
+        self.assertEqual(response.json()['rank'], 3)
+        self.assertEqual(response.json()['ranked_learners'], 3)
+        self.assertEqual(len(response.json()['entries']), 2)
+
+    def test_learners_without_a_name_are_not_shown_by_email(self):
+        get_user_model().objects.filter(pk=self.profiles[1].user_id).update(full_name='')
+        self.client.force_login(self.profiles[0].user)
+        response = self.client.get(reverse('learning:api-course-leaderboard', args=['arts']))
+        self.assertEqual(response.json()['entries'][0]['name'], 'Learner {}'.format(self.profiles[1].pk))
+        self.assertNotIn('@', response.content.decode())
+
+    def test_follows_progress_writes(self):
+        leaderboard.top(self.course.pk)  # build the boards
+        with self.captureOnCommitCallbacks(execute=True):
+            progress.record(self.profiles[0].pk, self.course.pk, lessons=1, score=100)
+        # (70 + 100) / 2 = 85 ties with the third learner, so both share rank 2
+        self.assertEqual(leaderboard.standing(self.profiles[0].pk, self.course.pk)[0], 2)
+
+    def test_picks_up_rows_changed_elsewhere(self):
+        leaderboard.top(self.course.pk)
+        CourseProgress.objects.filter(student=self.profiles[0]).update(
+            average_score=99.0, updated_at=timezone.now()
+        )
+        self.assertEqual(leaderboard.standing(self.profiles[0].pk, self.course.pk)[0], 3)
+        with override_settings(LEADERBOARD_SYNC_SECONDS=0):
+            self.assertEqual(leaderboard.standing(self.profiles[0].pk, self.course.pk)[0], 1)
+
+
+class ActivityCalendarTests(TestCase):
+    """Streaks come from the day bitmap and match a rebuild from history"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email='learner@example.com', password='pass', full_name='Learner', user_type='learner'
+        )
+        self.student = self.user.studentprofile
+
+    def test_bit_helpers(self):
+        value = 0b1110111011  # runs of 2, 3 and 3 ending at bits 1, 5 and 9
+        self.assertEqual(activity.run_ending_at(value, 5), 3)
+        self.assertEqual(activity.run_ending_at(value, 2), 0)
+        self.assertEqual(activity.run_through(value, 4), 3)
+        self.assertEqual(activity.longest_run(value), 3)
+
+    def test_streaks_and_heatmap(self):
+        today = date(2026, 3, 10)
+        for offset in (9, 8, 6, 5, 1, 0, 7):  # the last one joins two runs
+            activity.mark(self.student.pk, today - timedelta(days=offset))
+        activity.mark(self.student.pk, today)  # marking twice is a no-op
+
+        calendar = ActivityCalendar.objects.get(student=self.student)
+        self.assertEqual((calendar.last_active, calendar.streak, calendar.longest_streak),
+                         (today, 2, 5))
+        summary = activity.summary(self.student, today=today)
+        self.assertEqual(summary['current_streak'], 2)
+        self.assertEqual(summary['heatmap']['active_days'], 7)
+        self.assertTrue(summary['heatmap']['days'].endswith('1111100011'))
+        self.assertEqual(activity.summary(self.student, today=today + timedelta(days=2))['current_streak'], 0)
+        self.assertEqual(activity.summary(self.student, year=2026, today=today)['heatmap']['days'][59:69],
+                         '1111100011')
+
+    def test_recorded_by_lesson_views_and_rebuild_agrees(self):
+        course = Course.objects.create(name='Music', slug='music')
+        Lesson.objects.create(course=course, name='Rhythm', slug='rhythm')
+        self.client.force_login(self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('learning:complete_lesson', args=['music', 'rhythm']))
+        StudentProgress.objects.update(started_at=timezone.now() - timedelta(days=1))
+
+        self.assertEqual(self.client.get(reverse('learning:api-activity')).json()['current_streak'], 1)
+        activity.rebuild()
+        response = self.client.get(reverse('learning:api-activity')).json()
+        self.assertEqual((response['current_streak'], response['longest_streak']), (2, 2))
+        self.assertEqual(self.client.get(reverse('learning:api-activity'), {'year': 'x'}).status_code, 400)
+
+
+@override_settings(PROGRESS_QUEUE_SYNC=True)
+class BadgeTests(TestCase):
+    """Badges are earned from counters as events arrive, and backfill agrees"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email='learner@example.com', password='pass', full_name='Learner', user_type='learner'
+        )
+        self.student = self.user.studentprofile
+        self.course = Course.objects.create(name='Literacy', slug='literacy')
+        self.lessons = [
+            Lesson.objects.create(course=self.course, name='Lesson {}'.format(i),
+                                  slug='lesson-{}'.format(i), difficulty_level=i + 1)
+            for i in range(5)
+        ]
+        self.assessment = Assessment.objects.create(course=self.course, title='Quiz', total_questions=4)
+
+    def earned(self):
+        return set(StudentBadge.objects.filter(student=self.student).values_list('code', 'course__slug'))
+
+    def test_badges_follow_events(self):
+        self.client.force_login(self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            ingest_attempts(self.user, [
+                {'assessment_id': self.assessment.pk, 'score': score} for score in (4, 4, 3, 4)
+            ])
+        self.assertEqual(self.earned(), {('perfect_three', None)})
+
+        for lesson in self.lessons:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.post(reverse('learning:complete_lesson', args=['literacy', lesson.slug]))
+        self.assertEqual(self.earned(), {
+            ('perfect_three', None), ('five_lessons', 'literacy'), ('difficulty_master', None),
+        })
+        self.assertEqual(CourseProgress.objects.get(student=self.student).badges_earned, ['five_lessons'])
+
+        today = timezone.localdate()  # already active from the lessons above
+        for offset in range(6, 0, -1):
+            self.assertNotIn(('week_streak', None), self.earned())
+            with self.captureOnCommitCallbacks(execute=True):
+                activity.mark(self.student.pk, today - timedelta(days=offset))
+        self.assertIn(('week_streak', None), self.earned())
+
+        response = self.client.get(reverse('learning:progress')).json()
+        self.assertEqual(len(response['badges']), 4)
+        self.assertEqual(response['badges'][0]['name'], 'Week Streak')
+
+    def test_irrelevant_events_cost_nothing(self):
+        with self.assertNumQueries(0):
+            badges.handle(self.student.pk, 'quiz_submitted', None, {'perfect_quizzes': 0})
+            badges.handle(self.student.pk, 'unknown', None, {})
+
+    def test_backfill_matches_incremental(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            ingest_attempts(self.user, [{'assessment_id': self.assessment.pk, 'score': 4}] * 3)
+        incremental = self.earned()
+        counters = set(BadgeCounter.objects.values_list('course_id', 'name', 'value'))
+
+        StudentBadge.objects.all().delete()
+        BadgeCounter.objects.all().delete()
+        badges.backfill()
+        self.assertEqual(self.earned(), incremental)
+        self.assertTrue(counters <= set(BadgeCounter.objects.values_list('course_id', 'name', 'value')))
+
+
+class MetricsTests(TestCase):
+    def setUp(self):
+        metrics.registry.reset()
+
+    def test_requests_are_recorded_per_view(self):
+        Course.objects.create(name='Course', slug='course')
+        url = reverse('learning:api-course-list')
+        self.client.get(url)
+        self.client.get(url)
+
+        stats = metrics.registry.snapshot()['learning:api-course-list']
+        self.assertEqual(stats.requests, 2)
+        self.assertEqual(stats.statuses, {200: 2})
+        self.assertGreater(stats.queries, 0)
+        self.assertGreater(stats.response_bytes, 0)
+
+        with self.settings(METRICS_TOKEN='scrape'):
+            text = self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer scrape').content.decode()
+        self.assertIn('giggles_requests_total{view="learning:api-course-list",status="200"} 2', text)
+        self.assertIn('giggles_request_duration_seconds_count{view="learning:api-course-list"} 2', text)
+
+    def test_duplicate_queries_are_counted(self):
+        collector = metrics.QueryCollector()
+        with connection.execute_wrapper(collector):
+            for _ in range(3):
+                Course.objects.filter(slug='course').exists()
+        self.assertEqual(collector.count, 3)
+        self.assertEqual(collector.duplicates, 2)
+
+    @override_settings(METRICS_TOKEN='scrape')
+    def test_endpoint_is_for_staff_and_the_token_only(self):
+        url = reverse('metrics')
+        self.assertEqual(self.client.get(url, REMOTE_ADDR='127.0.0.1').status_code, 404)
+        self.assertEqual(self.client.get(url, HTTP_AUTHORIZATION='Bearer wrong').status_code, 404)
+        self.assertEqual(self.client.get(url, HTTP_AUTHORIZATION='Bearer scrape').status_code, 200)
+        with self.settings(METRICS_TOKEN=''):
+            self.assertEqual(self.client.get(url, HTTP_AUTHORIZATION='Bearer ').status_code, 404)
+
+        self.client.force_login(get_user_model().objects.create_user(
+            email='ops@example.com', password='pass', full_name='Ops', user_type='parent', is_staff=True
+        ))
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+
+class ProfilingTests(TestCase):
+    def setUp(self):
+        self.staff = get_user_model().objects.create_user(
+            email='staff@example.com', password='pass', full_name='Staff', is_staff=True
+        )
+        Course.objects.create(name='Course', slug='course')
+
+    def test_flagged_staff_request_is_profiled(self):
+        with tempfile.TemporaryDirectory() as directory, override_settings(
+            PROFILE_DIR=directory, PROFILE_KEEP=2
+        ):
+            self.client.force_login(self.staff)
+            url = reverse('learning:api-course-list')
+            self.assertNotIn('X-Profile-Id', self.client.get(url))
+            for _ in range(3):
+                response = self.client.get(url, {'_profile': '1'})
+            profile_id = response['X-Profile-Id']
+            self.assertEqual(profiling.stored_ids()[0], profile_id)
+            self.assertEqual(len(profiling.stored_ids()), 2)
+
+            report = self.client.get(reverse('learning:profile_detail', args=[profile_id])).json()
+            self.assertEqual(report['view'], 'learning:api-course-list')
+            self.assertGreater(report['query_count'], 0)
+            self.assertTrue(report['functions'])
+            listed = self.client.get(reverse('learning:profile_list')).json()['profiles']
+            self.assertEqual([row['id'] for row in listed], profiling.stored_ids())
+
+    def test_flag_is_ignored_for_other_users(self):
+        learner = get_user_model().objects.create_user(
+            email='learner@example.com', password='pass', full_name='Learner', user_type='learner'
+        )
+        self.client.force_login(learner)
+        response = self.client.get(reverse('learning:api-course-list'), HTTP_X_PROFILE='1')
+        self.assertNotIn('X-Profile-Id', response)
+
+
+@override_settings(PROGRESS_QUEUE_SYNC=True)
+class ASGIHandlerTests(TestCase):
+    """The progress and quiz endpoints are sync views that also work under the ASGI handler"""
+
+    def setUp(self):
+        metrics.registry.reset()
+        self.addCleanup(heartbeats.buffer.take)
+        self.course = Course.objects.create(name='Science', slug='science')
+        self.lesson = Lesson.objects.create(course=self.course, name='Plants', slug='plants', max_score=10)
+        self.assessment = Assessment.objects.create(
+            course=self.course, lesson=self.lesson, title='Leaves', total_questions=4
+        )
+        self.learner = get_user_model().objects.create_user(
+            email='async@example.com', password='pass', full_name='Async', user_type='learner'
+        )
+
+    async def drive(self):
+        client = AsyncClient()
+        await client.aforce_login(self.learner)
+        kwargs = {'course_slug': 'science', 'lesson_slug': 'plants'}
+        responses = [
+            await client.post(reverse('learning:start_lesson', kwargs=kwargs),
+                              headers={'X-Requested-With': 'XMLHttpRequest'}),
+            await client.post(reverse('learning:complete_lesson', kwargs=kwargs)),
+            await client.post(
+                reverse('learning:submit_quiz_score', kwargs={**kwargs, 'assessment_id': self.assessment.pk}),
+                data={'score': 4}, content_type='application/json',
+            ),
+            await client.get(reverse('learning:progress_json')),
+        ]
+        return responses
+
+    def test_endpoints_update_progress(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            responses = async_to_sync(self.drive)()
+        self.assertEqual([r.status_code for r in responses], [200, 200, 200, 200])
+        self.assertEqual(responses[3].json()['progress'][0]['status'], 'completed')
+
+        course_progress = CourseProgress.objects.get(student=self.learner.studentprofile, course=self.course)
+        self.assertEqual(course_progress.total_lessons_completed, 1)
+        self.assertEqual(course_progress.attempts_count, 1)
+        self.assertEqual(AssessmentAttempt.objects.get().percentage, 100.0)
+        # SQL run on the request's sync thread is still attributed to the view
+        self.assertGreater(metrics.registry.snapshot()['learning:complete_lesson'].queries, 0)
+
+    def test_views_are_sync(self):
+        # Async views measured slower under uvicorn than these under gunicorn,
+        # and cost an async_to_sync wrap on every WSGI request
+        for view in (views.start_lesson, views.complete_lesson, views.lesson_heartbeat,
+                     views.submit_quiz_score, views.student_progress_json):
+            self.assertFalse(inspect.iscoroutinefunction(view), view.__name__)
+
+
+class SearchTests(TestCase):
+    """Course search goes through the full-text index and follows catalog edits"""
+
+    def setUp(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.science = Course.objects.create(name='Science', slug='science',
+                                                 description='Living things around us')
+            self.arts = Course.objects.create(name='Dinosaur art', slug='arts', description='Painting')
+            self.fossils = Lesson.objects.create(course=self.science, name='Dinosaur fossils',
+                                                 slug='fossils', difficulty_level=3)
+            Lesson.objects.create(course=self.arts, name='Colours', slug='colours', difficulty_level=1)
+
+    def test_prefix_ranking_and_difficulty(self):
+        # A course name match ranks above a lesson name match
+        self.assertEqual(search.course_ids('dino'), [self.arts.pk, self.science.pk])
+        self.assertEqual(search.course_ids('dino', difficulty=1), [self.arts.pk])
+        self.assertEqual(search.course_ids('living thi'), [self.science.pk])
+        hits = search.search('fossil', kinds=['lesson'])
+        self.assertEqual([(kind, pk) for kind, pk, *_ in hits], [('lesson', self.fossils.pk)])
+
+    def test_index_follows_saves_and_deletes(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Assessment.objects.create(course=self.arts, lesson=None, title='Volcano quiz', total_questions=3)
+        self.assertEqual(search.course_ids('volc'), [self.arts.pk])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.fossils.delete()
+        self.assertEqual(search.course_ids('fossil'), [])
+        self.arts.delete()
+        self.assertEqual(search.course_ids('dino'), [])
+        self.assertEqual(list(SearchEntry.objects.values_list('kind', 'object_id')),
+                         [('course', self.science.pk)])
+        self.assertEqual(search.rebuild(), 1)
+
+    def test_course_list_view(self):
+        response = self.client.get(reverse('learning:course_list'),
+                                   {'search': 'dino', 'difficulty_level': '3'})
+        self.assertEqual(list(response.context['courses']), [self.science])
+
+
+class StudentProfileTests(TestCase):
+    """The profile is loaded once per request and only written when it changed"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email='profile@example.com', password='pass', full_name='Profile', user_type='learner'
+        )
+        self.user = get_user_model().objects.get(pk=self.user.pk)
+
+    def test_user_save_skips_unchanged_profile(self):
+        with self.assertNumQueries(1):  # Just the user UPDATE, as on every login
+            self.user.save(update_fields=['last_login'])
+        self.user.studentprofile  # loaded but unchanged
+        with self.assertNumQueries(1):
+            self.user.save()
+
+        self.user.studentprofile.grade_level = 'P4'
+        with self.assertNumQueries(2):
+            self.user.save()
+        self.assertEqual(StudentProfile.objects.get(user=self.user).grade_level, 'P4')
+
+    def test_request_profile_is_lazy_and_memoized(self):
+        request = RequestFactory().get('/')
+        request.user = self.user
+        StudentProfileMiddleware(lambda request: None)(request)
+        with self.assertNumQueries(1):
+            profile = request.student_profile
+            self.assertEqual(profile.user_id, self.user.pk)
+            self.assertEqual(request.student_profile.pk, self.user.studentprofile.pk)
+            self.assertEqual(StudentProfile.for_user(self.user).pk, profile.pk)
+
+
+@override_settings(PROGRESS_QUEUE_SYNC=True)
+class ProgressUpsertTests(TestCase):
+    """Repeated or overlapping progress writes never fail, double count or downgrade"""
+
+    def setUp(self):
+        course = Course.objects.create(name='Maths', slug='maths')
+        self.lesson = Lesson.objects.create(course=course, name='Shapes', slug='shapes', max_score=10)
+        user = get_user_model().objects.create_user(
+            email='upsert@example.com', password='pass', full_name='Upsert', user_type='learner'
+        )
+        self.student = user.studentprofile
+        self.course = course
+
+    def course_progress(self):
+        return CourseProgress.objects.get(student=self.student, course=self.course)
+
+    def test_double_start_and_complete_count_once(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            StudentProgress.start(self.student.pk, self.lesson)
+            started_at = StudentProgress.objects.get().started_at
+            StudentProgress.start(self.student.pk, self.lesson)
+            self.assertTrue(StudentProgress.complete(self.student.pk, self.lesson, 8))
+            self.assertFalse(StudentProgress.complete(self.student.pk, self.lesson, 8))
+            StudentProgress.start(self.student.pk, self.lesson)
+
+        row = StudentProgress.objects.get()
+        self.assertEqual((row.status, row.score, row.started_at), ('completed', 8, started_at))
+        self.assertEqual(self.course_progress().total_lessons_completed, 1)
+        self.assertEqual(self.course_progress().total_score, 8)
+
+    def test_best_score_is_kept_and_attempts_add_up(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            StudentProgress.complete(self.student.pk, self.lesson, 6, attempts=1)
+            StudentProgress.complete(self.student.pk, self.lesson, 3, attempts=1)
+            StudentProgress.complete(self.student.pk, self.lesson, 9, attempts=1)
+
+        row = StudentProgress.objects.get()
+        self.assertEqual((row.status, row.score, row.attempts), ('completed', 9, 3))
+        self.assertEqual(self.course_progress().total_score, 9)
+
+    def test_insert_of_an_existing_row_is_ignored(self):
+        StudentProgress.objects.create(student=self.student, lesson=self.lesson, status='in_progress')
+        row = StudentProgress(student=self.student, lesson=self.lesson, course_id=self.course.pk)
+        self.assertFalse(StudentProgress._insert_missing(row))
+        CourseProgress.insert_missing(self.student.pk, self.course.pk)
+        CourseProgress.insert_missing(self.student.pk, self.course.pk)
+        self.assertEqual(CourseProgress.objects.filter(student=self.student).count(), 1)
+
+
+@override_settings(PROGRESS_QUEUE_SYNC=True)
+class IngestTests(TestCase):
+    """Bulk uploads update lesson and course progress like single submissions"""
+
+    def setUp(self):
+        self.course = Course.objects.create(name='Maths', slug='maths')
+        self.lessons = [
+            Lesson.objects.create(course=self.course, name='Lesson {}'.format(i), slug='lesson-{}'.format(i),
+                                  max_score=10)
+            for i in range(4)
+        ]
+        self.assessments = [
+            Assessment.objects.create(course=self.course, lesson=lesson, title=lesson.name, total_questions=10)
+            for lesson in self.lessons
+        ]
+        self.user = get_user_model().objects.create_user(
+            email='ingest@example.com', password='pass', full_name='Ingest', user_type='learner'
+        )
+        self.student = self.user.studentprofile
+
+    def ingest(self, *scores):
+        with self.captureOnCommitCallbacks(execute=True):
+            return ingest_attempts(self.user, [
+                {'assessment_id': self.assessments[index].pk, 'score': score, 'client_attempt_id': key}
+                for index, score, key in scores
+            ])
+
+    def test_progress_upserts_keep_the_best_score(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            StudentProgress.start(self.student.pk, self.lessons[1])
+            StudentProgress.complete(self.student.pk, self.lessons[2], 9)
+            StudentProgress.complete(self.student.pk, self.lessons[3], 4)
+
+        self.ingest((0, 6, None), (0, 8, None), (1, 5, None), (2, 3, None), (3, 7, None))
+
+        rows = {row.lesson_id: row for row in StudentProgress.objects.all()}
+        self.assertEqual(
+            [(rows[lesson.pk].status, rows[lesson.pk].score, rows[lesson.pk].attempts) for lesson in self.lessons],
+            [('completed', 8, 2), ('completed', 5, 1), ('completed', 9, 1), ('completed', 7, 1)],
+        )
+        course_progress = CourseProgress.objects.get(student=self.student)
+        totals = (course_progress.total_lessons_completed, course_progress.total_score,
+                  course_progress.attempts_count)
+        course_progress.rebuild()
+        self.assertEqual(totals, (4, 29, 5))
+        self.assertEqual(totals, (course_progress.total_lessons_completed, course_progress.total_score,
+                                  course_progress.attempts_count))
+
+
+    def test_retried_uploads_are_not_counted_twice(self):
+        first = self.ingest((0, 7, 'a'), (1, 9, 'b'), (1, 9, 'b'))
+        self.assertEqual([result['status'] for result in first], ['created', 'created', 'duplicate'])
+        again = self.ingest((0, 7, 'a'), (1, 9, 'b'), (2, 5, 'c'))
+        self.assertEqual([result['status'] for result in again], ['duplicate', 'duplicate', 'created'])
+        self.assertEqual(again[0]['attempt_id'], first[0]['attempt_id'])
+
+        self.assertEqual(AssessmentAttempt.objects.count(), 3)
+        course_progress = CourseProgress.objects.get(student=self.student)
+        self.assertEqual(
+            (course_progress.total_lessons_completed, course_progress.total_score, course_progress.attempts_count),
+            (3, 21, 3),
+        )
+
+    def test_malformed_client_attempt_ids_are_item_errors(self):
+        results = ingest_attempts(self.user, [
+            {'assessment_id': self.assessments[0].pk, 'score': 5, 'client_attempt_id': ['a']},
+            {'assessment_id': self.assessments[0].pk, 'score': 5, 'client_attempt_id': {'a': 1}},
+        ])
+        self.assertEqual([result['status'] for result in results], ['error', 'error'])
+
+    def test_oversized_uploads_are_rejected_without_reading_them_all(self):
+        read = []
+
+        def items():
+            for _ in range(MAX_BULK_ATTEMPTS * 2):
+                read.append(1)
+                yield {'assessment_id': self.assessments[0].pk, 'score': 5}
+
+        with self.assertRaises(BulkIngestError):
+            ingest_attempts(self.user, items())
+        self.assertEqual(len(read), MAX_BULK_ATTEMPTS + 1)
+
+    def test_upload_view(self):
+        url = reverse('learning:submit_quiz_scores_bulk')
+        line = json.dumps({'assessment_id': self.assessments[0].pk, 'score': 5}) + '\n'
+        client = Client(enforce_csrf_checks=True)
+        client.force_login(self.user)
+        self.assertEqual(client.post(url, line, content_type='application/x-ndjson').status_code, 403)
+
+        self.client.force_login(self.user)
+        response = self.client.post(url, line * 2, content_type='application/x-ndjson')
+        self.assertEqual(response.json()['summary'], {'created': 2, 'duplicate': 0, 'error': 0})
+        with override_settings(DATA_UPLOAD_MAX_MEMORY_SIZE=len(line) * 3):
+            response = self.client.post(url, line * 4, content_type='application/x-ndjson')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(AssessmentAttempt.objects.count(), 2)
+
+
+@override_settings(PROGRESS_QUEUE_SYNC=True)
+class DashboardSnapshotTests(TestCase):
+    """The dashboard is read from a snapshot the progress pipeline keeps current"""
+
+    def setUp(self):
+        course = Course.objects.create(name='Maths', slug='maths')
+        self.lesson = Lesson.objects.create(course=course, name='Shapes', slug='shapes', max_score=10)
+        self.user = get_user_model().objects.create_user(
+            email='dashboard@example.com', password='pass', full_name='Dashboard', user_type='learner'
+        )
+
+    def test_snapshot_follows_progress(self):
+        self.assertEqual(get_dashboard_data(self.user)['stats']['completed_lessons'], 0)
+        self.assertTrue(StudentDashboardSnapshot.objects.filter(user=self.user).exists())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            StudentProgress.complete(self.user.studentprofile.pk, self.lesson, 8)
+        with self.assertNumQueries(1):
+            data = get_dashboard_data(self.user)
+        self.assertEqual(data['stats']['completed_lessons'], 1)
+        self.assertEqual(data['total_lessons_completed'], 1)
+
+    def test_starting_an_ensured_lesson_refreshes_the_snapshot(self):
+        student_id = self.user.studentprofile.pk
+        with self.captureOnCommitCallbacks(execute=True):
+            StudentProgress.ensure(student_id, self.lesson)
+        self.assertEqual(get_dashboard_data(self.user)['stats']['in_progress_lessons'], 0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertTrue(StudentProgress.start(student_id, self.lesson))
+        self.assertEqual(get_dashboard_data(self.user)['stats']['in_progress_lessons'], 1)
+
+
+@override_settings(HEARTBEAT_INTERVAL_SECONDS=30, HEARTBEAT_FLUSH_SECONDS=3600)
+class HeartbeatTests(TestCase):
+    """Heartbeats are buffered in memory and written once per (student, lesson)"""
+
+    def setUp(self):
+        patcher = mock.patch.object(heartbeats, 'buffer', heartbeats.Buffer())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.course = Course.objects.create(name='Music', slug='music')
+        self.lesson = Lesson.objects.create(course=self.course, name='Rhythm', slug='rhythm')
+        self.user = get_user_model().objects.create_user(
+            email='beat@example.com', password='pass', full_name='Beat', user_type='learner'
+        )
+        self.client.force_login(self.user)
+        self.url = reverse('learning:lesson_heartbeat', args=['music', 'rhythm'])
+
+    def test_heartbeats_are_buffered_then_flushed_in_one_update(self):
+        StudentProgress.start(self.user.studentprofile.pk, self.lesson)
+        start = timezone.now() - timedelta(seconds=120)
+        clock = [start, start + timedelta(seconds=30), start + timedelta(seconds=90)]
+        with mock.patch.object(heartbeats, 'timezone', mock.Mock(now=mock.Mock(side_effect=clock))):
+            for seconds in (30, 30, 500):  # The last one is clamped to twice the interval
+                response = self.client.post(self.url, {'seconds': seconds}, content_type='application/json')
+                self.assertEqual(response.status_code, 200)
+        self.assertIsNone(StudentProgress.objects.get().time_spent)
+
+        with self.assertNumQueries(4):  # Profiles, savepoint pair, one UPDATE
+            self.assertEqual(heartbeats.flush(), 1)
+        row = StudentProgress.objects.get()
+        self.assertEqual(row.time_spent, timedelta(seconds=120))
+        self.assertIsNotNone(row.last_accessed)
+
+        heartbeats.beat(self.user.pk, self.lesson.pk, 15)
+        heartbeats.flush()
+        self.assertEqual(StudentProgress.objects.get().time_spent, timedelta(seconds=135))
+
+    def test_credit_is_bounded_by_elapsed_time(self):
+        at = timezone.now()
+        for offset in (0, 0, 1, 1, 11):
+            heartbeats.beat(self.user.pk, self.lesson.pk, 30, at=at + timedelta(seconds=offset))
+        heartbeats.flush()
+        self.assertEqual(StudentProgress.objects.get().time_spent, timedelta(seconds=41))
+
+    def test_lesson_page_sends_heartbeats(self):
+        response = self.client.get(reverse('learning:lesson_detail', args=['music', 'rhythm']))
+        self.assertContains(response, 'data-heartbeat-url="{}"'.format(self.url))
+        self.assertContains(response, 'data-heartbeat-interval="30"')
+
+    def test_heartbeat_for_an_unstarted_lesson_starts_it(self):
+        self.client.post(self.url, {'seconds': 10}, content_type='application/json')
+        heartbeats.flush()
+        row = StudentProgress.objects.get()
+        self.assertEqual((row.status, row.time_spent), ('in_progress', timedelta(seconds=10)))
+
+    def test_bad_requests(self):
+        self.assertEqual(self.client.post(self.url, 'x', content_type='application/json').status_code, 400)
+        self.assertEqual(self.client.post(reverse(
+            'learning:lesson_heartbeat', args=['music', 'missing'])).status_code, 404)
+        for body in ('{"seconds": NaN}', '{"seconds": Infinity}', '{"seconds": "-inf"}'):
+            self.assertEqual(self.client.post(self.url, body, content_type='application/json').status_code, 400)
+        with self.assertRaises(ValueError):
+            heartbeats.beat(self.user.pk, self.lesson.pk, float('nan'))
+        self.assertEqual(len(heartbeats.buffer), 0)
+
+    def test_failed_flush_keeps_the_buffer(self):
+        heartbeats.beat(self.user.pk, self.lesson.pk, 20)
+        with mock.patch.object(heartbeats, '_write', side_effect=ValueError):
+            with self.assertRaises(ValueError):
+                heartbeats.flush()
+        self.assertEqual(len(heartbeats.buffer), 1)
+        heartbeats.flush()
+        self.assertEqual(StudentProgress.objects.get().time_spent, timedelta(seconds=20))
+
+
+class ConditionalGetTests(TestCase):
+    """Unchanged progress and catalog pages are answered with 304 before the view runs"""
+
+    def setUp(self):
+        self.course = Course.objects.create(name='Science', slug='science')
+        self.other = Course.objects.create(name='Music', slug='music')
+        self.lesson = Lesson.objects.create(course=self.course, name='Plants', slug='plants', max_score=10)
+        self.user = get_user_model().objects.create_user(
+            email='etag@example.com', password='pass', full_name='Etag', user_type='learner'
+        )
+        self.client.force_login(self.user)
+
+    def revalidate(self, url, response):
+        return self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+
+    def test_progress_json_is_not_modified_until_progress_changes(self):
+        url = reverse('learning:progress_json')
+        first = self.client.get(url)
+        self.assertEqual(first.status_code, 200)
+        self.assertFalse(first['ETag'].startswith('W/'))
+        self.assertIn('Last-Modified', first)
+        self.assertIn('no-cache', first['Cache-Control'])
+
+        with CaptureQueriesContext(connection) as full:
+            self.client.get(url)
+        with CaptureQueriesContext(connection) as revalidated:
+            response = self.revalidate(url, first)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+        self.assertEqual(response['ETag'], first['ETag'])
+        self.assertLess(len(revalidated), len(full))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            StudentProgress.complete(self.user.studentprofile.pk, self.lesson, 9)
+        response = self.revalidate(url, first)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], first['ETag'])
+        self.assertEqual(self.revalidate(url, response).status_code, 304)
+
+    def test_progress_summary_has_a_strong_etag(self):
+        response = self.client.get(reverse('learning:progress'))
+        self.assertEqual(response['Content-Type'], 'application/json')
+        self.assertFalse(response['ETag'].startswith('W/'))
+        self.assertEqual(self.revalidate(reverse('learning:progress'), response).status_code, 304)
+
+    @override_settings(PROGRESS_QUEUE_SYNC=True)
+    def test_a_write_request_renews_the_stamp_once(self):
+        other = Lesson.objects.create(course=self.course, name='Seeds', slug='seeds', max_score=10)
+        url = reverse('learning:complete_lesson', args=['science', 'plants'])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(url)
+        token = ProgressStamp.objects.get().token
+
+        # Outside a test transaction the callbacks run during the request's
+        # unit of work; here they run when the block exits, so keep one open
+        with CaptureQueriesContext(connection) as ctx, progress.unit_of_work(), \
+                self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.client.post(reverse(
+                'learning:complete_lesson', args=['science', other.slug])).status_code, 200)
+        writes = [query['sql'] for query in ctx.captured_queries
+                  if 'learning_progressstamp' in query['sql'] and not query['sql'].startswith('SELECT')]
+        self.assertEqual(len(writes), 1, writes)
+        self.assertNotEqual(ProgressStamp.objects.get().token, token)
+
+    def test_course_page_changes_with_its_course_only(self):
+        url = reverse('learning:course_detail', args=['science'])
+        first = self.client.get(url)
+        self.assertEqual(first.status_code, 200)
+        self.assertTrue(first['ETag'].startswith('W/'))
+        self.assertEqual(self.revalidate(url, first).status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.other.description = 'Songs'
+            self.other.save()
+        self.assertEqual(self.revalidate(url, first).status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Lesson.objects.create(course=self.course, name='Rocks', slug='rocks')
+        self.assertEqual(self.revalidate(url, first).status_code, 200)
+
+    def test_etag_is_per_user(self):
+        url = reverse('learning:progress_json')
+        first = self.client.get(url)
+        other = get_user_model().objects.create_user(
+            email='other@example.com', password='pass', full_name='Other', user_type='learner'
+        )
+        self.client.force_login(other)
+        self.assertEqual(self.revalidate(url, first).status_code, 200)
+
+
+class CatalogTests(TestCase):
+    """Catalog pages are served from the versioned cache and follow edits"""
+
+    def setUp(self):
+        catalog.invalidate()
+
+    @override_settings(CATALOG_VERSION_TIMEOUT=30)
+    def test_version_expires_on_process_local_caches(self):
+        version = catalog.current_version()
+        token, _ = catalog.stamp()
+        later = time.time() + 31
+        with mock.patch('django.core.cache.backends.locmem.time.time', return_value=later):
+            self.assertNotEqual(catalog.current_version(), version)
+            self.assertNotEqual(catalog.stamp()[0], token)
+
+    def test_edits_invalidate_the_edited_course(self):
+        course = Course.objects.create(name='Art', slug='art')
+        other = Course.objects.create(name='Music', slug='music')
+        self.assertEqual(catalog.get_course('art')['lessons'], [])
+        with self.assertNumQueries(0):
+            catalog.get_course('art')
+        other_stamp = catalog.stamp(other.pk)
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            Lesson.objects.create(course=course, name='Paint', slug='paint')
+        self.assertEqual(catalog.get_course('art')['lessons'], [])
+        for callback in callbacks:
+            callback()
+        self.assertEqual([lesson.slug for lesson in catalog.get_course('art')['lessons']], ['paint'])
+        self.assertEqual(catalog.stamp(other.pk), other_stamp)
+        self.assertIn(course, catalog.get_course_list())
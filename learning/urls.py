@@ -1,10 +1,18 @@
-from django.urls import path
-from . import views
+from django.urls import include, path
+from rest_framework.routers import DefaultRouter
+from . import api, views
 from django.http import JsonResponse
 from django.core.serializers.json import DjangoJSONEncoder
 
 app_name = 'learning'
 
+router = DefaultRouter()
+router.register('courses', api.CourseViewSet, basename='api-course')
+router.register('lessons', api.LessonViewSet, basename='api-lesson')
+router.register('assessments', api.AssessmentViewSet, basename='api-assessment')
+router.register('progress/lessons', api.StudentProgressViewSet, basename='api-lesson-progress')
+router.register('progress/courses', api.CourseProgressViewSet, basename='api-course-progress')
+
 urlpatterns = [
     # Dashboard
     path('', views.dashboard, name='lessons'),
@@ -13,6 +21,7 @@ urlpatterns = [
 
     
     # Course URLs
+    path('courses/', views.CourseListView.as_view(), name='course_list'),
     path('courses/<slug:slug>/', views.CourseDetailView.as_view(), name='course_detail'),
     
     # Lesson URLs
@@ -22,6 +31,8 @@ urlpatterns = [
          views.start_lesson, name='start_lesson'),
     path('courses/<slug:course_slug>/lessons/<slug:lesson_slug>/complete/', 
          views.complete_lesson, name='complete_lesson'),
+    path('courses/<slug:course_slug>/lessons/<slug:lesson_slug>/heartbeat/',
+         views.lesson_heartbeat, name='lesson_heartbeat'),
     
     # Assessment URLs
     path('courses/<slug:course_slug>/assessments/<int:assessment_id>/', 
@@ -34,12 +45,29 @@ urlpatterns = [
    # Progress URLs
      path('accounts/progress/', views.student_progress, name='progress'),
      path('progress/courses/<slug:course_slug>/', views.course_progress_detail, name='course_progress_detail'),
+     path('progress/json/', views.student_progress_json, name='progress_json'),
     
      path(
     'courses/<slug:course_slug>/lessons/<slug:lesson_slug>/assessments/<int:assessment_id>/submit/',
     views.submit_quiz_score,
     name='submit_quiz_score'
 ),
+     path('attempts/bulk/', views.submit_quiz_scores_bulk, name='submit_quiz_scores_bulk'),
+
+     # Request profiles (staff)
+     path('profiles/', views.profile_list, name='profile_list'),
+     path('profiles/<str:profile_id>/', views.profile_detail, name='profile_detail'),
+
+     # REST API
+     path('api/analytics/', api.CourseAnalyticsView.as_view(), name='api-analytics'),
+     path('api/activity/', api.ActivityView.as_view(), name='api-activity'),
+     path('api/leaderboard/', api.LeaderboardView.as_view(), name='api-leaderboard'),
+     path('api/leaderboard/me/', api.LeaderboardStandingView.as_view(), name='api-leaderboard-me'),
+     path('api/leaderboard/<slug:course_slug>/', api.LeaderboardView.as_view(),
+          name='api-course-leaderboard'),
+     path('api/leaderboard/<slug:course_slug>/me/', api.LeaderboardStandingView.as_view(),
+          name='api-course-leaderboard-me'),
+     path('api/', include(router.urls)),
 
 
 ]
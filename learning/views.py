@@ -1,46 +1,58 @@
 import json
+import logging
+import math
+from functools import partial
+from django.utils.decorators import method_decorator
 from django.views.decorators.http import require_POST
-from django.db.models.signals import post_save
 from django.contrib.auth import get_user_model
-from django.dispatch import receiver
 from django.utils.timezone import localtime
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
 from django.views.decorators.csrf import csrf_exempt
+from django.conf import settings
 from django.contrib import messages
-from django.http import JsonResponse
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import Http404, HttpResponse, JsonResponse
 from django.views.generic import ListView, DetailView, CreateView, UpdateView
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.db.models import Q, Avg, Count
 from django.utils import timezone
-from .forms import StudentProfileForm
+from django.db import IntegrityError
+from .conditional import conditional, progress_stamp
+from .forms import CourseSearchForm, StudentProfileForm
+from . import activity, badges, catalog, heartbeats, metrics, profiling, search
+from .dashboard import get_dashboard_data, refresh_dashboard
+from .ingest import BulkIngestError, ingest_attempts
+from .serializers import ProgressStatsSerializer
 from .models import (
     Course, Lesson, StudentProfile, Assessment, 
-    AssessmentAttempt, StudentProgress, CourseProgress
+    AssessmentAttempt, StudentProgress, CourseProgress, StudentBadge
 )
 from django.core.paginator import Paginator
 from django.core.serializers.json import DjangoJSONEncoder
 
 
+logger = logging.getLogger('learning')
+
 User = get_user_model()
 # Dashboard Views
 @login_required
 def dashboard(request):
-    """Main dashboard view for students"""
-    student_profile, created = StudentProfile.objects.get_or_create(user=request.user)
-    
-    # Get student's course progress
-    course_progress = CourseProgress.objects.filter(student=student_profile)
-    recent_attempts = AssessmentAttempt.objects.filter(user=request.user)[:5]
-    
-    context = {
-        'student_profile': student_profile,
-        'course_progress': course_progress,
-        'recent_attempts': recent_attempts,
-    }
+    """Main dashboard view for students, served from the dashboard snapshot"""
+    context = get_dashboard_data(request.user)
     return render(request, 'accounts/index.html', context)
 
+def _course_stamp(request, slug):
+    entry = catalog.get_course(slug)
+    if entry is None:
+        return None
+    return progress_stamp(request, course_id=entry['course'].pk, html=True)
+
+
 # Course Views
+@method_decorator(conditional(
+    lambda request: progress_stamp(request, request.GET.urlencode(), html=True)
+), name='get')
 class CourseListView(ListView):
     model = Course
     template_name = 'lessons/lessons.html'
@@ -48,21 +60,35 @@ class CourseListView(ListView):
     paginate_by = 12
 
     def get_queryset(self):
-        queryset = Course.objects.all()
-        search_query = self.request.GET.get('search')
-        if search_query:
-            queryset = queryset.filter(
-                Q(name__icontains=search_query) | 
-                Q(description__icontains=search_query)
-            )
-        return queryset.order_by('-created_at')
-
+        form = CourseSearchForm(self.request.GET)
+        filters = form.cleaned_data if form.is_valid() else {}
+        search_query = filters.get('search')
+        difficulty = int(filters['difficulty_level']) if filters.get('difficulty_level') else None
+        if not search_query and difficulty is None:
+            return catalog.get_course_list()
+        if not search_query:
+            return Course.objects.filter(
+                lessons__difficulty_level=difficulty
+            ).distinct().order_by('-created_at')
+        # Courses matching by name or description, or through their lessons
+        # and assessments, best match first
+        ids = search.course_ids(search_query, difficulty=difficulty)
+        courses = Course.objects.in_bulk(ids)
+        return [courses[pk] for pk in ids if pk in courses]
+
+@method_decorator(conditional(_course_stamp), name='get')
 class CourseDetailView(DetailView):
     model = Course
     context_object_name = 'course'
     slug_field = 'slug'
     slug_url_kwarg = 'slug'
 
+    def get_object(self, queryset=None):
+        self.catalog_entry = catalog.get_course(self.kwargs.get(self.slug_url_kwarg))
+        if self.catalog_entry is None:
+            raise Http404('No course found matching the query')
+        return self.catalog_entry['course']
+
     def get_template_names(self):
         # Example: for 'literacy' slug, looks for 'learning/literacy.html'
         slug = self.kwargs.get(self.slug_url_kwarg)
@@ -70,18 +96,18 @@ class CourseDetailView(DetailView):
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        course = self.get_object()
+        course = self.object
         
         if self.request.user.is_authenticated:
-            student_profile, created = StudentProfile.objects.get_or_create(user=self.request.user)
+            student_profile = self.request.student_profile
             try:
                 course_progress = CourseProgress.objects.get(student=student_profile, course=course)
                 context['course_progress'] = course_progress
             except CourseProgress.DoesNotExist:
                 context['course_progress'] = None
                 
-        context['lessons'] = course.lessons.all().order_by('created_at')
-        context['assessments'] = course.assessments.all()
+        context['lessons'] = self.catalog_entry['lessons']
+        context['assessments'] = self.catalog_entry['assessments']
         return context
 
 # Lesson Views
@@ -102,53 +128,61 @@ class LessonDetailView(LoginRequiredMixin, DetailView):
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         lesson = self.get_object()
-        student_profile, created = StudentProfile.objects.get_or_create(user=self.request.user)
+        student_profile = self.request.student_profile
         
         # Get or create student progress for this lesson
-        progress, created = StudentProgress.objects.get_or_create(
-            student=student_profile,
-            lesson=lesson,
-            defaults={'started_at': timezone.now()}
-        )
+        progress = StudentProgress.ensure(student_profile.pk, lesson)
         
         context['progress'] = progress
         context['assessments'] = lesson.assessments.all()
+        context['heartbeat_interval'] = settings.HEARTBEAT_INTERVAL_SECONDS
         return context
 
 @login_required
 @require_POST
 def start_lesson(request, course_slug, lesson_slug):
     """Start or continue a lesson"""
-    if request.method == 'POST':
-        lesson = get_object_or_404(Lesson, course__slug=course_slug, slug=lesson_slug)
-        student_profile, _ = StudentProfile.objects.get_or_create(user=request.user)
-
-        progress, created = StudentProgress.objects.get_or_create(
-            student=student_profile,
-            lesson=lesson,
-            defaults={
-                'started_at': timezone.now(),
-                'status': 'in_progress',
-                'last_accessed': timezone.now()
-            }
-        )
-
-        if not created:
-            if progress.status == 'not_started':
-                progress.status = 'in_progress'
-                progress.started_at = timezone.now()
-            progress.last_accessed = timezone.now()
-            progress.save()
+    lesson = get_object_or_404(Lesson, course__slug=course_slug, slug=lesson_slug)
+    student_profile = request.student_profile
 
-        # AJAX request
-        if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
-          print(f"Started lesson: {lesson.slug} for {student_profile.user.username}")
-          return JsonResponse({'success': True})
+    if not StudentProgress.start(student_profile.pk, lesson):
+        # Already started: last_accessed goes through the heartbeat buffer
+        _beat(student_profile.user_id, lesson.pk)
+    activity.record(student_profile.pk)
 
+    # AJAX request
+    if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
+        logger.debug('Started lesson %s for student %s', lesson.slug, student_profile.pk)
+        return JsonResponse({'success': True})
 
     # Fallback: regular page redirect
     return redirect('learning:lesson_detail', course_slug=course_slug, lesson_slug=lesson_slug)
 
+def _beat(user_id, lesson_id, seconds=0):
+    if heartbeats.beat(user_id, lesson_id, seconds):
+        heartbeats.flush()
+
+
+@login_required
+@require_POST
+def lesson_heartbeat(request, course_slug, lesson_slug):
+    """Time spent on an open lesson, posted by static/js/timer.js.
+
+    Buffered in memory, so a heartbeat costs no database write.
+    """
+    entry = catalog.get_course(course_slug)
+    lesson = next((lesson for lesson in entry['lessons'] if lesson.slug == lesson_slug), None) if entry else None
+    if lesson is None:
+        raise Http404('No lesson found matching the query')
+    try:
+        seconds = float(json.loads(request.body or b'{}').get('seconds', 0))
+    except (ValueError, TypeError, AttributeError):
+        seconds = math.nan
+    if not math.isfinite(seconds):
+        return JsonResponse({'error': 'seconds must be a number'}, status=400)
+    _beat(request.user.pk, lesson.pk, seconds)
+    return JsonResponse({'success': True, 'interval': settings.HEARTBEAT_INTERVAL_SECONDS})
+
 @login_required
 def complete_lesson(request, course_slug, lesson_slug):
     """Mark a lesson as completed"""
@@ -160,24 +194,11 @@ def complete_lesson(request, course_slug, lesson_slug):
         course__slug=course_slug, 
         slug=lesson_slug
     )
-    student_profile, created = StudentProfile.objects.get_or_create(user=request.user)
+    student_profile = request.student_profile
     
-    progress, created = StudentProgress.objects.get_or_create(
-        student=student_profile,
-        lesson=lesson
-    )
-    
-    progress.status = 'completed'
-    progress.completed_at = timezone.now()
-    progress.score = lesson.max_score  # You might want to modify this logic
-    progress.save()
-    
-    # Update course progress
-    course_progress, created = CourseProgress.objects.get_or_create(
-        student=student_profile,
-        course=lesson.course
-    )
-    course_progress.update_progress()
+    # CourseProgress is updated incrementally by the post_save receiver
+    StudentProgress.complete(student_profile.pk, lesson, lesson.max_score)
+    activity.record(student_profile.pk)
     
     messages.success(request, f'Lesson "{lesson.name}" completed successfully!')
     return JsonResponse({'success': True, 'message': 'Lesson completed!'})
@@ -234,13 +255,7 @@ def take_assessment(request, course_slug, assessment_id):
             answers=answers,
         )
         
-        # Update course progress
-        student_profile, created = StudentProfile.objects.get_or_create(user=request.user)
-        course_progress, created = CourseProgress.objects.get_or_create(
-            student=student_profile,
-            course=assessment.course
-        )
-        course_progress.update_progress()
+        # CourseProgress is updated incrementally by the post_save receiver
         
         if attempt.passed:
             messages.success(request, f'Congratulations! You passed with {attempt.percentage:.1f}%')
@@ -258,39 +273,63 @@ def submit_quiz_score(request, course_slug, lesson_slug, assessment_id):
         score = int(data.get('score'))
 
         assessment = get_object_or_404(Assessment, id=assessment_id, course__slug=course_slug)
-        user = request.user
-
-        passed = False
-        if assessment.total_questions > 0:
-            percentage = (score / assessment.total_questions) * 100
-            passed = percentage >= assessment.passing_score
 
+        # AssessmentAttempt.save() grades the score; lesson and course
+        # progress are updated by the post_save receivers
         attempt = AssessmentAttempt.objects.create(
-            user=user,
+            user=request.user,
             assessment=assessment,
             score=score,
-            passed=passed
         )
-        if assessment.lesson:
-            profile, _ = StudentProfile.objects.get_or_create(user=user)
-            progress, _ = StudentProgress.objects.get_or_create(
-                student=profile,
-                lesson=assessment.lesson,
-                defaults={
-                    'status': 'in_progress',
-                    'started_at': timezone.now()
-                }
-            )
-            progress.score = score
-            progress.status = 'completed'
-            progress.completed_at = timezone.now()
-            progress.save()
 
         return JsonResponse({'success': True, 'attempt_id': attempt.id})
     
     return JsonResponse({'success': False, 'error': 'Invalid request'})
 
 
+def _read_bulk_attempts(request):
+    """Yield attempt dicts from a JSON array or an NDJSON stream.
+
+    The stream is held to DATA_UPLOAD_MAX_MEMORY_SIZE like ``request.body``.
+    """
+    if request.content_type == 'application/x-ndjson':
+        remaining = settings.DATA_UPLOAD_MAX_MEMORY_SIZE
+        while True:
+            line = request.readline() if remaining is None else request.readline(remaining + 1)
+            if not line:
+                return
+            if remaining is not None:
+                remaining -= len(line)
+                if remaining < 0:
+                    raise BulkIngestError('Upload too large')
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+    data = json.loads(request.body)
+    if isinstance(data, dict):
+        data = data.get('attempts', [])
+    if not isinstance(data, list):
+        raise ValueError('Expected a list of attempts')
+    yield from data
+
+@login_required
+@require_POST
+def submit_quiz_scores_bulk(request):
+    """Store a batch of offline quiz attempts (JSON array or NDJSON)"""
+    try:
+        results = ingest_attempts(request.user, _read_bulk_attempts(request))
+    except (ValueError, BulkIngestError) as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
+    except IntegrityError:
+        # A concurrent upload stored the same client_attempt_id; retrying is safe
+        return JsonResponse({'success': False, 'error': 'Conflicting upload, please retry'}, status=409)
+
+    summary = {'created': 0, 'duplicate': 0, 'error': 0}
+    for result in results:
+        summary[result['status']] += 1
+    return JsonResponse({'success': True, 'summary': summary, 'results': results})
+
+
 @login_required
 def assessment_result(request, course_slug, attempt_id):
     """Show assessment results"""
@@ -308,34 +347,11 @@ def assessment_result(request, course_slug, attempt_id):
     }
     return render(request, 'learning/assessment_result.html', context)
 
-@receiver(post_save, sender=AssessmentAttempt)
-def update_student_progress(sender, instance, created, **kwargs):
-    if not created or not instance.assessment.lesson:
-        return
-
-    profile, _ = StudentProfile.objects.get_or_create(user=instance.user)
-    progress, _ = StudentProgress.objects.get_or_create(
-        student=profile,
-        lesson=instance.assessment.lesson,
-        defaults={
-            'status': 'in_progress',
-            'started_at': timezone.now()
-        }
-    )
-
-    progress.score = instance.score
-    progress.status = 'completed'
-    progress.completed_at = timezone.now()
-    progress.save()
-
 @login_required
+@conditional(progress_stamp)
 def student_progress_json(request):
-    student_profile = request.user.studentprofile
-    print("Student profile:", student_profile)
+    progress_qs = StudentProgress.objects.filter(student__user=request.user).select_related('lesson')
 
-    progress_qs = StudentProgress.objects.filter(student=student_profile).select_related('lesson')
-    print("Progress count:", progress_qs.count())
-    
     progress_list = []
     for p in progress_qs:
         progress_list.append({
@@ -353,48 +369,31 @@ def student_progress_json(request):
 
 
 @login_required
+@conditional(partial(progress_stamp, today=True))
 def student_progress(request):
-    """Show student's overall progress"""
-    student_profile, created = StudentProfile.objects.get_or_create(user=request.user)
-    
-    course_progress = CourseProgress.objects.filter(student=student_profile)
-    lesson_progress = StudentProgress.objects.filter(student=student_profile)
-    recent_lessons = lesson_progress.order_by('-updated_at')[:5]  # assuming 'updated_at' exists
-    recent_assessments = AssessmentAttempt.objects.filter(user=request.user).order_by('-completed_at')[:5]
-
-    # Dummy badges for now
-    badges = []  # or Badge.objects.filter(user=request.user)
+    """Show student's overall progress, served from the dashboard snapshot"""
+    data = get_dashboard_data(request.user)
+    stats = data['stats']
 
     # Summary dictionary to match template
     progress_summary = {
-        'completed_lessons': lesson_progress.filter(status='completed').count(),
-        'in_progress_lessons': lesson_progress.filter(status='in_progress').count(),
-        'total_assessments': recent_assessments.count(),
-        'completion_rate': (lesson_progress.filter(status='completed').count() / lesson_progress.count() * 100) if lesson_progress.exists() else 0,
+        'completed_lessons': stats['completed_lessons'],
+        'in_progress_lessons': stats['in_progress_lessons'],
+        'total_assessments': stats['total_assessments_taken'],
+        'completion_rate': stats['completion_rate'],
     }
 
-    course_progress_data = []
-    for cp in course_progress:
-        course_progress_data.append({
-            'lesson_name': cp.lesson.name,
-            'subject': cp.lesson.subject.name,
-            'status': cp.get_status_display(),
-            'score': cp.score,
-            'attempts': cp.attempts,
-            'completion_percentage': cp.completion_percentage,
-            'time_spent': str(cp.time_spent) if cp.time_spent else "N/A",
-            'started_at': cp.started_at.strftime('%Y-%m-%d %H:%M') if cp.started_at else "N/A",
-            'completed_at': cp.completed_at.strftime('%Y-%m-%d %H:%M') if cp.completed_at else "N/A",
-        })
-
     return JsonResponse({
         'user': {
             'username': request.user.full_name,
             'email': request.user.email,
         },
         'progress_summary': progress_summary,
-        'course_progress': course_progress_data,
-        'badges': [],  # Replace with real badge data if available
+        'stats': ProgressStatsSerializer(stats).data,
+        'course_progress': data['course_progress'],
+        'badges': badges.badge_list(
+            StudentBadge.objects.filter(student__user=request.user).select_related('course')
+        ),
     }, encoder=DjangoJSONEncoder)
 
 
@@ -402,22 +401,19 @@ def student_progress(request):
 def course_progress_detail(request, course_slug):
     """Detailed progress for a specific course"""
     course = get_object_or_404(Course, slug=course_slug)
-    student_profile, created = StudentProfile.objects.get_or_create(user=request.user)
+    student_profile = request.student_profile
     
-    course_progress, created = CourseProgress.objects.get_or_create(
-        student=student_profile,
-        course=course
-    )
+    course_progress = CourseProgress.for_pair(student_profile.pk, course.pk)
     
     lesson_progress = StudentProgress.objects.filter(
         student=student_profile,
-        lesson__course=course
-    )
+        course=course
+    ).select_related('lesson').order_by('lesson__created_at')
     
     assessment_attempts = AssessmentAttempt.objects.filter(
         user=request.user,
-        assessment__course=course
-    )
+        course=course
+    ).select_related('assessment')
     
     context = {
         'course': course,
@@ -425,17 +421,41 @@ def course_progress_detail(request, course_slug):
         'lesson_progress': lesson_progress,
         'assessment_attempts': assessment_attempts,
     }
-    return render(request, 'accounts/progress.html', context)
+    return render(request, 'learning/course_progress_detail.html', context)
 
 @login_required
 def edit_profile(request):
-    profile = request.user.studentprofile
+    profile = request.student_profile
     if request.method == 'POST':
         form = StudentProfileForm(request.POST, instance=profile)
         if form.is_valid():
             form.save()
+            refresh_dashboard(profile)
             return redirect('settings')  # or wherever you want to go
     else:
         form = StudentProfileForm(instance=profile)
     
-    return render(request, 'edit_profile.html', {'form': form})
\ No newline at end of file
+    return render(request, 'learning/edit_profile.html', {'form': form})
+
+
+def request_metrics(request):
+    """Per-view request metrics in the Prometheus text format (staff or METRICS_TOKEN only)"""
+    if not metrics.can_read(request):
+        raise Http404
+    return HttpResponse(metrics.render_text(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+@staff_member_required
+def profile_list(request):
+    """Stored request profiles, newest first"""
+    return JsonResponse({'profiles': profiling.summaries()})
+
+
+@staff_member_required
+def profile_detail(request, profile_id):
+    """The most expensive functions and queries of one stored profile"""
+    data = profiling.load(profile_id)
+    if data is None:
+        raise Http404('No such profile')
+    limit = request.GET.get('limit', '')
+    return JsonResponse(profiling.report(data, limit=int(limit) if limit.isdigit() else 20))
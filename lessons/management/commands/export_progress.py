@@ -0,0 +1,46 @@
+import gzip
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from learning.models import Course
+from lessons.utils import filter_progress, iter_progress_csv
+
+
+class Command(BaseCommand):
+    help = 'Write a gzip-compressed CSV of learner progress to disk'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', help='Destination file (default: progress-<date>.csv.gz)')
+        parser.add_argument('--course', help='Course slug')
+        parser.add_argument('--status', choices=['not_started', 'in_progress', 'completed'])
+        parser.add_argument('--from', dest='date_from', type=date.fromisoformat,
+                            help='Completed on or after this date (YYYY-MM-DD)')
+        parser.add_argument('--to', dest='date_to', type=date.fromisoformat,
+                            help='Completed on or before this date (YYYY-MM-DD)')
+        parser.add_argument('--grade-level')
+        parser.add_argument('--chunk-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        course = None
+        if options['course']:
+            course = Course.objects.filter(slug=options['course']).first()
+            if course is None:
+                raise CommandError(f"Unknown course '{options['course']}'")
+
+        queryset = filter_progress(
+            course=course,
+            status=options['status'],
+            date_from=options['date_from'],
+            date_to=options['date_to'],
+            grade_level=options['grade_level'],
+        )
+        output = options['output'] or 'progress-{}.csv.gz'.format(timezone.localdate().isoformat())
+
+        rows = -1  # header line
+        with gzip.open(output, 'wt', newline='', encoding='utf-8') as fh:
+            for line in iter_progress_csv(queryset, options['chunk_size']):
+                fh.write(line)
+                rows += 1
+        self.stdout.write(self.style.SUCCESS(f'Wrote {rows} rows to {output}'))
@@ -1,3 +1,79 @@
+import csv
+from datetime import datetime, timezone as dt_timezone
+
+from django.contrib.auth import get_user_model
 from django.test import TestCase
+from django.urls import reverse
+
+from learning.models import Course, Lesson, StudentProgress
+from .utils import EXPORT_HEADER
+
+
+class ExportProgressTests(TestCase):
+    """The staff CSV export streams filtered progress rows"""
+
+    def setUp(self):
+        self.course = Course.objects.create(name='Maths', slug='maths')
+        self.other_course = Course.objects.create(name='Science', slug='science')
+        counting = Lesson.objects.create(course=self.course, name='Counting', slug='counting')
+        shapes = Lesson.objects.create(course=self.course, name='Shapes', slug='shapes')
+        plants = Lesson.objects.create(course=self.other_course, name='Plants', slug='plants')
+        self.ada = self.learner('ada@example.com', 'Ada', 'P1')
+        self.bob = self.learner('bob@example.com', 'Bob', 'P2')
+        completed = datetime(2024, 3, 5, 10, tzinfo=dt_timezone.utc)
+        StudentProgress.objects.create(
+            student=self.ada, lesson=counting, status='completed', score=9, attempts=2,
+            started_at=datetime(2024, 3, 1, 10, tzinfo=dt_timezone.utc), completed_at=completed,
+        )
+        StudentProgress.objects.create(student=self.ada, lesson=shapes, status='in_progress')
+        StudentProgress.objects.create(
+            student=self.bob, lesson=plants, status='completed', score=7, attempts=1, completed_at=completed,
+        )
+
+        self.staff = get_user_model().objects.create_user(
+            email='staff@example.com', password='pass', full_name='Staff', user_type='parent', is_staff=True
+        )
+        self.client.force_login(self.staff)
+        self.url = reverse('export_progress')
+
+    def learner(self, email, full_name, grade_level):
+        user = get_user_model().objects.create_user(
+            email=email, password='pass', full_name=full_name, user_type='learner'
+        )
+        user.studentprofile.grade_level = grade_level
+        user.studentprofile.save()
+        return user.studentprofile
+
+    def export(self, params=None):
+        response = self.client.get(self.url, params or {})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        rows = list(csv.reader(b''.join(response.streaming_content).decode().splitlines()))
+        self.assertEqual(rows[0], EXPORT_HEADER)
+        return rows[1:]
+
+    def test_export_streams_every_row(self):
+        rows = self.export()
+        self.assertEqual(rows[0], [
+            'Ada', 'ada@example.com', 'P1', 'Maths', 'Counting', 'Completed', '9', '2', '2024-03-01', '2024-03-05'
+        ])
+        self.assertEqual(rows[1][4:], ['Shapes', 'In Progress', '0', '0', 'N/A', 'N/A'])
+        self.assertEqual([row[0] for row in rows], ['Ada', 'Ada', 'Bob'])
+
+    def test_filters(self):
+        lessons = lambda params: [row[4] for row in self.export(params)]
+        self.assertEqual(lessons({'course': self.course.pk}), ['Counting', 'Shapes'])
+        self.assertEqual(lessons({'status': 'completed'}), ['Counting', 'Plants'])
+        self.assertEqual(lessons({'grade_level': 'P2'}), ['Plants'])
+        self.assertEqual(lessons({'date_from': '2024-03-06'}), [])
+        self.assertEqual(lessons({'course': self.course.pk, 'status': 'completed'}), ['Counting'])
+
+    def test_invalid_filters_are_rejected(self):
+        for params in ({'course': 999}, {'status': 'lost'}, {'date_from': 'yesterday'}):
+            response = self.client.get(self.url, params)
+            self.assertEqual(response.status_code, 400)
+            self.assertIn(next(iter(params)), response.json()['errors'])
 
-# Create your tests here.
+    def test_staff_only(self):
+        self.client.force_login(self.ada.user)
+        self.assertEqual(self.client.get(self.url).status_code, 302)
@@ -3,6 +3,7 @@ from . import views
 
 urlpatterns = [
     path('', views.lessons, name='lessons'),  # maps to /lessons/
+    path('export/progress.csv', views.export_progress, name='export_progress'),
    
 ]
 
@@ -1,8 +1,11 @@
+import csv
+
 from django.core.mail import send_mail
 from django.conf import settings
 from django.template.loader import render_to_string
-from django import models
-from .models import QuizAttempt, LearnerProgress
+from django.db import models
+from django.http import StreamingHttpResponse
+from learning.models import AssessmentAttempt, StudentProgress
 import logging
 
 logger = logging.getLogger('lessons')
@@ -37,8 +40,8 @@ def send_progress_notification(user, quiz_attempt):
 
 def generate_progress_summary(user):
     """Generate a comprehensive progress summary for a user"""
-    progress_records = LearnerProgress.objects.filter(user=user)
-    quiz_attempts = QuizAttempt.objects.filter(user=user)
+    progress_records = StudentProgress.objects.filter(student__user=user)
+    quiz_attempts = AssessmentAttempt.objects.filter(user=user)
     
     summary = {
         'total_lessons': progress_records.count(),
@@ -57,31 +60,78 @@ def generate_progress_summary(user):
     
     return summary
 
-def export_progress_to_csv(queryset):
-    """Export progress data to CSV format"""
-    import csv
-    from django.http import HttpResponse
-    
-    response = HttpResponse(content_type='text/csv')
+EXPORT_HEADER = [
+    'Full Name', 'Email', 'Grade Level', 'Course', 'Lesson', 'Status',
+    'Score', 'Attempts', 'Started', 'Completed'
+]
+EXPORT_FIELDS = [
+    'student__user__full_name', 'student__user__email', 'student__grade_level',
+    'lesson__course__name', 'lesson__name', 'status', 'score', 'attempts',
+    'started_at', 'completed_at',
+]
+STATUS_LABELS = dict(StudentProgress._meta.get_field('status').choices)
+
+
+def filter_progress(queryset=None, course=None, status=None, date_from=None,
+                    date_to=None, grade_level=None):
+    """Apply the export filters; the date range applies to completed_at"""
+    if queryset is None:
+        queryset = StudentProgress.objects.all()
+    if course:
+        queryset = queryset.filter(course=course)
+    if status:
+        queryset = queryset.filter(status=status)
+    if date_from:
+        queryset = queryset.filter(completed_at__date__gte=date_from)
+    if date_to:
+        queryset = queryset.filter(completed_at__date__lte=date_to)
+    if grade_level:
+        queryset = queryset.filter(student__grade_level=grade_level)
+    return queryset
+
+
+def iter_progress_rows(queryset, chunk_size=2000):
+    """Yield formatted export rows, reading ``chunk_size`` rows at a time"""
+    rows = queryset.order_by('pk').values_list(*EXPORT_FIELDS).iterator(chunk_size=chunk_size)
+    for full_name, email, grade, course, lesson, status, score, attempts, started, completed in rows:
+        yield [
+            full_name,
+            email,
+            grade,
+            course,
+            lesson,
+            STATUS_LABELS.get(status, status),
+            score,
+            attempts,
+            started.strftime('%Y-%m-%d') if started else "N/A",
+            completed.strftime('%Y-%m-%d') if completed else "N/A",
+        ]
+
+
+class _Echo:
+    """File-like object whose write() returns the line instead of storing it"""
+
+    def write(self, value):
+        return value
+
+
+def iter_progress_csv(queryset, chunk_size=2000):
+    """Yield the export as CSV lines"""
+    writer = csv.writer(_Echo())
+    yield writer.writerow(EXPORT_HEADER)
+    for row in iter_progress_rows(queryset, chunk_size):
+        yield writer.writerow(row)
+
+
+def export_progress_to_csv(queryset=None, chunk_size=2000, **filters):
+    """Export progress data as a streamed CSV download.
+
+    Memory use stays flat however many rows are exported: rows are read
+    with a server-side iterator and written to the client as they come.
+    """
+    queryset = filter_progress(queryset, **filters)
+    response = StreamingHttpResponse(
+        iter_progress_csv(queryset, chunk_size), content_type='text/csv'
+    )
     response['Content-Disposition'] = 'attachment; filename="learner_progress.csv"'
-    
-    writer = csv.writer(response)
-    writer.writerow([
-        'Username', 'Full Name', 'Email', 'Lesson', 'Status',
-        'Best Score', 'Attempts', 'Started', 'Completed'
-    ])
-    
-    for progress in queryset.select_related('user', 'lesson'):
-        writer.writerow([
-            progress.user.username,
-            progress.user.get_full_name(),
-            progress.user.email,
-            progress.lesson.title,
-            progress.get_status_display(),
-            f"{progress.best_quiz_score:.1f}%" if progress.best_quiz_score else "N/A",
-            progress.attempts_count,
-            progress.started_at.strftime('%Y-%m-%d') if progress.started_at else "N/A",
-            progress.completed_at.strftime('%Y-%m-%d') if progress.completed_at else "N/A",
-        ])
-    
-    return response
\ No newline at end of file
+    return response
@@ -8,6 +8,9 @@ from django.contrib import messages
 from django.db import transaction
 import json
 from datetime import timedelta
+from django.contrib.admin.views.decorators import staff_member_required
+from learning.forms import ProgressFilterForm
+from .utils import export_progress_to_csv
 
 
 
@@ -15,3 +18,19 @@ def lessons(request):
     return render(request, 'lessons/lessons.html')
 
 
+
+
+@staff_member_required
+def export_progress(request):
+    """Stream a CSV of learner progress, filtered by course, status, dates and grade"""
+    form = ProgressFilterForm(request.GET)
+    if not form.is_valid():
+        return JsonResponse({'error': 'Invalid filter value', 'errors': form.errors}, status=400)
+    filters = form.cleaned_data
+    return export_progress_to_csv(
+        course=filters.get('course'),
+        status=filters.get('status'),
+        date_from=filters.get('date_from'),
+        date_to=filters.get('date_to'),
+        grade_level=request.GET.get('grade_level'),
+    )
@@ -4,6 +4,53 @@ let breakDuration = 2 * 60;   // 2 minutes
 let isSession = true;
 let timer;
 
+// Lesson pages (learning/lesson_detail.html) opt in to heartbeats with data
+// attributes on #timerDisplay:
+//   data-heartbeat-url="{% url 'learning:lesson_heartbeat' lesson.course.slug lesson.slug %}"
+//   data-heartbeat-interval="30"
+// Only session time on a visible page counts towards time on task.
+let heartbeatSeconds = 0;
+let heartbeatTimer;
+
+function csrfToken() {
+  const match = document.cookie.match(/(?:^|;\s*)csrftoken=([^;]+)/);
+  return match ? decodeURIComponent(match[1]) : '';
+}
+
+function sendHeartbeat(keepalive = false) {
+  const timerDisplay = document.getElementById('timerDisplay');
+  const url = timerDisplay && timerDisplay.dataset.heartbeatUrl;
+  if (!url || heartbeatSeconds <= 0) {
+    return;
+  }
+  const seconds = heartbeatSeconds;
+  heartbeatSeconds = 0;
+  fetch(url, {
+    method: 'POST',
+    keepalive: keepalive,
+    credentials: 'same-origin',
+    headers: {
+      'X-CSRFToken': csrfToken(),
+      'X-Requested-With': 'XMLHttpRequest',
+      'Content-Type': 'application/json',
+    },
+    body: JSON.stringify({ seconds: seconds }),
+  }).catch(() => {
+    heartbeatSeconds += seconds; // Retried with the next heartbeat
+  });
+}
+
+function startHeartbeats(interval) {
+  clearInterval(heartbeatTimer);
+  heartbeatTimer = setInterval(() => sendHeartbeat(), interval * 1000);
+  document.addEventListener('visibilitychange', () => {
+    if (document.visibilityState === 'hidden') {
+      sendHeartbeat(true);
+    }
+  });
+  window.addEventListener('pagehide', () => sendHeartbeat(true));
+}
+
 function startTimer(duration) {
   let time = duration;
   clearInterval(timer);
@@ -17,6 +64,9 @@ function startTimer(duration) {
     if (timerDisplay) {
       timerDisplay.textContent = `${label}: ${minutes}:${seconds}`;
     }
+    if (isSession && document.visibilityState === 'visible') {
+      heartbeatSeconds += 1;
+    }
 
     if (--time < 0) {
       isSession = !isSession;
@@ -29,5 +79,8 @@ window.addEventListener('load', () => {
   const timerDisplay = document.getElementById('timerDisplay');
   if (timerDisplay) {
     startTimer(sessionDuration);
+    if (timerDisplay.dataset.heartbeatUrl) {
+      startHeartbeats(Number(timerDisplay.dataset.heartbeatInterval) || 30);
+    }
   }
 });